@@ -0,0 +1,141 @@
+# addresses.py
+# Bulk email address extraction: the email column is resolved once per worksheet
+# header, and each cell is validated and normalized once. The result is cached
+# on the record so later stages never recompute it.
+
+import re
+
+# Possible email column names, in priority order
+EMAIL_FIELDS = ['e-mail address', 'email', 'e-mail', 'email_address']
+
+# Keys added to each record by annotate_email_addresses
+EMAIL_KEY = '_email'
+EMAILS_KEY = '_emails'
+
+_LOCAL_PART = r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+"
+_DOMAIN = r"(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+_EMAIL_PATTERN = re.compile(f"{_LOCAL_PART}@{_DOMAIN}")
+# Fast path for the common cell holding exactly one address
+_SINGLE_EMAIL_CELL = re.compile(f"\\s*({_LOCAL_PART})@({_DOMAIN})\\s*")
+_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+def find_email_columns(header):
+    """
+    Resolve which columns of a worksheet hold email addresses.
+    :param header: Column names of the worksheet
+    :return: Matching column names, in EMAIL_FIELDS priority order
+    """
+    by_name = {str(column).strip().lower(): column for column in header}
+    return [by_name[field] for field in EMAIL_FIELDS if field in by_name]
+
+
+def normalize_address(address):
+    """
+    Validate one address and normalize it (surrounding whitespace and mailto: removed, domain lowercased).
+    :return: Normalized address, or '' if it is not a valid address
+    """
+    address = address.strip().strip('<>')
+    if address[:7].lower() == 'mailto:':
+        address = address[7:]
+    if not _EMAIL_PATTERN.fullmatch(address):
+        return ''
+    local, _, domain = address.rpartition('@')
+    return f"{local}@{domain.lower()}"
+
+
+def parse_email_cell(value):
+    """
+    All valid addresses in one cell (cells may list several, separated by commas, semicolons or spaces).
+    :return: List of normalized addresses
+    """
+    if not value or not isinstance(value, str) or '@' not in value:
+        return []
+    addresses = []
+    for part in _SEPARATORS.split(value):
+        address = normalize_address(part) if part else ''
+        if address and address not in addresses:
+            addresses.append(address)
+    return addresses
+
+
+def extract_email_column(values):
+    """
+    Parse a whole column of cells in one pass, parsing repeated values only once.
+    :param values: Cell values
+    :return: List of address tuples, one per cell
+    """
+    seen = {}
+    results = []
+    append = results.append
+    single = _SINGLE_EMAIL_CELL.fullmatch
+    for value in values:
+        if not isinstance(value, str):
+            append(())
+            continue
+        addresses = seen.get(value)
+        if addresses is None:
+            match = single(value)
+            if match is not None:
+                addresses = (f"{match.group(1)}@{match.group(2).lower()}",)
+            else:
+                addresses = tuple(parse_email_cell(value))
+            seen[value] = addresses
+        append(addresses)
+    return results
+
+
+def annotate_email_addresses(records, columns=None):
+    """
+    Store the valid addresses of each record on the record itself, under
+    EMAILS_KEY (tuple of all addresses) and EMAIL_KEY (the first one, or '').
+    :param records: List of company records from one worksheet
+    :param columns: Email columns from find_email_columns (resolved from the first record if not given)
+    :return: The email columns used
+    """
+    if not records:
+        return columns or []
+    if columns is None:
+        columns = find_email_columns(records[0].keys())
+
+    per_column = [extract_email_column([record.get(column, '') for record in records]) for column in columns]
+    if not per_column:
+        merged = [()] * len(records)
+    elif len(per_column) == 1:
+        merged = per_column[0]
+    else:
+        merged = [tuple(dict.fromkeys(address for found in row for address in found)) for row in zip(*per_column)]
+
+    for record, addresses in zip(records, merged):
+        record[EMAILS_KEY] = addresses
+        record[EMAIL_KEY] = addresses[0] if addresses else ''
+    return columns
+
+
+def get_record_email(record):
+    """
+    The record's email address, using the cached value when the record was annotated.
+    :return: Email address, or '' if the record has none
+    """
+    email = record.get(EMAIL_KEY)
+    if email is not None:
+        return email
+    for column in find_email_columns(record.keys()):
+        addresses = parse_email_cell(record.get(column, ''))
+        if addresses:
+            return addresses[0]
+    return ''
+
+
+def get_record_emails(record):
+    """
+    All of the record's email addresses, using the cached value when the record was annotated.
+    :return: Tuple of addresses, the one get_record_email returns first
+    """
+    addresses = record.get(EMAILS_KEY)
+    if addresses is not None:
+        return tuple(addresses)
+    found = []
+    for column in find_email_columns(record.keys()):
+        found.extend(parse_email_cell(record.get(column, '')))
+    return tuple(dict.fromkeys(found))
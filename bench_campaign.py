@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark a whole campaign against local fake services.
+
+Runs main.main() end to end (worksheet validation, LeadStream download, address
+extraction, rendering, the send engine, relay routing, the SMTP pool, the send
+ledger and the status write-back) with Google Sheets replaced by a synthetic
+spreadsheet and the SMTP relay by an in-process sink (see fake_services.py).
+Nothing leaves the machine.
+
+Each campaign size runs in its own process so peak memory is measured per size:
+
+    python bench_campaign.py                      # 1k, 10k and 100k leads
+    python bench_campaign.py 5000 --latency 20 --error-rate 0.02 --per-connection 100
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHEET_URL = "https://docs.google.com/spreadsheets/d/fake-sheet/edit"
+WORKSHEETS = ["Plumbing", "A/C"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end campaign benchmark against fake SMTP and Sheets.")
+    parser.add_argument('sizes', nargs='*', type=int, default=[1_000, 10_000, 100_000],
+                        help="Leads per campaign (default: 1000 10000 100000)")
+    parser.add_argument('--workers', type=int, default=8, help="Send workers (default: 8)")
+    parser.add_argument('--latency', type=float, default=5.0, help="SMTP server latency per message in ms (default: 5)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of messages rejected with 451")
+    parser.add_argument('--bounce-rate', type=float, default=0.0, help="Fraction of recipients rejected with 550")
+    parser.add_argument('--per-connection', type=int, default=None,
+                        help="Reply 421 and hang up after this many messages on a connection")
+    parser.add_argument('--per-second', type=int, default=None,
+                        help="Reply 421 to messages beyond this many per second")
+    parser.add_argument('--sheet-latency', type=float, default=0.0, help="Latency of each Sheets API call in ms")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_campaign(size, args):
+    """
+    Run one campaign of `size` leads in this process and return its measurements.
+    """
+    # State files (ledger, rate limits, lead cache) go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="bench_campaign_"))
+    sys.path.insert(0, PROJECT_DIR)
+
+    import fake_services
+    import main
+    import messaging
+    import metrics
+
+    per_worksheet = size // len(WORKSHEETS)
+    worksheets = {name: per_worksheet for name in WORKSHEETS}
+    worksheets[WORKSHEETS[-1]] += size - per_worksheet * len(WORKSHEETS)
+    spreadsheet = fake_services.install_fake_sheet(SHEET_URL, worksheets, api_latency=args.sheet_latency / 1000)
+
+    server = fake_services.FakeSMTPServer(
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        bounce_rate=args.bounce_rate,
+        max_per_connection=args.per_connection,
+        max_per_second=args.per_second,
+    )
+    # Retries are fast so injected 451s resolve within the run
+    main.RETRY_BASE_DELAY = 0.05
+    main.RETRY_MAX_DELAY = 1
+    main.RETRY_WAIT_AT_END = 5
+    argv = [
+        '--yes', '--sheet', SHEET_URL, '--worksheets', ','.join(WORKSHEETS), '--max-emails', str(size),
+        '--workers', str(args.workers), '--rate-limits', '1000000/second', '--domain-interval', '0',
+        '--no-check-mx', '--event-log', '',
+    ]
+
+    with server, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        messaging.update_email_config(server.email_config())
+        start = time.perf_counter()
+        main.main(argv)
+        elapsed = time.perf_counter() - start
+
+    summary = metrics.get_metrics().summary()
+    counters = summary['counters']
+    deliver = summary['stages'].get('deliver', {})
+    return {
+        'size': size,
+        'sent': counters.get('emails_sent', 0),
+        'deferred': counters.get('emails_deferred', 0),
+        'bounced': counters.get('emails_bounced', 0),
+        'elapsed': elapsed,
+        'emails_per_second': counters.get('emails_sent', 0) / elapsed if elapsed else 0.0,
+        'p50_ms': deliver.get('p50', 0.0) * 1000,
+        'p99_ms': deliver.get('p99', 0.0) * 1000,
+        'peak_mb': peak_memory_mb(),
+        'smtp': server.stats,
+        'sheet_api_calls': spreadsheet.api_calls,
+    }
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        print(json.dumps(run_campaign(args.sizes[0], args)))
+        return
+
+    print(f"Fake SMTP: {args.latency:g} ms/message, {args.error_rate:.1%} 451s, {args.bounce_rate:.1%} 550s, "
+          f"421 after {args.per_connection or '-'} per connection / {args.per_second or '-'} per second")
+    print(f"{'Leads':>8}{'Sent':>8}{'Retried':>9}{'Bounced':>9}{'Seconds':>9}{'Emails/s':>10}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'Peak MB':>9}{'Logins':>8}{'421s':>6}")
+    flags = [
+        '--workers', str(args.workers), '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+        '--bounce-rate', str(args.bounce_rate), '--sheet-latency', str(args.sheet_latency),
+    ]
+    if args.per_connection is not None:
+        flags += ['--per-connection', str(args.per_connection)]
+    if args.per_second is not None:
+        flags += ['--per-second', str(args.per_second)]
+    for size in args.sizes:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), str(size), '--child'] + flags,
+            capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            print(f"{size:>8}  ❌ failed:\n{child.stderr}")
+            continue
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"{result['size']:>8}{result['sent']:>8}{result['deferred']:>9}{result['bounced']:>9}"
+              f"{result['elapsed']:>9.2f}{result['emails_per_second']:>10.1f}"
+              f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['peak_mb']:>9.1f}"
+              f"{result['smtp']['logins']:>8}{result['smtp']['throttled']:>6}")
+
+
+if __name__ == "__main__":
+    main()
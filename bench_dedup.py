@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark duplicate-business detection over 200k synthetic leads spread over
+several worksheets, about 15% of them re-listings of an earlier business with
+a reformatted phone, a suffix or typo in the name, or an abbreviated address.
+
+Compares the blocked matching in dedup.py with comparing every pair of leads
+(timed on a sample and extrapolated), and checks the merges against the known
+duplicates.
+
+    python bench_dedup.py [rows]
+"""
+
+import random
+import sys
+import time
+
+from addresses import annotate_email_addresses
+from dedup import build_profiles, find_duplicate_groups, is_duplicate
+from phones import annotate_phone_numbers
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+DUPLICATE_RATE = 0.15
+NAIVE_SAMPLE = 2_000
+WORKSHEETS = ['Plumbing', 'A/C', 'Electricians', 'Roofing']
+
+_WORDS = ['Apex', 'Blue', 'Summit', 'Eagle', 'Pioneer', 'Golden', 'Liberty', 'Precision', 'Reliable', 'Premier',
+          'Ace', 'Allied', 'Classic', 'Express', 'First', 'Metro', 'Quality', 'Royal', 'Star', 'United',
+          'Valley', 'Western', 'Coastal', 'Patriot', 'Superior', 'Atlas', 'Beacon', 'Cardinal', 'Crown', 'Delta']
+_SURNAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+             'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+             'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+             'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores']
+_TRADES = ['Plumbing', 'Heating & Air', 'Electric', 'Roofing', 'HVAC', 'Drain Cleaning', 'Contractors', 'Home Repair']
+_SUFFIXES = ['', '', '', ' LLC', ' Inc.', ' Co', ' Services']
+_CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Fairview', 'Madison', 'Salem', 'Clinton',
+           'Georgetown', 'Arlington', 'Ashland', 'Dover', 'Oxford', 'Jackson', 'Burlington', 'Manchester']
+_STREETS = ['Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Washington', 'Lake', 'Hill', 'Park']
+_FREE_MAIL = ['gmail.com', 'yahoo.com', 'outlook.com', 'aol.com']
+
+
+def make_business(index, rng):
+    name = f"{rng.choice(_WORDS)} {rng.choice(_SURNAMES)} {rng.choice(_TRADES)}"
+    slug = ''.join(ch for ch in name.lower() if ch.isalnum())
+    if rng.random() < 0.6:
+        email = f"info@{slug}{index}.com"
+    else:
+        email = f"{slug}{index}@{rng.choice(_FREE_MAIL)}"
+    return {
+        'name': name + rng.choice(_SUFFIXES),
+        'email': email if rng.random() < 0.85 else '',
+        'phone': f"({200 + index // 10000 % 800}) {100 + index // 100 % 900}-{index % 10000:04d}",
+        'address': f"{rng.randint(1, 9999)} {rng.choice(_STREETS)} Street",
+        'city': rng.choice(_CITIES),
+    }
+
+
+def relist(business, rng):
+    """
+    Another listing of the same business, as a different tab or data source would have it.
+    """
+    lead = dict(business)
+    name = lead['name']
+    change = rng.random()
+    if change < 0.25:
+        name = name.upper()
+    elif change < 0.5:
+        name = name + ' LLC' if not name.endswith('LLC') else name[:-4]
+    elif change < 0.7:
+        position = rng.randrange(1, len(name) - 1)
+        name = name[:position] + name[position + 1:]  # typo: one letter dropped
+    elif change < 0.85:
+        name = name.replace('&', 'and')
+    lead['name'] = name
+    digits = ''.join(ch for ch in lead['phone'] if ch.isdigit())
+    lead['phone'] = rng.choice([lead['phone'], digits, f"+1 {digits[:3]}-{digits[3:6]}-{digits[6:]}", ''])
+    if rng.random() < 0.3:
+        lead['email'] = ''
+    if rng.random() < 0.5:
+        lead['address'] = lead['address'].replace('Street', 'St.')
+    return lead
+
+
+def make_leads(rows, rng):
+    """
+    :return: Tuple of (leads, business id of each lead)
+    """
+    leads = []
+    owners = []
+    businesses = []
+    for _ in range(rows):
+        if businesses and rng.random() < DUPLICATE_RATE:
+            owner = rng.randrange(len(businesses))
+            lead = relist(businesses[owner], rng)
+        else:
+            owner = len(businesses)
+            lead = make_business(owner, rng)
+            businesses.append(lead)
+        leads.append((rng.choice(WORKSHEETS), lead))
+        owners.append(owner)
+    return leads, owners
+
+
+def naive_groups(profiles):
+    """
+    Compare every pair of leads.
+    """
+    matches = 0
+    for i in range(len(profiles)):
+        for j in range(i + 1, len(profiles)):
+            if is_duplicate(profiles[i], profiles[j]):
+                matches += 1
+    return matches
+
+
+def main():
+    print(f"Generating {ROWS:,} synthetic leads ({DUPLICATE_RATE:.0%} re-listings) over {len(WORKSHEETS)} worksheets...")
+    rng = random.Random(42)
+    leads, owners = make_leads(ROWS, rng)
+    records = [company for _, company in leads]
+    annotate_email_addresses(records)
+    annotate_phone_numbers(records)
+
+    start = time.perf_counter()
+    profiles = build_profiles(leads)
+    profile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    groups, comparisons = find_duplicate_groups(profiles)
+    match_time = time.perf_counter() - start
+
+    # A merged lead is right if it belongs to the same business as the lead it was merged into
+    merged = sum(len(group) - 1 for group in groups)
+    wrong = sum(1 for group in groups for index in group[1:] if owners[index] != owners[group[0]])
+    expected = ROWS - len(set(owners))
+    found = merged - wrong
+
+    start = time.perf_counter()
+    naive_groups(profiles[:NAIVE_SAMPLE])
+    naive_sample_time = time.perf_counter() - start
+    naive_pairs = ROWS * (ROWS - 1) // 2
+    naive_time = naive_sample_time * naive_pairs / (NAIVE_SAMPLE * (NAIVE_SAMPLE - 1) // 2)
+
+    total = profile_time + match_time
+    print(f"\nProfiles (normalize name/phone/address):  {profile_time:.2f}s")
+    print(f"Blocking + union-find:                     {match_time:.2f}s  {comparisons:,} pairs compared")
+    print(f"Blocked total:                             {total:.2f}s  {ROWS / total:,.0f} leads/s")
+    print(f"All pairs (extrapolated from {NAIVE_SAMPLE:,} leads): {naive_time:,.0f}s  {naive_pairs:,} pairs")
+    print(f"\nDuplicate listings: {expected:,} injected, {found:,} merged correctly "
+          f"(recall {found / expected:.1%}), {wrong:,} merged wrongly "
+          f"(precision {found / merged if merged else 1:.1%})")
+
+
+if __name__ == "__main__":
+    main()
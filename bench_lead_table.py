@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory held per lead: one dict per row (as get_all_records
+returns) against Lead rows sharing a LeadTable, over a synthetic worksheet
+with many columns. Also times building the records and reading fields back.
+
+    python bench_lead_table.py [rows] [columns]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from addresses import annotate_email_addresses
+from phones import annotate_phone_numbers
+from sheets import records_from_rows
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+COLUMN_COUNTS = [int(value) for value in sys.argv[2:]] or [10, 30, 60, 100]
+
+
+def make_values(rows, columns):
+    header = ['name', 'email', 'phone', 'address', 'city'] + [f"Extra Column {i}" for i in range(columns - 5)]
+    values = [header]
+    for i in range(rows):
+        row = [f"Company {i}", f"owner{i}@example{i % 40}.com", f"(555) 555-{i % 10000:04d}",
+               f"{i % 9999 + 1} Main St", "Springfield"]
+        row += [f"value {i % 97}-{j}" if j % 3 else '' for j in range(columns - 5)]
+        values.append(row)
+    return values
+
+
+def dict_records(header, rows):
+    """
+    The old records: one dict per row, like gspread's get_all_records.
+    """
+    from gspread.utils import numericise_all
+    width = len(header)
+    records = []
+    for row_number, row in enumerate(rows, 2):
+        row = numericise_all(row[:width])
+        record = dict(zip(header, row))
+        record['_row'] = row_number
+        records.append(record)
+    return records
+
+
+def build(make_records, values):
+    records = make_records(values[0], values[1:])
+    # Extraction adds the cached _email, _emails and _phone keys to every record
+    annotate_email_addresses(records)
+    annotate_phone_numbers(records)
+    return records
+
+
+def measure(make_records, values):
+    """
+    :return: Tuple of (bytes held by the records, seconds to build them, seconds to read three fields of each)
+    """
+    start = time.perf_counter()
+    records = build(make_records, values)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for record in records:
+        record.get('name')
+        record.get('_email')
+        record.get('Extra Column 3', '')
+    read_time = time.perf_counter() - start
+    del records
+
+    # Cell strings are shared by both representations; only the per-row overhead differs
+    tracemalloc.start()
+    records = build(make_records, values)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, build_time, read_time
+
+
+def lead_records(header, rows):
+    return list(records_from_rows(header, rows))
+
+
+def main():
+    print(f"Synthetic worksheets of {ROWS:,} rows")
+    print(f"\n{'Columns':<9}{'Records':<14}{'bytes/lead':>11}{'build s':>9}{'read s':>8}{'saving':>8}")
+    for columns in COLUMN_COUNTS:
+        values = make_values(ROWS, columns)
+        dict_size, dict_build, dict_read = measure(dict_records, values)
+        lead_size, lead_build, lead_read = measure(lead_records, values)
+        print(f"{columns:<9}{'dict per row':<14}{dict_size / ROWS:>11,.0f}{dict_build:>9.2f}{dict_read:>8.2f}")
+        print(f"{'':<9}{'Lead rows':<14}{lead_size / ROWS:>11,.0f}{lead_build:>9.2f}{lead_read:>8.2f}"
+              f"{dict_size / lead_size:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark lead prioritization over 200k synthetic leads in several worksheets:
+scoring every lead, building the heap, and picking a day's quota best-first
+with per-worksheet fair shares. Compares the picks with the old behaviour of
+sending the first N rows in worksheet order.
+
+    python bench_prioritizer.py [rows] [quota]
+"""
+
+import random
+import sys
+import time
+
+from prioritizer import LeadScorer, prioritize_leads
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+QUOTA = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+WORKSHEETS = {'Plumbing': 0.5, 'A/C': 0.3, 'Electricians': 0.15, 'Roofing': 0.05}  # share of the rows
+WEIGHTS = {'Plumbing': 1, 'A/C': 1, 'Electricians': 1.5, 'Roofing': 1}
+
+RULES = [
+    {'column': 'website', 'op': 'empty', 'points': 10},
+    {'column': 'rating', 'op': '>=', 'value': 4, 'points': 3},
+    {'column': 'reviews', 'op': '>', 'value': 50, 'points': 2},
+]
+
+
+def make_leads(rows, rng):
+    names = list(WORKSHEETS)
+    shares = list(WORKSHEETS.values())
+    leads = []
+    for i in range(rows):
+        leads.append((rng.choices(names, shares)[0], {
+            'name': f"Company {i}",
+            'email': f"owner{i}@example{i % 40}.com",
+            'website': '' if rng.random() < 0.3 else f"https://company{i}.com",
+            'rating': round(rng.uniform(1, 5), 1),
+            'reviews': rng.randint(0, 200),
+            'date added': f"2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d}",
+        }))
+    # Worksheets are read one after another
+    leads.sort(key=lambda lead: names.index(lead[0]))
+    return leads
+
+
+def main():
+    rng = random.Random(7)
+    leads = make_leads(ROWS, rng)
+    scorer = LeadScorer(RULES, worksheet_weights=WEIGHTS, date_column='date added', age_points=5)
+    print(f"{ROWS:,} leads, quota {QUOTA}, worksheet weights {WEIGHTS}")
+
+    start = time.perf_counter()
+    queue, ordered = prioritize_leads(leads, scorer, lambda lead: lead['email'], QUOTA)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    picked = [next(ordered) for _ in range(QUOTA)]
+    pick_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sorted(leads, key=lambda lead: -scorer.score(lead[0], lead[1], lead[1]['email']))
+    sort_time = time.perf_counter() - start
+
+    first_rows = leads[:QUOTA]
+    print(f"\nScore + heapify:         {build_time:.2f}s  {ROWS / build_time:,.0f} leads/s")
+    print(f"Pick {QUOTA} best-first:    {pick_time * 1000:.1f}ms  {pick_time / QUOTA * 1e6:.1f}µs per pick")
+    print(f"Full sort (no shares):   {sort_time:.2f}s")
+    print(f"\n{'':<14}{'mean score':>11}  per worksheet")
+    for label, chosen in [('First N rows', first_rows), ('Prioritized', picked)]:
+        mean = sum(scorer.score(name, lead) for name, lead in chosen) / len(chosen)
+        counts = {name: 0 for name in WORKSHEETS}
+        for name, _ in chosen:
+            counts[name] += 1
+        print(f"{label:<14}{mean:>11.2f}  " + ', '.join(f"{name} {count}" for name, count in counts.items()))
+    print(f"\nFair shares: {queue.limits}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark start-up time: how long importing each module (and running main.py
+--help) takes in a fresh interpreter, and which heavy dependencies it pulls in.
+
+Each command runs several times; the table shows the median wall time with the
+bare interpreter start-up subtracted. Use `python -X importtime -c "import main"`
+to see where the remaining time goes.
+
+    python bench_startup.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+
+# Dependencies that should only be imported once they are actually needed
+HEAVY_MODULES = ['gspread', 'oauth2client', 'dotenv', 'requests', 'dns', 'http.server']
+
+TARGETS = [
+    ('import config', "import config"),
+    ('import messaging', "import messaging"),
+    ('import sheets', "import sheets"),
+    ('import status_writer', "import status_writer"),
+    ('import main', "import main"),
+    ('main.py --help', "import sys, main; sys.argv = ['main.py', '--help']\ntry:\n    main.main()\nexcept SystemExit:\n    pass"),
+]
+
+
+def run_python(code):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_DIR,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return elapsed, result.stdout
+
+
+def median_time(code):
+    return statistics.median(run_python(code)[0] for _ in range(RUNS))
+
+
+def loaded_heavy_modules(code):
+    check = f"{code}\nimport sys\nprint('LOADED:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    output = run_python(check)[1].splitlines()
+    return next((line[len('LOADED:'):] for line in output if line.startswith('LOADED:')), '')
+
+
+def main():
+    print(f"Median of {RUNS} runs per command, Python {sys.version.split()[0]}")
+    baseline = median_time("pass")
+    print(f"Interpreter start-up: {baseline * 1000:.1f} ms (subtracted below)\n")
+    print(f"{'Command':<24}{'ms':>8}  Heavy modules loaded")
+    for name, code in TARGETS:
+        try:
+            elapsed = median_time(code) - baseline
+            heavy = loaded_heavy_modules(code) or '-'
+        except RuntimeError as e:
+            print(f"{name:<24}  ❌ {e}")
+            continue
+        print(f"{name:<24}{elapsed * 1000:>8.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
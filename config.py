@@ -0,0 +1,130 @@
+# config.py
+# Settings from the environment and the .env file, shared by every module.
+# Nothing is read at import time: the .env file is loaded the first time a
+# setting is used, so commands that never need one (--help, --merge-results)
+# start without touching it.
+
+import os
+import threading
+
+
+def _flag(value):
+    return str(value).lower() == 'true'
+
+
+# Setting -> (environment variable, default, type)
+SETTINGS = {
+    'SMTP_SERVER': ('SMTP_SERVER', 'smtp-mail.outlook.com', str),  # Outlook default
+    'SMTP_PORT': ('SMTP_PORT', '587', int),  # Outlook uses 587
+    'SENDER_EMAIL': ('SENDER_EMAIL', 'your-email@outlook.com', str),
+    'SENDER_PASSWORD': ('SENDER_PASSWORD', 'your-password', str),
+    'SENDER_NAME': ('SENDER_NAME', 'Your Company Name', str),
+    'USE_TLS': ('USE_TLS', 'True', _flag),  # Outlook requires TLS
+    # SMTP session pool: sessions kept open at once, and re-login after this many sends
+    'SMTP_POOL_SIZE': ('SMTP_POOL_SIZE', '2', int),
+    'SMTP_MAX_MESSAGES_PER_SESSION': ('SMTP_MAX_MESSAGES_PER_SESSION', '50', int),
+    # Optional JSON list of extra relays / sender accounts (see relay_router.py)
+    'SMTP_RELAYS_FILE': ('SMTP_RELAYS_FILE', 'smtp_relays.json', str),
+    # Google service account key
+    'SERVICE_ACCOUNT_FILE': ('GOOGLE_SERVICE_ACCOUNT', 'service_account.json', str),
+    # Local copy of worksheet values; an empty string disables it
+    'LEAD_CACHE_FILE': ('LEAD_CACHE_FILE', 'lead_cache.sqlite3', str),
+    # Serve everything from the local cache without touching the Google APIs
+    'OFFLINE_MODE': ('OFFLINE_MODE', 'False', _flag),
+    # Rows requested per call when streaming a worksheet
+    'SHEET_PAGE_SIZE': ('SHEET_PAGE_SIZE', '5000', int),
+    # Worksheets downloaded at the same time (the read quota is shared, see sheets.call_with_backoff)
+    'SHEETS_MAX_CONCURRENCY': ('SHEETS_MAX_CONCURRENCY', '8', int),
+    # SMS provider (see sms.py); texting is off while SMS_API_URL is empty
+    'SMS_API_URL': ('SMS_API_URL', '', str),
+    'SMS_API_TOKEN': ('SMS_API_TOKEN', '', str),
+    'SMS_FROM_NUMBER': ('SMS_FROM_NUMBER', '', str),
+    'SMS_RATE_LIMITS': ('SMS_RATE_LIMITS', '1/second, 200/day', str),
+    'SMS_MAX_CONCURRENCY': ('SMS_MAX_CONCURRENCY', '8', int),
+    # Keeps the SMS daily quota across runs
+    'SMS_RATE_LIMIT_STATE_FILE': ('SMS_RATE_LIMIT_STATE_FILE', 'rate_limit_state.sms.json', str),
+    # Calling code assumed for numbers in the sheet written without one (1 = US/Canada)
+    'SMS_COUNTRY_CODE': ('SMS_COUNTRY_CODE', '1', str),
+}
+
+# EMAIL_CONFIG key -> setting
+EMAIL_SETTINGS = {
+    'smtp_server': 'SMTP_SERVER',
+    'smtp_port': 'SMTP_PORT',
+    'sender_email': 'SENDER_EMAIL',
+    'sender_password': 'SENDER_PASSWORD',
+    'sender_name': 'SENDER_NAME',
+    'use_tls': 'USE_TLS',
+}
+
+
+class Config:
+    """
+    Lazily loaded application settings, read as attributes (settings.SMTP_POOL_SIZE).
+
+    The .env file is loaded on first access and overrides the environment, as
+    messaging.py always did. Assigning an attribute overrides the setting for the
+    rest of the run. `email` is the shared EMAIL_CONFIG dictionary.
+    """
+
+    def __init__(self, env_file=None):
+        """
+        :param env_file: Path of the .env file (default: search from the working directory)
+        """
+        object.__setattr__(self, '_env_file', env_file)
+        object.__setattr__(self, '_lock', threading.RLock())
+        self.reset()
+
+    def reset(self):
+        """
+        Forget loaded values and overrides; the next access reads .env again.
+        """
+        with self._lock:
+            object.__setattr__(self, '_values', {})
+            object.__setattr__(self, '_email', None)
+            object.__setattr__(self, '_loaded', False)
+
+    def load(self):
+        """
+        Load the .env file into the environment, once.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            object.__setattr__(self, '_loaded', True)
+            try:
+                from dotenv import load_dotenv
+            except ImportError:
+                return
+            load_dotenv(self._env_file, override=True)
+
+    def __getattr__(self, name):
+        # Only called for names that aren't regular attributes
+        if name not in SETTINGS:
+            raise AttributeError(f"Unknown setting: {name}")
+        with self._lock:
+            if name not in self._values:
+                self.load()
+                variable, default, convert = SETTINGS[name]
+                self._values[name] = convert(os.getenv(variable, default))
+            return self._values[name]
+
+    def __setattr__(self, name, value):
+        if name not in SETTINGS:
+            raise AttributeError(f"Unknown setting: {name}")
+        with self._lock:
+            self._values[name] = value
+
+    @property
+    def email(self):
+        """
+        Email configuration dictionary (smtp_server, smtp_port, sender_email,
+        sender_password, sender_name, use_tls), built once and updated in place.
+        """
+        with self._lock:
+            if self._email is None:
+                object.__setattr__(self, '_email', {key: getattr(self, name) for key, name in EMAIL_SETTINGS.items()})
+            return self._email
+
+
+settings = Config()
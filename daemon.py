@@ -0,0 +1,432 @@
+# daemon.py
+# Long-running campaign mode. Instead of a one-shot run that logs in, downloads
+# the sheet and exits, the daemon keeps its Sheets client, SMTP sessions and send
+# workers warm, polls the spreadsheet for new rows, queues new leads in a durable
+# job queue (job_queue.py) and sends them as the daily quota allows, spread over
+# the sending hours. A small HTTP interface on localhost pauses, resumes and
+# reports on it.
+
+import json
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+import metrics
+import sheets
+from pipeline import LeadStream
+from retry_queue import RetryPolicy
+from utils import normalize_email
+from status_writer import ALREADY_SENT, FAILED as FAILED_STATUS, SENT, TEXTED
+
+# Outcomes that use up the daily quota
+SENT_OUTCOMES = (SENT, TEXTED)
+
+# Key added to each lead handed to the send engine, with the id of its job
+JOB_KEY = '_job'
+
+# Commands of the control interface: name -> HTTP method
+CONTROL_COMMANDS = {'status': 'GET', 'pause': 'POST', 'resume': 'POST', 'poll': 'POST'}
+
+
+class DailyPacer:
+    """
+    Spread a daily quota evenly over the sending hours.
+
+    By any moment of the sending window, at most burst + quota x (fraction of the
+    window gone by) sends are allowed. Leads that arrive while the campaign is
+    behind schedule go out at once; a backlog drains at the even pace instead of
+    all at the start of the day.
+    """
+
+    def __init__(self, daily_quota, start_hour=0, end_hour=24, burst=1):
+        """
+        :param daily_quota: Sends per day
+        :param start_hour: Hour (local time) sending starts
+        :param end_hour: Hour sending stops (24 for midnight)
+        :param burst: Sends allowed ahead of the even pace
+        """
+        if not 0 <= start_hour < end_hour <= 24:
+            raise ValueError(f"Invalid sending hours {start_hour}-{end_hour}")
+        self.daily_quota = daily_quota
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.burst = burst
+
+    def window(self, now=None):
+        """
+        :return: (start, end) datetimes of today's sending window
+        """
+        now = now or datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight + timedelta(hours=self.start_hour), midnight + timedelta(hours=self.end_hour)
+
+    def wait_time(self, sent_today, now=None):
+        """
+        Seconds to wait before the next send.
+        :param sent_today: Sends so far in today's window (including ones under way)
+        """
+        now = now or datetime.now()
+        start, end = self.window(now)
+        if now < start:
+            return (start - now).total_seconds()
+        if now >= end or sent_today >= self.daily_quota:
+            return (start + timedelta(days=1) - now).total_seconds()
+        length = (end - start).total_seconds()
+        allowed = self.burst + self.daily_quota * (now - start).total_seconds() / length
+        if sent_today < allowed:
+            return 0.0
+        # When the allowance reaches one more send
+        due = start + timedelta(seconds=length * (sent_today + 1 - self.burst) / self.daily_quota)
+        return max(0.0, (due - now).total_seconds())
+
+
+class SheetPoller:
+    """
+    Read the sheet when it has changed and queue the leads not seen before.
+
+    Use as the `poll` callable of CampaignDaemon. Rows already queued (or
+    dropped) are skipped before they are scored or stored, so a poll of a large
+    sheet with a few new rows stays cheap.
+    """
+
+    def __init__(self, sheet_name, worksheet_names, get_recipient, score, already_sent=None,
+                 domain_checker=None, on_drop=None, fallback=None):
+        """
+        :param sheet_name: The name or URL of the Google Sheet
+        :param worksheet_names: Worksheets to poll
+        :param get_recipient: Callable company_info -> email address or phone number, or '' if none
+        :param score: Callable (worksheet_name, company_info, recipient) -> priority
+        :param already_sent: Callable recipient -> True if it was contacted in this campaign (optional)
+        :param domain_checker: DomainChecker dropping undeliverable leads before they are queued (optional)
+        :param on_drop: Callable (worksheet_name, company_info) for each dropped lead (optional)
+        :param fallback: Callable company_info -> True if a lead with no deliverable email can be texted (optional)
+        """
+        self.sheet_name = sheet_name
+        self.worksheet_names = list(worksheet_names)
+        self.get_recipient = get_recipient
+        self.score = score
+        self.already_sent = already_sent
+        self.domain_checker = domain_checker
+        self.on_drop = on_drop
+        self.fallback = fallback
+        self.version = None
+        self.known = None  # keys of every lead already queued or dropped
+
+    def _is_new(self, company):
+        recipient = self.get_recipient(company)
+        if not recipient or normalize_email(recipient) in self.known:
+            return False
+        return self.already_sent is None or not self.already_sent(recipient)
+
+    def sheet_written(self, old_version, new_version):
+        """
+        The campaign itself changed the sheet (e.g. the status columns): no new leads to look for.
+        """
+        if old_version == self.version:
+            self.version = new_version
+
+    def _dropped(self, worksheet_name, company):
+        self.known.add(normalize_email(self.get_recipient(company)))
+        if self.on_drop is not None:
+            self.on_drop(worksheet_name, company)
+
+    def __call__(self, jobs):
+        """
+        :param jobs: JobQueue to add the new leads to
+        :return: Number of new jobs
+        """
+        if self.known is None:
+            self.known = jobs.keys()
+        # The sheet's Drive modified time only changes when someone edits it
+        version = sheets.get_spreadsheet_version(self.sheet_name)
+        if version is not None and version == self.version:
+            return 0
+        # Row counts come from the cached worksheet metadata; reload it so rows
+        # added past the old end of the grid are paged in too
+        sheets.invalidate_cache(self.sheet_name)
+        stream = LeadStream(self.sheet_name, self.worksheet_names)
+        leads = ((name, company) for name, company in stream if self._is_new(company))
+        if self.domain_checker is not None:
+            leads = self.domain_checker.filter_leads(leads, on_drop=self._dropped, fallback=self.fallback)
+        new_jobs = []
+        for worksheet_name, company in leads:
+            recipient = self.get_recipient(company)
+            new_jobs.append((normalize_email(recipient), worksheet_name, company,
+                             self.score(worksheet_name, company, recipient)))
+        added = jobs.enqueue(new_jobs)
+        self.known.update(key for key, _, _, _ in new_jobs)
+        # A worksheet that failed to load is read again on the next poll
+        if not stream.errors:
+            self.version = version
+        return added
+
+
+class CampaignDaemon:
+    """
+    Poll for new leads, queue them durably and feed them to a long-running SendEngine.
+
+    Pass the daemon to the engine as its status writer: each lead's outcome
+    completes its job (and is passed on to the real status writer, if any).
+    """
+
+    def __init__(self, jobs, poll, pacer=None, poll_interval=15, status_writer=None, is_done=None, retry_policy=None):
+        """
+        :param jobs: JobQueue of the campaign
+        :param poll: Callable jobs -> number of new jobs queued; reads the sheet and enqueues new leads
+        :param pacer: DailyPacer spreading the sends over the day (optional)
+        :param poll_interval: Seconds between two polls of the sheet
+        :param status_writer: StatusWriter that also gets each lead's outcome (optional)
+        :param is_done: Callable company_info -> outcome if the lead needs nothing more
+                        (e.g. already contacted in this campaign), else None (optional)
+        :param retry_policy: RetryPolicy for leads whose send failed (default RetryPolicy())
+        """
+        self.jobs = jobs
+        self.poll = poll
+        self.pacer = pacer
+        self.poll_interval = poll_interval
+        self.status_writer = status_writer
+        self.is_done = is_done
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.started_at = time.time()
+        self.polls = 0
+        self.last_poll = None
+        self.last_poll_new = 0
+        self.last_poll_error = None
+        self.outcomes = {}
+        self._in_flight = {}  # job id -> Job handed to the engine
+        self._lock = threading.Lock()
+        self._paused = threading.Event()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._poll_now = threading.Event()
+
+    @property
+    def paused(self):
+        return self._paused.is_set()
+
+    def pause(self):
+        if not self._paused.is_set():
+            self._paused.set()
+            print("⏸️  Campaign paused")
+            metrics.event('daemon_paused')
+
+    def resume(self):
+        if self._paused.is_set():
+            self._paused.clear()
+            self._wake.set()
+            print("▶️  Campaign resumed")
+            metrics.event('daemon_resumed')
+
+    def poll_now(self):
+        """
+        Poll the sheet right away instead of at the next interval.
+        """
+        self._poll_now.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._poll_now.set()
+
+    def _sent_today(self):
+        start, _ = self.pacer.window()
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return self.jobs.completed_since(start.timestamp(), SENT_OUTCOMES) + in_flight
+
+    def next_send_in(self):
+        """
+        Seconds until the pacer allows the next send (0 when there is no pacer).
+        """
+        if self.pacer is None:
+            return 0.0
+        return self.pacer.wait_time(self._sent_today())
+
+    def status(self):
+        """
+        :return: Dictionary describing the daemon, as served by the control interface
+        """
+        with self._lock:
+            in_flight = len(self._in_flight)
+            outcomes = dict(self.outcomes)
+        status = {
+            'paused': self.paused,
+            'jobs': self.jobs.counts(),
+            'in_flight': in_flight,
+            'outcomes': outcomes,
+            'polls': self.polls,
+            'last_poll': datetime.fromtimestamp(self.last_poll).isoformat(timespec='seconds') if self.last_poll else None,
+            'last_poll_new': self.last_poll_new,
+            'last_poll_error': self.last_poll_error,
+            'uptime': round(time.time() - self.started_at),
+        }
+        if self.pacer is not None:
+            status['daily_quota'] = self.pacer.daily_quota
+            status['sent_today'] = self._sent_today()
+            status['next_send_in'] = round(self.next_send_in(), 1)
+        return status
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            # Leads can wait in the engine (domain spacing, retries) for longer than a lease
+            with self._lock:
+                in_flight = list(self._in_flight)
+            self.jobs.renew(in_flight)
+            try:
+                with metrics.timer('daemon_poll'):
+                    new = self.poll(self.jobs)
+                self.last_poll_error = None
+            except Exception as e:
+                new = 0
+                self.last_poll_error = str(e)
+                print(f"⚠️  Polling the sheet failed: {str(e)}")
+            self.polls += 1
+            self.last_poll = time.time()
+            self.last_poll_new = new
+            if new:
+                print(f"📥 {new} new leads queued")
+                metrics.increment('daemon_leads_queued', new)
+                self._wake.set()
+            self._poll_now.wait(self.poll_interval)
+            self._poll_now.clear()
+
+    def _wait(self, seconds):
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def leads(self):
+        """
+        The leads to send, for SendEngine.run: leased from the job queue as the
+        pacer allows, waiting while paused or idle, until stop() is called.
+        :return: Generator of (worksheet_name, company_info) tuples
+        """
+        while not self._stopped.is_set():
+            if self._paused.is_set():
+                self._wait(1)
+                continue
+            delay = self.next_send_in()
+            if delay > 0:
+                # Wake up now and then so pause/stop and new quota are noticed
+                self._wait(min(delay, 5))
+                continue
+            job = self.jobs.lease()
+            if job is None:
+                self._wait(1)
+                continue
+            outcome = self.is_done(job.company) if self.is_done is not None else None
+            if outcome is not None:
+                self.jobs.complete(job.id, outcome)
+                continue
+            job.company[JOB_KEY] = job.id
+            with self._lock:
+                if job.id in self._in_flight:
+                    # Its lease ran out while the engine still had it
+                    continue
+                self._in_flight[job.id] = job
+            yield job.worksheet, job.company
+
+    def record(self, worksheet_name, company, status, message_id=''):
+        """
+        Outcome of a lead (StatusWriter interface): completes the lead's job.
+        """
+        if self.status_writer is not None:
+            self.status_writer.record(worksheet_name, company, status, message_id)
+        job_id = company.get(JOB_KEY)
+        with self._lock:
+            self.outcomes[status] = self.outcomes.get(status, 0) + 1
+            job = self._in_flight.pop(job_id, None)
+            if job is None:
+                # e.g. a retry left over from an earlier run, which the send ledger tracks
+                return
+        if status == FAILED_STATUS:
+            retry = self.retry_policy.should_retry(job.attempts)
+            self.jobs.fail(job_id, status, retry_in=self.retry_policy.delay(job.attempts) if retry else None)
+        else:
+            # Sent, bounced, skipped, already sent, or handed to the ledger's retry queue
+            self.jobs.complete(job_id, status)
+
+    def run(self, send, control_port=None):
+        """
+        Run until stopped (Ctrl+C, SIGTERM or stop()).
+        :param send: Callable leads -> None that sends the leads (e.g. a SendEngine.run call)
+        :param control_port: Serve the control interface on this port (optional)
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        poller = threading.Thread(target=self._poll_loop, name="sheet-poller", daemon=True)
+        poller.start()
+        server = start_control_server(self, control_port) if control_port else None
+        if server is not None:
+            print(f"🎛️  Control interface on http://{server.server_address[0]}:{server.server_address[1]}/status")
+        try:
+            send(self.leads())
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            self.stop()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            poller.join(timeout=self.poll_interval + 5)
+            # Leads handed out but never sent go back to the queue for the next start
+            with self._lock:
+                left, self._in_flight = list(self._in_flight), {}
+            for job_id in left:
+                self.jobs.release(job_id)
+
+
+def start_control_server(daemon, port, host='127.0.0.1'):
+    """
+    Serve the daemon's control interface from a background thread:
+    GET /status, POST /pause, POST /resume, POST /poll (all answer with the status as JSON).
+    :return: The server (its server_address has the actual port when port is 0)
+    """
+    # Imported here: http.server is slow to import and only the daemon needs it
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    actions = {'/pause': daemon.pause, '/resume': daemon.resume, '/poll': daemon.poll_now}
+
+    class ControlHandler(BaseHTTPRequestHandler):
+        def reply(self, data):
+            body = json.dumps(data, indent=2).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/status':
+                self.send_error(404)
+                return
+            self.reply(daemon.status())
+
+        def do_POST(self):
+            action = actions.get(self.path.split('?')[0])
+            if action is None:
+                self.send_error(404)
+                return
+            action()
+            self.reply(daemon.status())
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), ControlHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="daemon-control", daemon=True).start()
+    return server
+
+
+def send_control(command, port, host='127.0.0.1', timeout=10):
+    """
+    Send a command to a running daemon's control interface.
+    :param command: One of CONTROL_COMMANDS
+    :return: The daemon's status after the command
+    """
+    from urllib.request import Request, urlopen
+
+    request = Request(f"http://{host}:{port}/{command}", method=CONTROL_COMMANDS[command])
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
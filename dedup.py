@@ -0,0 +1,292 @@
+# dedup.py
+# Fuzzy duplicate detection across worksheets. The same business is often listed
+# in several tabs (or twice in one) with a slightly different name, phone format
+# or address. Instead of comparing every pair of leads, each lead is put into a
+# few blocks (same phone, same email, same company domain, same name tokens), only
+# leads sharing a block are compared, and matches are merged with union-find.
+
+import gc
+import re
+import threading
+from contextlib import contextmanager
+
+from addresses import get_record_email
+from phones import get_record_phone
+
+# Possible street address and city column names, in priority order
+ADDRESS_FIELDS = ['address', 'street address', 'street', 'address 1', 'address1']
+CITY_FIELDS = ['city', 'town']
+
+# Key added to each canonical lead: list of (worksheet_name, company_info) merged into it
+DUPLICATES_KEY = '_duplicates'
+
+# Minimum trigram similarity (0-1) of two names for a fuzzy match
+NAME_SIMILARITY = 0.7
+
+# Blocks with more leads than this say nothing (e.g. every "plumbing" company) and are skipped
+MAX_BLOCK_SIZE = 50
+
+# Shared mail providers: the same domain doesn't mean the same business
+FREE_MAIL_DOMAINS = {
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'ymail.com', 'outlook.com', 'hotmail.com', 'live.com',
+    'msn.com', 'aol.com', 'icloud.com', 'me.com', 'mac.com', 'comcast.net', 'att.net', 'verizon.net',
+    'sbcglobal.net', 'bellsouth.net', 'protonmail.com', 'gmx.com', 'mail.com',
+}
+
+# Words that don't tell two businesses apart
+NAME_STOPWORDS = {
+    'the', 'and', 'of', 'inc', 'incorporated', 'llc', 'llp', 'lp', 'pllc', 'ltd', 'limited',
+    'co', 'corp', 'corporation', 'company', 'group', 'services', 'service',
+}
+
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd',
+    'lane': 'ln', 'court': 'ct', 'place': 'pl', 'highway': 'hwy', 'parkway': 'pkwy', 'suite': 'ste',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w', 'apartment': 'apt', 'unit': 'apt',
+}
+
+_NOT_WORD = re.compile(r'[^a-z0-9]+')
+
+
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Pause the cyclic garbage collector while building many small objects that live
+    until the end anyway; otherwise it re-scans them over and over (several times
+    slower on 200k leads). The collector is process-wide, so overlapping pauses
+    (other threads) are counted and it is turned back on when the last one ends,
+    exception or not.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def _find_column(header, fields):
+    by_name = {str(column).strip().lower(): column for column in header}
+    return next((by_name[field] for field in fields if field in by_name), None)
+
+
+def normalize_name(name):
+    """
+    Company name as a tuple of significant lowercase tokens.
+    "The Smith & Sons Plumbing, Inc." -> ('smith', 'sons', 'plumbing')
+    """
+    if not isinstance(name, str):
+        name = str(name or '')
+    name = name.lower().replace("'", '').replace('&', ' and ')
+    return tuple(token for token in _NOT_WORD.split(name) if token and token not in NAME_STOPWORDS)
+
+
+def normalize_address(address):
+    """
+    Street address in one canonical spelling: "123 N. Main Street, Suite 4" -> "123 n main st ste 4"
+    """
+    if not isinstance(address, str):
+        address = str(address or '')
+    tokens = _NOT_WORD.split(address.lower())
+    return ' '.join(ADDRESS_ABBREVIATIONS.get(token, token) for token in tokens if token)
+
+
+def trigrams(text):
+    """
+    Set of the 3-letter substrings of text (padded, so short names still have some).
+    """
+    text = f"  {text} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def similarity(a, b):
+    """
+    Jaccard similarity of two trigram sets.
+    """
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+class LeadProfile:
+    """
+    The normalized fields of one lead that matching looks at, computed once.
+    """
+
+    __slots__ = ('tokens', 'trigrams', 'phone', 'email', 'domain', 'address', 'city')
+
+    def __init__(self, tokens, phone, email, address, city):
+        self.tokens = tokens
+        self.trigrams = trigrams(' '.join(tokens)) if tokens else frozenset()
+        self.phone = phone
+        self.email = email.lower()
+        domain = self.email.rpartition('@')[2]
+        self.domain = domain if domain and domain not in FREE_MAIL_DOMAINS else ''
+        self.address = address
+        self.city = city
+
+    def blocking_keys(self):
+        """
+        Keys of the blocks this lead goes into; only leads sharing a key are compared.
+        """
+        keys = []
+        if self.phone:
+            keys.append('p:' + self.phone)
+        if self.email:
+            keys.append('e:' + self.email)
+        if self.domain:
+            keys.append('d:' + self.domain)
+        if self.tokens:
+            keys.append('n:' + ' '.join(sorted(self.tokens)))
+            keys.extend('t:' + token for token in self.tokens if len(token) > 2)
+        return keys
+
+
+def is_duplicate(a, b):
+    """
+    Decide whether two lead profiles are the same business.
+    The same phone number or email address is enough. Otherwise the names must be
+    similar and the leads must share a company domain, street address or city.
+    A phone, address or domain that both leads have but that differs counts against
+    the match: with one, the city alone is not enough; with two, it is no match.
+    """
+    if a.phone and a.phone == b.phone:
+        return True
+    if a.email and a.email == b.email:
+        return True
+    conflicts = (bool(a.phone and b.phone and a.phone != b.phone)
+                 + bool(a.address and b.address and a.address != b.address)
+                 + bool(a.domain and b.domain and a.domain != b.domain))
+    if conflicts > 1 or similarity(a.trigrams, b.trigrams) < NAME_SIMILARITY:
+        return False
+    if (a.domain and a.domain == b.domain) or (a.address and a.address == b.address):
+        return True
+    return not conflicts and bool(a.city and a.city == b.city)
+
+
+def build_profiles(leads):
+    """
+    Profile every lead, resolving the name, address and city columns once per worksheet.
+    :param leads: List of (worksheet_name, company_info) tuples
+    :return: List of LeadProfile, one per lead
+    """
+    columns = {}
+    profiles = []
+    append = profiles.append
+    with _gc_paused():
+        for worksheet_name, company in leads:
+            found = columns.get(worksheet_name)
+            if found is None:
+                header = company.keys()
+                found = columns[worksheet_name] = (
+                    _find_column(header, ['name', 'company', 'company name', 'business name']),
+                    _find_column(header, ADDRESS_FIELDS),
+                    _find_column(header, CITY_FIELDS),
+                )
+            name_column, address_column, city_column = found
+            append(LeadProfile(
+                normalize_name(company.get(name_column, '')) if name_column else (),
+                get_record_phone(company),
+                get_record_email(company),
+                normalize_address(company.get(address_column, '')) if address_column else '',
+                normalize_address(company.get(city_column, '')) if city_column else '',
+            ))
+    return profiles
+
+
+def find_duplicate_groups(profiles, max_block_size=MAX_BLOCK_SIZE):
+    """
+    Group the profiles that describe the same business.
+    :param profiles: List of LeadProfile
+    :param max_block_size: Blocks larger than this are skipped
+    :return: Tuple of (groups, comparisons): lists of profile indices with more than one
+             member, each sorted so the first index is the earliest listing, and the
+             number of pairs compared
+    """
+    blocks = {}
+    with _gc_paused():
+        for index, profile in enumerate(profiles):
+            for key in profile.blocking_keys():
+                block = blocks.get(key)
+                if block is None:
+                    blocks[key] = [index]
+                else:
+                    block.append(index)
+
+    parent = list(range(len(profiles)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    comparisons = 0
+    for block in blocks.values():
+        if len(block) < 2 or len(block) > max_block_size:
+            continue
+        for position, i in enumerate(block):
+            for j in block[position + 1:]:
+                root_i, root_j = find(i), find(j)
+                if root_i == root_j:
+                    continue
+                comparisons += 1
+                if is_duplicate(profiles[i], profiles[j]):
+                    # The earliest listing stays the root, so it becomes the canonical lead
+                    if root_i < root_j:
+                        parent[root_j] = root_i
+                    else:
+                        parent[root_i] = root_j
+
+    groups = {}
+    for index in range(len(profiles)):
+        root = find(index)
+        if root != index:
+            groups.setdefault(root, [root]).append(index)
+    return list(groups.values()), comparisons
+
+
+def merge_leads(canonical, duplicates):
+    """
+    Merge duplicate listings into the canonical lead: empty fields are filled from the
+    duplicates, in order, and the duplicates are kept under DUPLICATES_KEY.
+    :param canonical: company_info of the earliest listing (updated in place)
+    :param duplicates: List of (worksheet_name, company_info) listings of the same business
+    :return: The canonical company_info
+    """
+    for _, company in duplicates:
+        for key, value in company.items():
+            if value and not canonical.get(key):
+                canonical[key] = value
+    canonical[DUPLICATES_KEY] = list(duplicates)
+    return canonical
+
+
+def dedup_leads(leads):
+    """
+    Merge the listings of the same business into one lead.
+    This needs every lead up front, so a LeadStream is read to the end first.
+    :param leads: Iterable of (worksheet_name, company_info) tuples
+    :return: Tuple of (leads, merged): the remaining leads in their original order,
+             and the number of listings merged into another
+    """
+    leads = list(leads)
+    groups, _ = find_duplicate_groups(build_profiles(leads))
+    merged = set()
+    for group in groups:
+        merge_leads(leads[group[0]][1], [leads[index] for index in group[1:]])
+        merged.update(group[1:])
+    return [lead for index, lead in enumerate(leads) if index not in merged], len(merged)
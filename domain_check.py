@@ -0,0 +1,223 @@
+# domain_check.py
+# Pre-send deliverability check: resolve the MX records of each recipient domain
+# once, concurrently, and drop leads whose domain cannot receive mail before
+# they reach the send queue. Results are cached on disk, respecting DNS TTLs,
+# with negative caching for domains that don't exist.
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from addresses import EMAIL_KEY, EMAILS_KEY, get_record_emails
+
+
+class DomainNotFound(Exception):
+    """
+    The domain does not exist (NXDOMAIN).
+    """
+
+
+class DnsPythonResolver:
+    """
+    MX lookups through dnspython. Point `nameservers`/`port` at a local stub DNS server for testing.
+    """
+
+    def __init__(self, nameservers=None, port=53, timeout=5):
+        import dns.resolver  # Optional dependency, only needed when MX checks are enabled
+
+        self._dns = dns
+        self.resolver = dns.resolver.Resolver(configure=nameservers is None)
+        if nameservers is not None:
+            self.resolver.nameservers = list(nameservers)
+        self.resolver.port = port
+        self.resolver.lifetime = timeout
+
+    def resolve(self, domain):
+        """
+        :return: Tuple of (mail hosts, ttl in seconds); no hosts means the domain takes no mail
+        :raises DomainNotFound: if the domain does not exist
+        """
+        dns = self._dns
+        try:
+            answer = self.resolver.resolve(domain, 'MX')
+            hosts = [str(record.exchange).rstrip('.') for record in answer]
+            # A "null MX" (RFC 7505) explicitly refuses mail
+            return [host for host in hosts if host], answer.rrset.ttl
+        except dns.resolver.NXDOMAIN:
+            raise DomainNotFound(domain)
+        except dns.resolver.NoAnswer:
+            pass
+        # No MX record: mail goes to the domain's own address records (RFC 5321)
+        try:
+            answer = self.resolver.resolve(domain, 'A')
+            return [domain], answer.rrset.ttl
+        except dns.resolver.NXDOMAIN:
+            raise DomainNotFound(domain)
+        except dns.resolver.NoAnswer:
+            return [], 3600
+
+
+class StaticResolver:
+    """
+    Resolver answering from a dictionary of domain -> mail hosts. Unknown domains are NXDOMAIN.
+    """
+
+    def __init__(self, records, ttl=3600, delay=0):
+        self.records = {domain.lower(): hosts for domain, hosts in records.items()}
+        self.ttl = ttl
+        self.delay = delay
+        self.lookups = 0
+
+    def resolve(self, domain):
+        self.lookups += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if domain not in self.records:
+            raise DomainNotFound(domain)
+        return list(self.records[domain]), self.ttl
+
+
+class DomainChecker:
+    """
+    Cached, concurrent deliverability checks for recipient domains.
+    """
+
+    def __init__(self, resolver, cache_file=None, max_workers=16, min_ttl=300, negative_ttl=3600):
+        """
+        :param resolver: Object with resolve(domain) -> (hosts, ttl), e.g. DnsPythonResolver
+        :param cache_file: JSON file that keeps results across runs (optional)
+        :param max_workers: Concurrent DNS lookups
+        :param min_ttl: Cache good results at least this many seconds
+        :param negative_ttl: Cache NXDOMAIN and no-mail results this many seconds
+        """
+        self.resolver = resolver
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.min_ttl = min_ttl
+        self.negative_ttl = negative_ttl
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read domain cache from {self.cache_file}: {e}")
+            return {}
+        now = time.time()
+        return {domain: entry for domain, entry in cache.items() if entry['expires'] > now}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            cache = dict(self._cache)
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def _cached(self, domain, now):
+        entry = self._cache.get(domain)
+        if entry is None or entry['expires'] <= now:
+            return None
+        return entry['ok']
+
+    def _lookup(self, domain):
+        try:
+            with metrics.timer('mx_lookup'):
+                hosts, ttl = self.resolver.resolve(domain)
+        except DomainNotFound:
+            return domain, False, self.negative_ttl
+        except Exception as e:
+            # Timeouts and server failures say nothing about the domain; don't drop or cache
+            print(f"⚠️  MX lookup for {domain} failed: {str(e)}")
+            return domain, True, None
+        if not hosts:
+            return domain, False, self.negative_ttl
+        return domain, True, max(ttl, self.min_ttl)
+
+    def check_domains(self, domains):
+        """
+        Check several domains, resolving the uncached ones concurrently.
+        :param domains: Iterable of domain names
+        :return: Dictionary of domain -> True if it can receive mail
+        """
+        now = time.time()
+        results = {}
+        to_resolve = []
+        with self._lock:
+            for domain in set(domains):
+                ok = self._cached(domain, now)
+                if ok is None:
+                    to_resolve.append(domain)
+                else:
+                    results[domain] = ok
+
+        if to_resolve:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_resolve))) as executor:
+                lookups = list(executor.map(self._lookup, to_resolve))
+            with self._lock:
+                for domain, ok, ttl in lookups:
+                    results[domain] = ok
+                    if ttl is not None:
+                        self._cache[domain] = {'ok': ok, 'expires': now + ttl}
+        return results
+
+    def is_deliverable(self, domain):
+        return self.check_domains([domain])[domain]
+
+    def filter_leads(self, leads, batch_size=200, on_drop=None, fallback=None):
+        """
+        Drop leads none of whose email domains can receive mail.
+        Every address of a lead is checked; dead addresses are removed from the
+        record, so the lead is emailed at one that works. Leads are checked in
+        batches so each batch's new domains resolve concurrently.
+        :param leads: Iterable of (worksheet_name, company_info) tuples
+        :param on_drop: Called with (worksheet_name, company_info) for each dropped lead (optional)
+        :param fallback: Callable company_info -> True if the lead can be contacted another
+                         way (e.g. texted); such leads are kept, without email addresses (optional)
+        :return: Generator of the deliverable (and email-less) leads
+        """
+        batch = []
+        for lead in leads:
+            batch.append(lead)
+            if len(batch) >= batch_size:
+                yield from self._filter_batch(batch, on_drop, fallback)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch, on_drop, fallback)
+
+    def _filter_batch(self, batch, on_drop=None, fallback=None):
+        lead_addresses = [get_record_emails(company) for _, company in batch]
+        results = self.check_domains(
+            address.rpartition('@')[2].lower() for addresses in lead_addresses for address in addresses
+        )
+        for lead, addresses in zip(batch, lead_addresses):
+            company = lead[1]
+            live = tuple(address for address in addresses if results[address.rpartition('@')[2].lower()])
+            if live == addresses:
+                yield lead
+                continue
+            if live or (fallback is not None and fallback(company)):
+                company[EMAILS_KEY] = live
+                company[EMAIL_KEY] = live[0] if live else ''
+                if not live:
+                    metrics.increment('leads_email_undeliverable')
+                    print(f"📱 {company.get('name', 'Unknown')} - no address accepts email, texting instead")
+                yield lead
+                continue
+            with self._lock:
+                self.dropped += 1
+            metrics.increment('leads_undeliverable')
+            domains = ', '.join(dict.fromkeys(address.rpartition('@')[2].lower() for address in addresses))
+            print(f"🚫 Skipping {company.get('name', 'Unknown')} - {domains} does not accept email")
+            if on_drop is not None:
+                on_drop(*lead)
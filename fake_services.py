@@ -0,0 +1,490 @@
+# fake_services.py
+# Local stand-ins for the SMTP relay, the SMS provider and Google Sheets, for benchmarks, tests and
+# dry runs that must not touch real mailboxes or spreadsheets. The fake sheet
+# plugs in underneath sheets.py (see install_fake_sheet) so the real fetch,
+# cache and send code paths run unchanged.
+
+import copy
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import sheets
+
+# Columns of the synthetic lead worksheets
+LEAD_HEADER = ['name', 'email', 'phone', 'address', 'city']
+
+_DOMAINS = [f"example{i}.com" for i in range(40)] + ['gmail.com', 'yahoo.com', 'outlook.com', 'aol.com']
+_CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Fairview', 'Madison', 'Salem']
+
+
+class _RateWindow:
+    """
+    Counts requests per one-second window, for fakes that throttle like a quota-limited API.
+    """
+
+    def __init__(self, max_per_second):
+        self.max_per_second = max_per_second
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._count = 0
+
+    def exceeded(self):
+        """
+        Count one request.
+        :return: True if it is over max_per_second and should be rejected
+        """
+        if self.max_per_second is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._start >= 1:
+                self._start = now
+                self._count = 0
+            self._count += 1
+            return self._count > self.max_per_second
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough ESMTP (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for smtplib.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.count('connections')
+        messages_on_connection = 0
+        self.reply('220 fake-smtp ESMTP ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250-fake-smtp')
+                self.reply('250-AUTH PLAIN LOGIN')
+                self.reply('250 8BITMIME')
+            elif command == b'AUTH':
+                server.count('logins')
+                self.reply('235 2.7.0 Authentication successful')
+            elif command == b'MAIL':
+                if server.should_throttle(messages_on_connection):
+                    server.count('throttled')
+                    self.reply('421 4.7.0 Too many messages, slow down; closing connection')
+                    return
+                self.reply('250 2.1.0 OK')
+            elif command == b'RCPT':
+                if server.chance(server.bounce_rate):
+                    server.count('bounced')
+                    self.reply('550 5.1.1 No such user')
+                else:
+                    self.reply('250 2.1.5 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line:
+                        return
+                    if data_line == b'.\r\n':
+                        break
+                    size += len(data_line)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.chance(server.error_rate):
+                    server.count('transient_errors')
+                    self.reply('451 4.3.0 Temporary server error, try again later')
+                    continue
+                messages_on_connection += 1
+                server.record_message(size)
+                self.reply('250 2.0.0 OK queued')
+            elif command == b'QUIT':
+                self.reply('221 2.0.0 Bye')
+                return
+            else:
+                # RSET, NOOP and anything else
+                self.reply('250 2.0.0 OK')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    In-process SMTP sink with configurable latency, error injection and 421 throttling.
+    Accepts any login; use it with use_tls=False.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, bounce_rate=0.0, max_per_connection=None,
+                 max_per_second=None, seed=0, host='127.0.0.1', port=0):
+        """
+        :param latency: Seconds the server takes to accept each message
+        :param error_rate: Fraction of messages rejected with a temporary 451
+        :param bounce_rate: Fraction of recipients rejected with a permanent 550
+        :param max_per_connection: Messages per connection before replying 421 and hanging up
+        :param max_per_second: Messages per second (across connections) before replying 421
+        :param seed: Seed for the injected errors, so runs are repeatable
+        """
+        super().__init__((host, port), _SMTPHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bounce_rate = bounce_rate
+        self.max_per_connection = max_per_connection
+        self.max_per_second = max_per_second
+        self.stats = {
+            'connections': 0, 'logins': 0, 'messages': 0, 'bytes': 0,
+            'throttled': 0, 'transient_errors': 0, 'bounced': 0,
+        }
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = _RateWindow(max_per_second)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def email_config(self):
+        """
+        Settings for messaging.update_email_config that point at this server.
+        """
+        return {
+            'smtp_server': self.server_address[0],
+            'smtp_port': self.port,
+            'use_tls': False,
+            'sender_email': 'bench@fake-smtp.local',
+            'sender_password': 'unused',
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def chance(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def should_throttle(self, messages_on_connection):
+        if self.max_per_connection is not None and messages_on_connection >= self.max_per_connection:
+            return True
+        return self._window.exceeded()
+
+    def record_message(self, size):
+        with self._lock:
+            self.stats['messages'] += 1
+            self.stats['bytes'] += size
+
+
+class _SMSHandler(BaseHTTPRequestHandler):
+    """
+    POST {"to", "body"} -> {"id"}, like the JSON API sms.HTTPSMSProvider talks to.
+    """
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real provider
+
+    def reply(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            message = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.reply(400, {'error': 'invalid JSON'})
+        to = str(message.get('to', ''))
+        if server.latency:
+            time.sleep(server.latency)
+        if server.should_throttle():
+            server.count('throttled')
+            return self.reply(429, {'error': 'rate limited'}, {'Retry-After': '1'})
+        if not re.fullmatch(r'\+[1-9]\d{7,14}', to) or server.chance(server.invalid_rate):
+            server.count('invalid')
+            return self.reply(400, {'error': f'not a mobile number: {to}'})
+        if server.chance(server.error_rate):
+            server.count('errors')
+            return self.reply(503, {'error': 'temporarily unavailable'})
+        message_id = server.record_message(to, str(message.get('body', '')))
+        self.reply(200, {'id': message_id})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSMSServer(ThreadingHTTPServer):
+    """
+    In-process SMS provider with configurable latency, error injection and 429 throttling.
+    Accepts any token; point SMS_API_URL at url.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, invalid_rate=0.0, max_per_second=None,
+                 seed=0, host='127.0.0.1', port=0):
+        """
+        :param latency: Seconds the provider takes to answer each request
+        :param error_rate: Fraction of messages rejected with a temporary 503
+        :param invalid_rate: Fraction of numbers rejected with a permanent 400
+        :param max_per_second: Messages per second before replying 429 with Retry-After
+        :param seed: Seed for the injected errors, so runs are repeatable
+        """
+        super().__init__((host, port), _SMSHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.invalid_rate = invalid_rate
+        self.max_per_second = max_per_second
+        self.stats = {'messages': 0, 'throttled': 0, 'errors': 0, 'invalid': 0}
+        self.messages = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = _RateWindow(max_per_second)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/messages"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-sms", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def chance(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def should_throttle(self):
+        return self._window.exceeded()
+
+    def record_message(self, to, body):
+        with self._lock:
+            self.stats['messages'] += 1
+            self.messages.append((to, body))
+            return f"SM{self.stats['messages']:08d}"
+
+
+def synthetic_lead(index):
+    """
+    One deterministic synthetic lead row (values as the Sheets API returns them).
+    About 80% have a valid address, some cells list two, and the rest are empty or invalid.
+    """
+    domain = _DOMAINS[index % len(_DOMAINS)]
+    kind = index % 20
+    if kind < 15:
+        email = f"owner{index}@{domain}"
+    elif kind == 15:
+        email = f"sales{index}@{domain}; office{index}@{domain}"
+    elif kind == 16:
+        email = "not an email"
+    else:
+        email = ""
+    return [
+        f"Synthetic Company {index}",
+        email,
+        f"(555) {index // 10000 % 1000:03d}-{index % 10000:04d}",
+        f"{index % 9999 + 1} Main St",
+        _CITIES[index % len(_CITIES)],
+    ]
+
+
+class FakeWorksheet:
+    """
+    Worksheet of synthetic leads, generated on demand so large sheets cost no memory.
+    """
+
+    def __init__(self, title, lead_count, first_lead=0):
+        self.title = title
+        self.lead_count = lead_count
+        self.first_lead = first_lead
+        self.row_count = lead_count + 1
+        self.col_count = len(LEAD_HEADER)
+
+    def add_cols(self, count):
+        self.col_count += count
+
+    def rows(self, start, end):
+        """
+        Rows start..end (1-based, inclusive), header in row 1.
+        """
+        values = []
+        for row in range(start, min(end, self.row_count) + 1):
+            values.append(list(LEAD_HEADER) if row == 1 else synthetic_lead(self.first_lead + row - 2))
+        return values
+
+
+_RANGE = re.compile(r"^'((?:[^']|'')*)'(?:!(\d+):(\d+))?$")
+
+
+class FakeSpreadsheet:
+    """
+    The parts of a gspread Spreadsheet that sheets.py and status_writer.py use.
+    """
+
+    def __init__(self, worksheets, sheet_id='fake-sheet', title='Fake Leads', api_latency=0.0):
+        """
+        :param worksheets: Dictionary of worksheet title -> number of synthetic leads
+        :param api_latency: Seconds each API call takes
+        """
+        self.id = sheet_id
+        self.title = title
+        self.api_latency = api_latency
+        self.version = '2024-01-01T00:00:00.000Z'
+        self.api_calls = 0
+        self.cells_updated = 0
+        self._worksheets = {}
+        first_lead = 0
+        for name, count in worksheets.items():
+            self._worksheets[name] = FakeWorksheet(name, count, first_lead)
+            first_lead += count
+
+    def _call(self):
+        self.api_calls += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def worksheets(self):
+        self._call()
+        # Like gspread, the metadata (row_count) is a snapshot taken by this call
+        return [copy.copy(worksheet) for worksheet in self._worksheets.values()]
+
+    def append_leads(self, worksheet_name, count):
+        """
+        Add synthetic leads at the end of a worksheet, growing its grid, as a user adding rows would.
+        Their leads come after every lead already in the spreadsheet, so none repeats an earlier one.
+        """
+        worksheet = self._worksheets[worksheet_name]
+        first_new = sum(sheet.lead_count for sheet in self._worksheets.values())
+        added = FakeWorksheet(worksheet_name, count, first_new)
+        old_rows = worksheet.rows
+        old_count = worksheet.row_count
+
+        def rows(start, end):
+            values = old_rows(start, min(end, old_count)) if start <= old_count else []
+            if end > old_count:
+                values += added.rows(max(start, old_count + 1) - old_count + 1, end - old_count + 1)
+            return values
+
+        worksheet.rows = rows
+        worksheet.lead_count += count
+        worksheet.row_count += count
+        self.version = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()) + f"#{worksheet.row_count}"
+
+    def values_get(self, range_name):
+        self._call()
+        return {'range': range_name, 'values': self._values(range_name)}
+
+    def values_batch_get(self, ranges):
+        self._call()
+        return {'valueRanges': [{'range': name, 'values': self._values(name)} for name in ranges]}
+
+    def values_batch_update(self, body):
+        self._call()
+        self.cells_updated += sum(len(row) for update in body['data'] for row in update['values'])
+        self.version = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        return {'totalUpdatedCells': self.cells_updated}
+
+    def _values(self, range_name):
+        match = _RANGE.match(range_name)
+        if match is None:
+            raise ValueError(f"Unsupported range: {range_name}")
+        worksheet = self._worksheets[match.group(1).replace("''", "'")]
+        if match.group(2) is None:
+            return worksheet.rows(1, worksheet.row_count)
+        return worksheet.rows(int(match.group(2)), int(match.group(3)))
+
+
+class _FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    """
+    Stand-in for the authorized gspread client, serving FakeSpreadsheets by URL or title.
+    """
+
+    def __init__(self):
+        self.spreadsheets = {}
+
+    def add(self, sheet_name, spreadsheet):
+        self.spreadsheets[sheet_name] = spreadsheet
+
+    def open_by_url(self, url):
+        return self.spreadsheets[url]
+
+    def open(self, title):
+        return self.spreadsheets[title]
+
+    def request(self, method, url, params=None):
+        # Drive metadata lookup (sheets.get_spreadsheet_version)
+        for spreadsheet in self.spreadsheets.values():
+            if url.endswith(spreadsheet.id):
+                return _FakeResponse({'modifiedTime': spreadsheet.version})
+        raise KeyError(url)
+
+
+def install_fake_sheet(sheet_name, worksheets, **options):
+    """
+    Route sheets.py to a synthetic spreadsheet.
+    :param sheet_name: Name or URL the code under test will open
+    :param worksheets: Dictionary of worksheet title -> number of synthetic leads
+    :param options: Passed to FakeSpreadsheet
+    :return: The FakeSpreadsheet
+    """
+    spreadsheet = FakeSpreadsheet(worksheets, **options)
+    client = FakeClient()
+    client.add(sheet_name, spreadsheet)
+    sheets.use_client(client)
+    return spreadsheet
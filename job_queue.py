@@ -0,0 +1,208 @@
+# job_queue.py
+# Durable queue of leads waiting to be contacted, for the campaign daemon.
+# Jobs live in SQLite, so a crash or restart loses nothing: a job is leased while
+# it is being sent and goes back to the queue if its lease runs out before it is
+# completed. Delivery is therefore at-least-once; the send ledger's per-campaign
+# send records make the second attempt a no-op.
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Job states
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds a leased job may go without its lease being renewed before it is handed out again
+LEASE_SECONDS = 15 * 60
+
+# A leased job; `attempts` includes this one
+Job = namedtuple('Job', ['id', 'key', 'worksheet', 'company', 'attempts'])
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue for one campaign, highest priority first.
+
+    Each job has a unique key (e.g. the normalized recipient), so enqueuing the
+    same lead again on every poll of the sheet is a no-op, even once it is done.
+    """
+
+    def __init__(self, path, campaign_id, lease_seconds=LEASE_SECONDS):
+        """
+        :param path: SQLite file holding the queue (may be the send ledger's file)
+        :param campaign_id: Identifier of the campaign the jobs belong to
+        :param lease_seconds: Seconds before an uncompleted leased job is handed out again
+        """
+        self.path = path
+        self.campaign_id = campaign_id
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    worksheet TEXT,
+                    payload TEXT NOT NULL,
+                    priority REAL NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_token TEXT,
+                    lease_until REAL,
+                    outcome TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    finished_at REAL,
+                    UNIQUE (campaign_id, key)
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (campaign_id, state, priority DESC, id)"
+            )
+
+    def enqueue(self, jobs):
+        """
+        Add jobs that aren't in the queue yet, in one transaction.
+        :param jobs: Iterable of (key, worksheet_name, company_info, priority) tuples
+        :return: Number of new jobs
+        """
+        now = time.time()
+        rows = [
+            (self.campaign_id, key, worksheet_name, json.dumps(dict(company), default=dict), priority, QUEUED, now, now)
+            for key, worksheet_name, company, priority in jobs
+        ]
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (campaign_id, key, worksheet, payload, priority, state, available_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self.conn.total_changes - before
+
+    def lease(self):
+        """
+        Take the highest priority job that is ready, including jobs whose lease ran out.
+        :return: Job, or None if nothing is ready
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, lease_token = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE campaign_id = ? AND "
+                "((state = ? AND available_at <= ?) OR (state = ? AND lease_until < ?)) "
+                "ORDER BY priority DESC, id LIMIT 1)",
+                (LEASED, token, now + self.lease_seconds, self.campaign_id, QUEUED, now, LEASED, now),
+            )
+            row = self.conn.execute(
+                "SELECT id, key, worksheet, payload, attempts FROM jobs WHERE lease_token = ?", (token,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, key, worksheet_name, payload, attempts = row
+        return Job(job_id, key, worksheet_name, json.loads(payload), attempts)
+
+    def complete(self, job_id, outcome=None):
+        """
+        Mark a job as done (sent, or nothing left to do for it).
+        :param outcome: Status of the lead, e.g. status_writer.SENT
+        """
+        self._finish(job_id, DONE, outcome)
+
+    def fail(self, job_id, error=None, retry_in=None):
+        """
+        Record a failed job.
+        :param retry_in: Seconds until it may be leased again, or None to give up on it
+        """
+        if retry_in is None:
+            self._finish(job_id, FAILED, None, error)
+            return
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, lease_token = NULL, last_error = ? WHERE id = ?",
+                (QUEUED, time.time() + retry_in, error, job_id),
+            )
+
+    def renew(self, job_ids):
+        """
+        Extend the leases of jobs still being worked on, so they aren't handed out again.
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        placeholders = ', '.join('?' * len(job_ids))
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE state = ? AND id IN ({placeholders})",
+                (time.time() + self.lease_seconds, LEASED, *job_ids),
+            )
+
+    def release(self, job_id):
+        """
+        Put a leased job back without counting the attempt (e.g. when pausing or shutting down).
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, lease_token = NULL, attempts = MAX(attempts - 1, 0) "
+                "WHERE id = ? AND state = ?",
+                (QUEUED, job_id, LEASED),
+            )
+
+    def _finish(self, job_id, state, outcome, error=None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, outcome = ?, last_error = COALESCE(?, last_error), "
+                "lease_token = NULL, finished_at = ? WHERE id = ?",
+                (state, outcome, error, time.time(), job_id),
+            )
+
+    def keys(self):
+        """
+        :return: Set of the keys of all jobs of the campaign, whatever their state
+        """
+        with self._lock:
+            return {key for key, in self.conn.execute("SELECT key FROM jobs WHERE campaign_id = ?", (self.campaign_id,))}
+
+    def counts(self):
+        """
+        :return: Dictionary of state -> number of jobs
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE campaign_id = ? GROUP BY state", (self.campaign_id,)
+            ).fetchall()
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
+
+    def completed_since(self, since, outcomes):
+        """
+        Number of jobs completed with one of `outcomes` since a point in time.
+        :param since: Seconds since the epoch
+        """
+        outcomes = list(outcomes)
+        placeholders = ', '.join('?' * len(outcomes))
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE campaign_id = ? AND state = ? AND finished_at >= ? "
+                f"AND outcome IN ({placeholders})",
+                (self.campaign_id, DONE, since, *outcomes),
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,157 @@
+# lead_cache.py
+# File-backed copy of worksheet values, so unchanged worksheets are served from
+# disk instead of being downloaded again on every run.
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class LeadCache:
+    """
+    SQLite store of raw worksheet values, tagged with the spreadsheet version they came from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Other processes (e.g. a dry run next to a send) may use the same file
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS spreadsheets (
+                    sheet TEXT PRIMARY KEY,
+                    worksheets TEXT NOT NULL,
+                    checked_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS worksheets (
+                    sheet TEXT NOT NULL,
+                    worksheet TEXT NOT NULL,
+                    version TEXT,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (sheet, worksheet)
+                );
+                CREATE TABLE IF NOT EXISTS rows (
+                    sheet TEXT NOT NULL,
+                    worksheet TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    cells TEXT NOT NULL,
+                    PRIMARY KEY (sheet, worksheet, row_index)
+                );
+            """)
+
+    def get_worksheet_titles(self, sheet):
+        """
+        :return: Cached list of worksheet names for a spreadsheet, or None
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT worksheets FROM spreadsheets WHERE sheet = ?", (sheet,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store_worksheet_titles(self, sheet, titles):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO spreadsheets (sheet, worksheets, checked_at) VALUES (?, ?, ?)",
+                (sheet, json.dumps(list(titles)), time.time()),
+            )
+
+    def has_worksheet(self, sheet, worksheet, version=None):
+        """
+        Check whether a worksheet is cached (at the given spreadsheet version, if one is given).
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT version FROM worksheets WHERE sheet = ? AND worksheet = ?", (sheet, worksheet)
+            ).fetchone()
+        if row is None:
+            return False
+        return version is None or row[0] == version
+
+    def replace_version(self, sheet, old_version, new_version):
+        """
+        Mark the worksheets cached at old_version as current at new_version.
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE worksheets SET version = ? WHERE sheet = ? AND version = ?",
+                (new_version, sheet, old_version),
+            )
+
+    def iter_values(self, sheet, worksheet):
+        """
+        Yield the cached rows of a worksheet (header row first) without loading them all.
+        The Sheets API leaves out blank rows at the end of each page, so row indices can skip.
+        :return: Generator of (row_index, cells) tuples; row_index 0 is the header row
+        """
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT row_index, cells FROM rows WHERE sheet = ? AND worksheet = ? ORDER BY row_index",
+                (sheet, worksheet),
+            )
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for row_index, cells in rows:
+                yield row_index, json.loads(cells)
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+
+    def get_values(self, sheet, worksheet):
+        """
+        :return: Cached rows of a worksheet (header row first, skipped rows blank), or an empty list
+        """
+        values = []
+        for row_index, cells in self.iter_values(sheet, worksheet):
+            values.extend([] for _ in range(row_index - len(values)))
+            values.append(cells)
+        return values
+
+    def store_values(self, sheet, worksheet, values, version=None):
+        """
+        Replace the cached rows of a worksheet.
+        :param values: List of rows, header row first
+        :param version: Spreadsheet version (Drive modifiedTime) the values were read at
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM rows WHERE sheet = ? AND worksheet = ?", (sheet, worksheet))
+            self.conn.executemany(
+                "INSERT INTO rows (sheet, worksheet, row_index, cells) VALUES (?, ?, ?, ?)",
+                ((sheet, worksheet, i, json.dumps(row)) for i, row in enumerate(values)),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO worksheets (sheet, worksheet, version, fetched_at) VALUES (?, ?, ?, ?)",
+                (sheet, worksheet, version, time.time()),
+            )
+
+    def start_worksheet(self, sheet, worksheet):
+        """
+        Begin writing a worksheet page by page. Until finish_worksheet is called
+        the worksheet counts as not cached.
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM worksheets WHERE sheet = ? AND worksheet = ?", (sheet, worksheet))
+            self.conn.execute("DELETE FROM rows WHERE sheet = ? AND worksheet = ?", (sheet, worksheet))
+
+    def append_values(self, sheet, worksheet, start_index, values):
+        """
+        Add a page of rows, numbered from start_index.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rows (sheet, worksheet, row_index, cells) VALUES (?, ?, ?, ?)",
+                ((sheet, worksheet, start_index + i, json.dumps(row)) for i, row in enumerate(values)),
+            )
+
+    def finish_worksheet(self, sheet, worksheet, version=None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO worksheets (sheet, worksheet, version, fetched_at) VALUES (?, ?, ?, ?)",
+                (sheet, worksheet, version, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
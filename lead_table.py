@@ -0,0 +1,118 @@
+# lead_table.py
+# Compact in-memory leads. gspread's get_all_records builds one dict per row,
+# repeating every header as a key; here all rows of a worksheet share a single
+# LeadTable (header -> column position, with interned names) and each Lead only
+# holds a list of its cell values. Leads still behave like the old dictionaries
+# (get, [], keys, items, setting new keys), so the rest of the code is unchanged.
+
+import sys
+import threading
+from collections.abc import MutableMapping
+
+# Marks a column a lead has no value for (a key added to some leads only)
+_MISSING = object()
+
+
+class LeadTable:
+    """
+    Column layout shared by every lead read from one worksheet.
+
+    Keys set on a lead that aren't in the header (e.g. the cached `_email`) become
+    extra columns of the whole table, so they cost one slot per lead instead of
+    a dict per lead.
+    """
+
+    def __init__(self, header):
+        """
+        :param header: Header row of the worksheet
+        """
+        self.width = len(header)
+        self.columns = {}  # name -> position; a repeated header name keeps its last column, like dict(zip())
+        self.names = []  # names in first-seen order
+        for position, name in enumerate(header):
+            name = sys.intern(str(name))
+            if name not in self.columns:
+                self.names.append(name)
+            self.columns[name] = position
+        self._next_position = self.width
+        self._lock = threading.Lock()
+
+    def add_column(self, name):
+        """
+        Position of a column, adding it to the table if it is new.
+        """
+        with self._lock:
+            position = self.columns.get(name)
+            if position is None:
+                position = self._next_position
+                self._next_position += 1
+                self.names.append(name)
+                self.columns[name] = position
+            return position
+
+    def lead(self, values):
+        """
+        :param values: Cell values, in header order (already padded to the header width)
+        """
+        return Lead(self, values)
+
+
+class Lead(MutableMapping):
+    """
+    One row of a LeadTable, readable and writable like a dictionary.
+    """
+
+    __slots__ = ('table', 'values')
+
+    def __init__(self, table, values):
+        self.table = table
+        self.values = values
+
+    def __getitem__(self, key):
+        position = self.table.columns.get(key)
+        if position is not None and position < len(self.values):
+            value = self.values[position]
+            if value is not _MISSING:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        position = self.table.columns.get(key)
+        if position is None or position >= len(self.values):
+            return default
+        value = self.values[position]
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        position = self.table.columns.get(key)
+        if position is None:
+            position = self.table.add_column(key)
+        values = self.values
+        if position >= len(values):
+            values.extend([_MISSING] * (position + 1 - len(values)))
+        values[position] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.values[self.table.columns[key]] = _MISSING
+
+    def __iter__(self):
+        columns = self.table.columns
+        values = self.values
+        for name in list(self.table.names):
+            position = columns[name]
+            if position < len(values) and values[position] is not _MISSING:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -1,7 +1,33 @@
-from sheets import get_company_data, validate_worksheets
-from messaging import send_email, test_email_connection
+import argparse
+import json
+import os
+import sys
 import time
 
+import sheets
+from config import settings
+from sheets import get_company_data, validate_worksheets
+import messaging
+from messaging import (get_email_address, get_phone_number, test_email_connection, get_relay_router, close_smtp_pool,
+                       build_email_text, get_sms_sender, close_sms_sender)
+from send_engine import EmailJob, SendEngine
+from retry_queue import RetryPolicy
+from status_writer import StatusWriter, ALREADY_SENT, UNDELIVERABLE
+from rate_limiter import RateLimiter, parse_rate_limits, share_rate_limits
+from send_ledger import SendLedger
+from templates import TemplateSet, TEMPLATE_DIR
+from pipeline import LeadStream
+from addresses import annotate_email_addresses, get_record_emails
+from domain_check import DomainChecker, DnsPythonResolver
+from dedup import dedup_leads
+from prioritizer import LeadScorer, prioritize_leads
+from job_queue import JobQueue
+from daemon import CampaignDaemon, DailyPacer, SheetPoller, CONTROL_COMMANDS, send_control
+from shards import (parse_shard, shard_label, shard_leads, shard_path, load_accounts, write_result,
+                    read_results, print_merged_summary, run_shards, shard_command)
+import metrics
+from utils import normalize_email
+
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1nP2VZUqbPPPHB3_cd7c8JBQXEAVoUMSUzNnQ5PvyBkk/edit?gid=1413023431"
 
 # Define the worksheets to process in order
@@ -12,79 +38,182 @@ WORKSHEETS = [
 ]
 
 # Email campaign settings
-EMAIL_DELAY = 2  # Delay between emails in seconds
-MAX_EMAILS_PER_RUN = 10  # Limit emails per run for testing
+RATE_LIMITS = "1/second, 30/minute, 500/day"  # Provider quota, shared by all send workers
+RATE_LIMIT_STATE_FILE = "rate_limit_state.json"  # Keeps the daily quota across runs
+RELAY_RATE_LIMIT_STATE_FILE = "rate_limit_state.{name}.json"  # Same, for each relay in SMTP_RELAYS_FILE
+MAX_EMAILS_PER_RUN = 10  # Limit emails per run for testing (split between the shards of a --shards run)
+SEND_WORKERS = 4  # Concurrent SMTP sessions used to send the campaign
+DOMAIN_SEND_INTERVAL = 2.0  # Seconds between two emails to the same recipient domain (e.g. gmail.com)
+
+# Temporary SMTP failures (4xx, dropped connections) are retried with exponential backoff.
+# Retries due within RETRY_WAIT_AT_END of the last fresh send are sent in this run,
+# later ones are picked up by the next run.
+RETRY_BASE_DELAY = 60  # Seconds before the first retry
+RETRY_MAX_DELAY = 3600
+RETRY_MAX_ATTEMPTS = 5
+RETRY_WAIT_AT_END = 120
+
+# Every send is recorded here so re-runs skip companies already emailed in this campaign
+CAMPAIGN_ID = "web-dev-seo"
+SEND_LEDGER_FILE = "send_ledger.sqlite3"
+
+# Write each lead's outcome (status, time, message id) back to the worksheet, in batches
+WRITE_STATUS = True
+STATUS_FLUSH_ROWS = 100  # Flush after this many rows...
+STATUS_FLUSH_SECONDS = 30  # ...or this many seconds, whichever comes first
+
+# Drop leads whose email domain has no mail server before sending (needs dnspython)
+CHECK_MX = True
+DOMAIN_CACHE_FILE = "domain_cache.json"
+
+# Merge listings of the same business across worksheets (see dedup.py). The whole
+# sheet is read and held in memory before the first send, since either listing could
+# be the one to keep; off by default so large sheets keep streaming.
+DEDUP_LEADS = False
+
+# Send order (see prioritizer.py): with MAX_EMAILS_PER_RUN set, the best scoring leads
+# across all worksheets go first, and no worksheet takes more than its share of the
+# quota (in proportion to its weight) while others still have leads waiting. Like
+# DEDUP_LEADS this reads the whole sheet into memory first, so it is off by default
+PRIORITIZE_LEADS = False
+PRIORITY_RULES = [
+    {'column': 'website', 'op': 'empty', 'points': 10},  # No website yet: best prospects for web/SEO
+    {'column': 'rating', 'op': '>=', 'value': 4, 'points': 3},
+]
+WORKSHEET_WEIGHTS = {}  # e.g. {"Plumbing": 2, "A/C": 1}; worksheets not listed weigh 1
+LEAD_DATE_COLUMN = "date added"  # Fresher leads score higher...
+LEAD_AGE_POINTS = 5  # ...by up to this many points,
+LEAD_AGE_HALF_LIFE_DAYS = 30  # halving every this many days
+CONTACT_HISTORY_POINTS = -5  # Per earlier campaign that already contacted the lead
 
-def get_email_address(company_info):
+# Per-stage timings and counters (see metrics.py): every send, failure and sheet page
+# is logged as one JSON line; set METRICS_PORT (e.g. 9108) to serve Prometheus metrics
+# at http://127.0.0.1:<port>/metrics while the campaign runs
+METRICS_EVENT_LOG = "campaign_events.jsonl"
+METRICS_PORT = None
+
+# Sharding (see shards.py): --shards N runs the campaign as N processes on this machine,
+# --shard I/N runs one shard (e.g. one per machine, with the ledger on a shared disk).
+# Shard I sends from entry I of SHARD_ACCOUNTS_FILE when that file exists
+SHARD_ACCOUNTS_FILE = "shard_accounts.json"
+SHARD_RESULT_FILE = "campaign_result.json"  # Per-shard results, merged into one summary
+SHARD_LOG_FILE = "campaign.log"  # Per-shard output when launched with --shards
+
+# Text leads that have a phone number but no email (needs SMS_API_URL in .env and
+# a <worksheet>.sms.txt or default.sms.txt template)
+SEND_SMS = True
+
+# Daemon mode (--daemon, see daemon.py): keep running with the Sheets client and SMTP
+# sessions open, poll the sheet for new rows and contact new leads within seconds,
+# spreading the daily quota over the sending hours. Leads wait in a durable job queue,
+# so nothing is lost on a crash or restart. Control a running daemon with
+# --control status|pause|resume|poll
+DAEMON_QUEUE_FILE = "campaign_jobs.sqlite3"
+DAEMON_POLL_SECONDS = 15
+DAEMON_SEND_HOURS = (8, 18)  # Local hours sends go out
+DAEMON_DAILY_QUOTA = None  # Sends per day; None for the /day limit in RATE_LIMITS
+DAEMON_CONTROL_PORT = 8765  # Control interface on 127.0.0.1
+
+# (index, count) while running as one shard of a campaign
+_shard = None
+
+# Subject and body templates, per worksheet (see templates.py)
+_templates = None
+
+def get_templates():
     """
-    Get email address from company info, checking multiple possible field names.
+    Load and compile the email templates once per run.
     """
-    # Check different possible email field names
-    email_fields = ['e-mail address', 'email', 'e-mail', 'email_address']
-    
-    for field in email_fields:
-        email = company_info.get(field, '')
-        if email and '@' in email:
-            return email
-    
-    return ''
+    global _templates
+    if _templates is None:
+        _templates = TemplateSet(TEMPLATE_DIR)
+    return _templates
 
-def create_email_message(company_info):
+def create_email_message(company_info, worksheet_name=None):
     """
     Create a personalized email message for a company.
     """
-    company_name = company_info.get('name', 'Your Business')
-    
-    message = f"""Dear {company_name},
-
-I hope this email finds you well. I'm reaching out because I noticed your business could benefit from professional web development and SEO services.
+    subject, message, html_message = get_templates().for_worksheet(worksheet_name).render(company_info)
+    return message
 
-At JohnsonWebCo, we specialize in:
-• Custom website development
-• Search engine optimization (SEO)
-• E-commerce solutions
-• Mobile-responsive design
-• Digital marketing strategies
+def render_email(worksheet_name, company_info, email):
+    """
+    Render a lead's email; the send workers wrap it for whichever relay sends it.
+    """
+    with metrics.timer('render'):
+        subject, message, html_message = get_templates().for_worksheet(worksheet_name).render(company_info)
+    return EmailJob(worksheet_name, company_info, email, subject, message, html_message)
 
-We've helped many businesses like yours increase their online presence and generate more leads.
+def render_text(worksheet_name, company_info, phone):
+    """
+    Render a lead's text message, or None if the worksheet has no SMS template.
+    """
+    with metrics.timer('render'):
+        return get_templates().for_worksheet(worksheet_name).render_sms(company_info)
 
-Would you be interested in a brief 15-minute consultation to discuss how we can help grow your business online?
+_domain_checker = None
 
-Best regards,
-JohnsonWebCo Team
-"""
-    
-    return message
+def get_domain_checker():
+    """
+    Get the MX checker used to drop undeliverable leads, or None if checks are off.
+    Created once per run, so lookups made while prioritizing are reused when sending.
+    """
+    global _domain_checker
+    if not CHECK_MX:
+        return None
+    if _domain_checker is None:
+        try:
+            resolver = DnsPythonResolver()
+        except ImportError:
+            print("⚠️  dnspython is not installed; skipping MX checks")
+            return None
+        _domain_checker = DomainChecker(resolver, cache_file=DOMAIN_CACHE_FILE)
+    return _domain_checker
 
-def process_worksheet(sheet_url, worksheet_name):
+def show_worksheet_data(worksheet_name, data):
     """
-    Process a single worksheet and return the data.
+    Print how many companies a worksheet has, with a few sample rows.
     """
     print(f"\n{'='*50}")
     print(f"Processing worksheet: {worksheet_name}")
     print(f"{'='*50}")
+    print(f"Found {len(data)} companies in {worksheet_name}")
     
+    if data:
+        print("Sample data:")
+        for i, row in enumerate(data[:3]):  # Show first 3 rows as sample
+            print(f"  {i+1}. {row}")
+        if len(data) > 3:
+            print(f"  ... and {len(data) - 3} more companies")
+    else:
+        print("No data found in this worksheet")
+
+def process_worksheet(sheet_url, worksheet_name):
+    """
+    Process a single worksheet and return the data.
+    """
     try:
         data = get_company_data(sheet_url, worksheet_name)
-        print(f"Found {len(data)} companies in {worksheet_name}")
-        
-        if data:
-            print("Sample data:")
-            for i, row in enumerate(data[:3]):  # Show first 3 rows as sample
-                print(f"  {i+1}. {row}")
-            if len(data) > 3:
-                print(f"  ... and {len(data) - 3} more companies")
-        else:
-            print("No data found in this worksheet")
-            
+        show_worksheet_data(worksheet_name, data)
         return data
     except Exception as e:
         print(f"Error processing worksheet '{worksheet_name}': {str(e)}")
         return []
 
-def send_campaign_emails(all_data):
+def get_status_writer(sheet_name):
+    """
+    Create the writer that records each lead's outcome in the sheet, or None if it is off.
+    """
+    if not WRITE_STATUS or not sheet_name or settings.OFFLINE_MODE:
+        return None
+    return StatusWriter(sheet_name, flush_rows=STATUS_FLUSH_ROWS, flush_interval=STATUS_FLUSH_SECONDS)
+
+def send_campaign_emails(leads, sheet_name=None):
     """
     Send email campaign to companies with valid email addresses.
+    :param leads: Iterable of (worksheet_name, company_info) tuples, such as a LeadStream,
+                  or a dictionary of worksheet name -> list of companies
+    :param sheet_name: Sheet the leads came from; each lead's status is written back to it
     """
     print(f"\n{'='*50}")
     print("STARTING EMAIL CAMPAIGN")
@@ -93,57 +222,609 @@ def send_campaign_emails(all_data):
     # Test email connection first
     if not test_email_connection():
         print("❌ Email connection failed. Cannot proceed with campaign.")
-        return
+        return None
     
-    total_sent = 0
-    total_skipped = 0
+    sms_sender = get_sms_sender() if SEND_SMS else None
+    if sms_sender is not None:
+        print(f"📱 Texting leads without an email through {settings.SMS_API_URL}")
     
-    for worksheet_name, companies in all_data.items():
-        print(f"\n📧 Processing {worksheet_name} companies...")
-        
-        for i, company in enumerate(companies):
-            if total_sent >= MAX_EMAILS_PER_RUN:
-                print(f"\n⚠️  Reached maximum emails per run ({MAX_EMAILS_PER_RUN}). Stopping.")
-                break
-                
-            # Check if company has valid email using the new function
-            email = get_email_address(company)
-            if not email:
-                print(f"⏭️  Skipping {company.get('name', 'Unknown')} - no valid email")
-                total_skipped += 1
-                continue
-            
-            # Create and send email
-            message = create_email_message(company)
-            subject = f"Web Development & SEO Services for {company.get('name', 'Your Business')}"
-            
-            print(f"📤 Sending email {total_sent + 1}/{MAX_EMAILS_PER_RUN} to {company.get('name', 'Unknown')}...")
-            
-            if send_email(company, message, subject):
-                total_sent += 1
-                print(f"✅ Email sent successfully to {company.get('name', 'Unknown')}")
-            else:
-                total_skipped += 1
-                print(f"❌ Failed to send email to {company.get('name', 'Unknown')}")
-            
-            # Add delay between emails to avoid rate limiting
-            if total_sent < MAX_EMAILS_PER_RUN:
-                print(f"⏳ Waiting {EMAIL_DELAY} seconds before next email...")
-                time.sleep(EMAIL_DELAY)
+    def get_recipient(company):
+        # Check if company has valid email using the new function
+        email = get_email_address(company)
+        if not email and (sms_sender is None or not get_phone_number(company)):
+            print(f"⏭️  Skipping {company.get('name', 'Unknown')} - no valid email")
+        return email
+    
+    # Load (and check) the templates before the first lead
+    get_templates()
+    
+    if isinstance(leads, dict):
+        for companies in leads.values():
+            annotate_email_addresses(companies)
+        leads = ((name, company) for name, companies in leads.items() for company in companies)
+    
+    def iter_leads(leads):
+        # Prioritized leads come from all worksheets at once; announce each one once
+        started = set()
+        for worksheet_name, company in leads:
+            if worksheet_name not in started:
+                started.add(worksheet_name)
+                print(f"\n📧 Processing {worksheet_name} companies...")
+            yield worksheet_name, company
+    
+    leads = iter_leads(leads)
+    
+    status_writer = get_status_writer(sheet_name)
+    domain_checker = get_domain_checker()
+    if domain_checker is not None:
+        on_drop = None
+        if status_writer is not None:
+            on_drop = lambda worksheet_name, company: status_writer.record(worksheet_name, company, UNDELIVERABLE)
+        # Leads whose addresses are all dead can still be texted
+        fallback = get_phone_number if sms_sender is not None else None
+        leads = domain_checker.filter_leads(leads, on_drop=on_drop, fallback=fallback)
+    
+    print(f"📤 Sending with {SEND_WORKERS} workers, up to {MAX_EMAILS_PER_RUN} emails...")
+    rate_limiter = RateLimiter(RATE_LIMITS, state_file=RATE_LIMIT_STATE_FILE)
+    # Shards share the ledger, so their claims have to be visible to each other
+    owner = f"shard-{shard_label(*_shard)}" if _shard is not None else None
+    ledger = SendLedger(SEND_LEDGER_FILE, CAMPAIGN_ID, owner=owner)
+    print(f"📒 {len(ledger)} companies already emailed in campaign '{CAMPAIGN_ID}'")
+    router = get_relay_router()
+    if len(router.relays) > 1:
+        print(f"🔀 Routing over {len(router.available)} SMTP relays: {', '.join(relay.name for relay in router.available)}")
+    engine = SendEngine(
+        router,
+        worker_count=SEND_WORKERS,
+        max_sends=MAX_EMAILS_PER_RUN,
+        rate_limiter=rate_limiter,
+        ledger=ledger,
+        domain_interval=DOMAIN_SEND_INTERVAL,
+        retry_policy=RetryPolicy(RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_MAX_ATTEMPTS),
+        retry_wait=RETRY_WAIT_AT_END,
+        status_writer=status_writer,
+        sms_sender=sms_sender,
+    )
+    metrics.get_metrics().restart_clock()
+    metrics.event('campaign_started', campaign=CAMPAIGN_ID, workers=SEND_WORKERS, max_sends=MAX_EMAILS_PER_RUN)
+    try:
+        stats = engine.run(leads, get_recipient, render_email, get_phone=get_phone_number, render_sms=render_text)
+    finally:
+        close_sms_sender()
+        # Runs on Ctrl+C too, so statuses recorded so far still reach the sheet
+        if status_writer is not None:
+            status_writer.close()
+            print(f"📝 Wrote status of {status_writer.rows_written} leads to the sheet in {status_writer.api_calls} updates")
+        ledger.close()
+        close_smtp_pool()
+        if domain_checker is not None:
+            domain_checker.save()
+    total_sent = stats.sent
+    total_skipped = stats.skipped
     
     # Campaign summary
     print(f"\n{'='*50}")
     print("CAMPAIGN SUMMARY")
     print(f"{'='*50}")
     print(f"✅ Emails sent successfully: {total_sent}")
+    if sms_sender is not None:
+        print(f"📱 Text messages sent: {stats.texted}")
     print(f"⏭️  Companies skipped: {total_skipped}")
-    print(f"📊 Total processed: {total_sent + total_skipped}")
+    print(f"🔁 Already emailed (earlier run or duplicate listing): {stats.already_sent}")
+    print(f"📛 Hard bounces (never emailed again): {stats.bounced}")
+    print(f"⏳ Waiting to be retried in a later run: {stats.retrying}")
+    undeliverable = domain_checker.dropped if domain_checker is not None else 0
+    if domain_checker is not None:
+        print(f"🚫 Undeliverable email domains: {undeliverable}")
+    total = total_sent + stats.texted + total_skipped + stats.already_sent + stats.bounced + stats.retrying + undeliverable
+    print(f"📊 Total processed: {total}")
+    if len(router.relays) > 1:
+        for relay in router.relays:
+            status = f" (disabled: {relay.disabled_reason})" if relay.disabled_reason else ""
+            print(f"   {relay.name}: {relay.sent} sent{status}")
+    
+    # Where the run's time went
+    print(f"\n{'='*50}")
+    print("PERFORMANCE")
+    print(f"{'='*50}")
+    print(metrics.get_metrics().format_summary())
+    metrics.event('campaign_finished', **metrics.get_metrics().summary())
+    return stats
+
+# Settings that can come from a JSON config file or the command line (see parse_args),
+# and the module constant each one replaces for the run
+SETTINGS = {
+    'sheet': 'SHEET_URL',
+    'worksheets': 'WORKSHEETS',
+    'max_emails': 'MAX_EMAILS_PER_RUN',
+    'workers': 'SEND_WORKERS',
+    'rate_limits': 'RATE_LIMITS',
+    'rate_limit_state': 'RATE_LIMIT_STATE_FILE',
+    'domain_interval': 'DOMAIN_SEND_INTERVAL',
+    'campaign': 'CAMPAIGN_ID',
+    'ledger': 'SEND_LEDGER_FILE',
+    'write_status': 'WRITE_STATUS',
+    'check_mx': 'CHECK_MX',
+    'dedup': 'DEDUP_LEADS',
+    'prioritize': 'PRIORITIZE_LEADS',
+    'poll_interval': 'DAEMON_POLL_SECONDS',
+    'daily_quota': 'DAEMON_DAILY_QUOTA',
+    'control_port': 'DAEMON_CONTROL_PORT',
+    # Config file only
+    'priority_rules': 'PRIORITY_RULES',
+    'worksheet_weights': 'WORKSHEET_WEIGHTS',
+    'send_hours': 'DAEMON_SEND_HOURS',
+    'job_queue': 'DAEMON_QUEUE_FILE',
+    'event_log': 'METRICS_EVENT_LOG',
+    'metrics_port': 'METRICS_PORT',
+    'shard_accounts': 'SHARD_ACCOUNTS_FILE',
+}
+
+def _shard_arg(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Send the email campaign to the leads in a Google Sheet.",
+        epilog="Settings are taken from the command line, then the --config file, then the defaults in main.py.",
+    )
+    parser.add_argument('--config', help="JSON file of settings, e.g. {\"sheet\": \"...\", \"worksheets\": [\"Plumbing\"], \"max_emails\": 200}")
+    parser.add_argument('--sheet', help="Name or URL of the Google Sheet")
+    parser.add_argument('--worksheets', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        help="Comma-separated worksheets to process, in order")
+    parser.add_argument('--max-emails', type=int, help="Emails to send in this run (0 for no limit)")
+    parser.add_argument('--workers', type=int, help="Concurrent SMTP sessions")
+    parser.add_argument('--rate-limits', help='Provider quota, e.g. "1/second, 30/minute, 500/day"')
+    parser.add_argument('--rate-limit-state', help="File keeping the daily quota across runs")
+    parser.add_argument('--domain-interval', type=float, help="Seconds between two emails to the same domain")
+    parser.add_argument('--campaign', help="Campaign id; recipients are emailed once per campaign")
+    parser.add_argument('--ledger', help="SQLite send ledger file")
+    parser.add_argument('--write-status', action=argparse.BooleanOptionalAction, default=None,
+                        help="Write each lead's outcome back to the sheet")
+    parser.add_argument('--check-mx', action=argparse.BooleanOptionalAction, default=None,
+                        help="Drop leads whose email domain has no mail server")
+    parser.add_argument('--dedup', action=argparse.BooleanOptionalAction, default=None,
+                        help="Merge duplicate listings of the same business before sending")
+    parser.add_argument('--prioritize', action=argparse.BooleanOptionalAction, default=None,
+                        help="Send to the best scoring leads first, sharing the quota fairly between worksheets")
+    parser.add_argument('--event-log', help="JSON-lines event log file")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument('--relays', help="JSON file of SMTP relays (see relay_router.py)")
+    parser.add_argument('--shards', type=int, help="Split the campaign over this many processes, one sender account each")
+    parser.add_argument('--shard', type=_shard_arg, help="Run only shard I of N (e.g. 2/4), for one machine of a sharded campaign")
+    parser.add_argument('--shard-accounts', help="JSON list with the sender account (or relays file) of each shard")
+    parser.add_argument('--result-file', help="Write this run's counts to a JSON file (for --merge-results)")
+    parser.add_argument('--merge-results', nargs='+', metavar='RESULT_FILE',
+                        help="Print one summary for the result files of all shards and exit")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running: poll the sheet for new leads and send them through the day")
+    parser.add_argument('--poll-interval', type=float, help="Seconds between two polls of the sheet in daemon mode")
+    parser.add_argument('--daily-quota', type=int, help="Sends per day in daemon mode (default: the /day rate limit)")
+    parser.add_argument('--control-port', type=int, help="Port of the daemon's control interface on 127.0.0.1")
+    parser.add_argument('--control', choices=list(CONTROL_COMMANDS),
+                        help="Send a command to a running daemon and print its status")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Fetch, dedup and render every email without connecting to SMTP, and report timings")
+    parser.add_argument('-y', '--yes', action='store_true', help="Don't ask for confirmation (for cron and scripts)")
+    return parser, parser.parse_args(argv)
+
+def load_config(path):
+    """
+    Read settings from a JSON config file.
+    :param path: JSON file whose keys are SETTINGS names (plus 'relays')
+    :return: Dictionary of settings
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+    unknown = set(config) - set(SETTINGS) - {'relays'}
+    if unknown:
+        raise ValueError(f"Unknown settings in {path}: {', '.join(sorted(unknown))}")
+    if isinstance(config.get('worksheets'), str):
+        config['worksheets'] = [name.strip() for name in config['worksheets'].split(',') if name.strip()]
+    return config
+
+def apply_settings(values):
+    """
+    Override the module settings for this run. Settings that are None are left alone.
+    """
+    for name, value in values.items():
+        if value is None:
+            continue
+        if name == 'relays':
+            settings.SMTP_RELAYS_FILE = value
+        elif name == 'max_emails':
+            globals()[SETTINGS[name]] = value or None
+        else:
+            globals()[SETTINGS[name]] = value
+
+def configure_shard(index, count):
+    """
+    Settings for one shard of a campaign: its own sender account, quota state, lead cache,
+    event log and metrics port, and its part of MAX_EMAILS_PER_RUN. Quotas the shards
+    share (no account of its own, the SMS account, a shared relays file) are split too.
+    """
+    global _shard, RATE_LIMITS, RATE_LIMIT_STATE_FILE, METRICS_EVENT_LOG, METRICS_PORT, MAX_EMAILS_PER_RUN
+    _shard = (index, count)
+    RATE_LIMIT_STATE_FILE = shard_path(RATE_LIMIT_STATE_FILE, index)
+    # Every shard texts through the same SMS account, so each gets its part of the quota
+    settings.SMS_RATE_LIMIT_STATE_FILE = shard_path(settings.SMS_RATE_LIMIT_STATE_FILE, index)
+    settings.SMS_RATE_LIMITS = share_rate_limits(settings.SMS_RATE_LIMITS, index, count)
+    # Each shard rewrites worksheets page by page; sharing one cache would mix their writes
+    if settings.LEAD_CACHE_FILE:
+        settings.LEAD_CACHE_FILE = shard_path(settings.LEAD_CACHE_FILE, index)
+    if MAX_EMAILS_PER_RUN is not None:
+        # The first shards take the remainder, so the shards together send the configured cap
+        MAX_EMAILS_PER_RUN = MAX_EMAILS_PER_RUN // count + int(index < MAX_EMAILS_PER_RUN % count)
+    if METRICS_EVENT_LOG:
+        METRICS_EVENT_LOG = shard_path(METRICS_EVENT_LOG, index)
+    if METRICS_PORT:
+        METRICS_PORT += index
+    account = {}
+    if os.path.exists(SHARD_ACCOUNTS_FILE):
+        account = dict(load_accounts(SHARD_ACCOUNTS_FILE, count)[index])
+    else:
+        RATE_LIMITS = share_rate_limits(RATE_LIMITS, index, count)
+        print(f"⚠️  {SHARD_ACCOUNTS_FILE} not found; all shards send from {settings.email['sender_email']}, "
+              f"this one at {RATE_LIMITS}")
+    relays = account.pop('relays', None)
+    if relays:
+        settings.SMTP_RELAYS_FILE = relays
+    # Shards without their own relays file send through the same relays
+    messaging.configure_relay_quotas(shard_path(RELAY_RATE_LIMIT_STATE_FILE, index),
+                                     share=None if relays else (index, count))
+    if account:
+        messaging.update_email_config(account)
+
+def campaign_counts(stats):
+    """
+    Final counts of a send run, as written to the shard result file.
+    """
+    return {
+        'sent': stats.sent,
+        'texted': stats.texted,
+        'skipped': stats.skipped,
+        'already_sent': stats.already_sent,
+        'bounced': stats.bounced,
+        'retrying': stats.retrying,
+        'undeliverable': metrics.get_metrics().counters.get('leads_undeliverable', 0),
+    }
+
+def run_sharded_campaign(count, argv, confirmed=False):
+    """
+    Run every shard of the campaign as its own process and print the merged summary.
+    :param count: Number of shards
+    :param argv: Command line arguments, passed on to every shard
+    :param confirmed: Skip the confirmation prompt
+    """
+    print(f"Lead Automation Project - Campaign '{CAMPAIGN_ID}' in {count} shards")
+    print(f"Target worksheets: {', '.join(WORKSHEETS)}")
+    if os.path.exists(SHARD_ACCOUNTS_FILE):
+        print(f"Sender accounts: {SHARD_ACCOUNTS_FILE}")
+    else:
+        print(f"⚠️  {SHARD_ACCOUNTS_FILE} not found; all shards will send from the same account")
+    if not confirmed:
+        print(f"\n{'='*50}")
+        response = input("Do you want to proceed with the email campaign? (y/n): ").lower().strip()
+        if response not in ['y', 'yes']:
+            print("Email campaign cancelled.")
+            return {}
+    # Each shard applies its own settings (account, quota state) on top of the same arguments
+    command = shard_command(__file__, list(argv) + ['--yes'])
+    results = run_shards(count, command, SHARD_RESULT_FILE, SHARD_LOG_FILE)
+    return print_merged_summary(results)
+
+def get_lead_scorer(ledger):
+    """
+    Create the LeadScorer for PRIORITY_RULES, with the contact history from the send ledger.
+    """
+    return LeadScorer(
+        PRIORITY_RULES,
+        worksheet_weights=WORKSHEET_WEIGHTS,
+        date_column=LEAD_DATE_COLUMN,
+        age_points=LEAD_AGE_POINTS,
+        age_half_life_days=LEAD_AGE_HALF_LIFE_DAYS,
+        contact_counts=ledger.contact_counts() if CONTACT_HISTORY_POINTS else None,
+        contact_points=CONTACT_HISTORY_POINTS,
+    )
+
+def prioritize_campaign_leads(leads):
+    """
+    Order the leads best-first (see PRIORITY_RULES), with each worksheet's share of
+    MAX_EMAILS_PER_RUN, and print how the quota is split.
+    Leads that won't be contacted (already contacted, bounced, waiting for a retry,
+    duplicates or undeliverable) go last, so they don't use up a worksheet's share.
+    :param leads: Iterable of (worksheet_name, company_info) tuples
+    :return: Generator of (worksheet_name, company_info) tuples in send order
+    """
+    leads = list(leads)
+    texting = SEND_SMS and bool(settings.SMS_API_URL)
+    domain_checker = get_domain_checker()
+    live_domains = None
+    if domain_checker is not None:
+        # Resolved concurrently up front; the send stage drops (and records) the dead ones
+        results = domain_checker.check_domains(
+            address.rpartition('@')[2].lower() for _, company in leads for address in get_record_emails(company)
+        )
+        live_domains = {domain for domain, ok in results.items() if ok}
+    
+    ledger = SendLedger(SEND_LEDGER_FILE, CAMPAIGN_ID)
+    try:
+        scorer = get_lead_scorer(ledger)
+        retrying = {normalize_email(recipient) for recipient, *_ in ledger.pending_retries()}
+        seen = set()
+        
+        def get_recipient(company):
+            addresses = get_record_emails(company)
+            if live_domains is not None:
+                addresses = [address for address in addresses if address.rpartition('@')[2].lower() in live_domains]
+            recipient = addresses[0] if addresses else (get_phone_number(company) if texting else '')
+            if not recipient:
+                return ''
+            key = normalize_email(recipient)
+            if key in seen or key in retrying or ledger.has_sent(recipient) or ledger.is_bounced(recipient):
+                return ''
+            seen.add(key)
+            return recipient
+        
+        with metrics.timer('prioritize'):
+            queue, ordered = prioritize_leads(leads, scorer, get_recipient, MAX_EMAILS_PER_RUN)
+    finally:
+        ledger.close()
+    if queue.limits:
+        shares = ', '.join(f"{name} {limit}" for name, limit in queue.limits.items())
+        print(f"🏆 {len(queue)} leads ranked; quota share per worksheet: {shares}")
+    else:
+        print(f"🏆 {len(queue)} leads ranked")
+    return ordered
 
-def main():
+def dry_run_campaign(leads):
+    """
+    Go through the campaign without sending: fetch, dedup against the ledger and
+    within the run, render and build every email, then report where the time went.
+    Nothing is written to the ledger, the sheet or any SMTP server.
+    :param leads: Iterable of (worksheet_name, company_info) tuples, such as a LeadStream
+    :return: Dictionary of counts
+    """
+    print(f"\n{'='*50}")
+    print("DRY RUN - no emails will be sent")
+    print(f"{'='*50}")
+    
+    templates = get_templates()
+    texting = SEND_SMS and bool(settings.SMS_API_URL)
+    domain_checker = get_domain_checker()
+    if domain_checker is not None:
+        leads = domain_checker.filter_leads(leads, fallback=get_phone_number if texting else None)
+    ledger = SendLedger(SEND_LEDGER_FILE, CAMPAIGN_ID, read_only=True)
+    counts = {'rendered': 0, 'texts_rendered': 0, 'skipped': 0, 'already_sent': 0, 'suppressed': 0}
+    metrics.get_metrics().restart_clock()
+    try:
+        for worksheet_name, company in leads:
+            if MAX_EMAILS_PER_RUN is not None and counts['rendered'] + counts['texts_rendered'] >= MAX_EMAILS_PER_RUN:
+                break
+            email = get_email_address(company)
+            phone = get_phone_number(company) if texting and not email else ''
+            if not email and not phone:
+                counts['skipped'] += 1
+                metrics.increment('leads_skipped')
+                continue
+            if phone:
+                if ledger.is_bounced(phone):
+                    counts['suppressed'] += 1
+                    metrics.increment('leads_suppressed')
+                elif not ledger.claim(phone):
+                    counts['already_sent'] += 1
+                    metrics.increment('leads_already_sent')
+                else:
+                    with metrics.timer('render'):
+                        text = templates.for_worksheet(worksheet_name).render_sms(company)
+                    if text:
+                        counts['texts_rendered'] += 1
+                        metrics.increment('texts_rendered')
+                    else:
+                        counts['skipped'] += 1
+                        metrics.increment('leads_skipped')
+                continue
+            if ledger.is_bounced(email):
+                counts['suppressed'] += 1
+                metrics.increment('leads_suppressed')
+                continue
+            # Claims are only kept in memory, so this catches duplicates without recording anything
+            if not ledger.claim(email):
+                counts['already_sent'] += 1
+                metrics.increment('leads_already_sent')
+                continue
+            with metrics.timer('render'):
+                subject, message, html_message = templates.for_worksheet(worksheet_name).render(company)
+            with metrics.timer('build_mime'):
+                build_email_text(email, message, subject, html_message)
+            counts['rendered'] += 1
+            metrics.increment('emails_rendered')
+    finally:
+        ledger.close()
+        if domain_checker is not None:
+            domain_checker.save()
+    
+    print(f"✉️  Emails that would be sent: {counts['rendered']}")
+    if texting:
+        print(f"📱 Text messages that would be sent: {counts['texts_rendered']}")
+    print(f"⏭️  Companies skipped (no valid email): {counts['skipped']}")
+    print(f"🔁 Already emailed (earlier run or duplicate listing): {counts['already_sent']}")
+    print(f"📛 Suppressed hard bounces: {counts['suppressed']}")
+    if domain_checker is not None:
+        counts['undeliverable'] = domain_checker.dropped
+        print(f"🚫 Undeliverable email domains: {domain_checker.dropped}")
+    print(f"\n{'='*50}")
+    print("PERFORMANCE")
+    print(f"{'='*50}")
+    print(metrics.get_metrics().format_summary('emails_rendered'))
+    metrics.event('dry_run_finished', **counts)
+    return counts
+
+def daemon_daily_quota():
+    """
+    Sends per day the daemon spreads over DAEMON_SEND_HOURS: DAEMON_DAILY_QUOTA, or the
+    /day limit in RATE_LIMITS. None if neither is set.
+    """
+    if DAEMON_DAILY_QUOTA:
+        return DAEMON_DAILY_QUOTA
+    daily = [count for count, period in parse_rate_limits(RATE_LIMITS) if period == 86400]
+    return min(daily) if daily else None
+
+def run_daemon(worksheet_names):
+    """
+    Run the campaign as a daemon (see daemon.py) until Ctrl+C or SIGTERM: poll the
+    sheet for new leads, queue them in DAEMON_QUEUE_FILE and send them as the daily
+    quota allows, with the Sheets client and SMTP sessions kept open in between.
+    :param worksheet_names: Worksheets to poll
+    :return: SendStats of everything sent while the daemon ran, or None if the email connection failed
+    """
+    print(f"\n{'='*50}")
+    print("STARTING CAMPAIGN DAEMON")
+    print(f"{'='*50}")
+    
+    if not test_email_connection():
+        print("❌ Email connection failed. Cannot start the campaign daemon.")
+        return None
+    get_templates()
+    
+    sms_sender = get_sms_sender() if SEND_SMS else None
+    if sms_sender is not None:
+        print(f"📱 Texting leads without an email through {settings.SMS_API_URL}")
+    status_writer = get_status_writer(SHEET_URL)
+    domain_checker = get_domain_checker()
+    ledger = SendLedger(SEND_LEDGER_FILE, CAMPAIGN_ID)
+    jobs = JobQueue(DAEMON_QUEUE_FILE, CAMPAIGN_ID)
+    scorer = get_lead_scorer(ledger)
+    counts = jobs.counts()
+    print(f"🗂️  Job queue {DAEMON_QUEUE_FILE}: {counts['queued']} leads waiting, {counts['done']} done")
+    
+    def get_recipient(company):
+        email = get_email_address(company)
+        return email or (get_phone_number(company) if sms_sender is not None else '')
+    
+    def on_drop(worksheet_name, company):
+        if status_writer is not None:
+            status_writer.record(worksheet_name, company, UNDELIVERABLE)
+    
+    poll = SheetPoller(SHEET_URL, worksheet_names, get_recipient, scorer.score, already_sent=ledger.has_sent,
+                       domain_checker=domain_checker, on_drop=on_drop,
+                       fallback=get_phone_number if sms_sender is not None else None)
+    if status_writer is not None:
+        # Writing the status columns changes the sheet's version; that alone shouldn't trigger a full poll
+        status_writer.on_version_change = poll.sheet_written
+    
+    def is_done(company):
+        recipient = get_recipient(company)
+        return ALREADY_SENT if recipient and ledger.has_sent(recipient) else None
+    
+    quota = daemon_daily_quota()
+    pacer = DailyPacer(quota, *DAEMON_SEND_HOURS) if quota else None
+    if pacer is not None:
+        print(f"⏱️  Spreading {quota} sends per day over {pacer.start_hour}:00-{pacer.end_hour}:00")
+    retry_policy = RetryPolicy(RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_MAX_ATTEMPTS)
+    daemon = CampaignDaemon(jobs, poll, pacer=pacer, poll_interval=DAEMON_POLL_SECONDS,
+                            status_writer=status_writer, is_done=is_done, retry_policy=retry_policy)
+    router = get_relay_router()
+    engine = SendEngine(
+        router,
+        worker_count=SEND_WORKERS,
+        max_sends=None,
+        rate_limiter=RateLimiter(RATE_LIMITS, state_file=RATE_LIMIT_STATE_FILE),
+        ledger=ledger,
+        domain_interval=DOMAIN_SEND_INTERVAL,
+        retry_policy=retry_policy,
+        # Retries still pending at shutdown stay in the ledger for the next start
+        retry_wait=0,
+        status_writer=daemon,
+        sms_sender=sms_sender,
+    )
+    
+    def send(leads):
+        engine.run(leads, get_email_address, render_email, get_phone=get_phone_number, render_sms=render_text)
+    
+    print(f"👀 Polling {len(worksheet_names)} worksheets every {DAEMON_POLL_SECONDS}s (Ctrl+C to stop)")
+    metrics.get_metrics().restart_clock()
+    metrics.event('daemon_started', campaign=CAMPAIGN_ID, workers=SEND_WORKERS, daily_quota=quota)
+    try:
+        daemon.run(send, control_port=DAEMON_CONTROL_PORT)
+    finally:
+        close_sms_sender()
+        if status_writer is not None:
+            status_writer.close()
+        counts = jobs.counts()
+        jobs.close()
+        ledger.close()
+        close_smtp_pool()
+        if domain_checker is not None:
+            domain_checker.save()
+    stats = engine.stats
+    
+    print(f"\n{'='*50}")
+    print("DAEMON SUMMARY")
+    print(f"{'='*50}")
+    print(f"✅ Emails sent successfully: {stats.sent}")
+    if sms_sender is not None:
+        print(f"📱 Text messages sent: {stats.texted}")
+    print(f"📛 Hard bounces (never emailed again): {stats.bounced}")
+    print(f"⏳ Waiting to be retried: {stats.retrying}")
+    print(f"🗂️  Leads still queued: {counts['queued'] + counts['leased']}")
+    metrics.event('daemon_stopped', **metrics.get_metrics().summary())
+    return stats
+
+def _result_name():
+    return shard_label(*_shard) if _shard is not None else "all"
+
+def main(argv=None):
+    """
+    Command line entry point (run with --help for the options).
+    :param argv: Arguments to parse instead of sys.argv[1:]
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser, args = parse_args(argv)
+    try:
+        if args.config:
+            apply_settings(load_config(args.config))
+    except (OSError, ValueError) as e:
+        parser.error(f"could not load config: {e}")
+    apply_settings({name: getattr(args, name, None) for name in list(SETTINGS) + ['relays']})
+    
+    if args.merge_results:
+        return print_merged_summary(read_results(args.merge_results))
+    if args.control:
+        try:
+            status = send_control(args.control, DAEMON_CONTROL_PORT)
+        except OSError as e:
+            print(f"❌ No campaign daemon answering on port {DAEMON_CONTROL_PORT}: {str(e)}")
+            return {}
+        print(json.dumps(status, indent=2))
+        return status
+    if args.daemon and (args.dry_run or args.shards or args.shard):
+        parser.error("--daemon can't be combined with --dry-run, --shards or --shard")
+    if args.shard is None and args.shards and args.shards > 1:
+        return run_sharded_campaign(args.shards, argv, confirmed=args.yes or args.dry_run)
+    if args.shard is not None:
+        try:
+            configure_shard(*args.shard)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not load shard accounts: {e}")
+    started = time.monotonic()
+    
+    metrics.configure(METRICS_EVENT_LOG)
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    
     print("Lead Automation Project - Multi-Sheet Email Campaign")
+    if _shard is not None:
+        print(f"Shard {shard_label(*_shard)}, sending from {settings.email['sender_email']}")
     print(f"Target worksheets: {', '.join(WORKSHEETS)}")
-    print(f"Max emails per run: {MAX_EMAILS_PER_RUN}")
-    print(f"Delay between emails: {EMAIL_DELAY} seconds")
+    print(f"Max emails per run: {'no limit' if MAX_EMAILS_PER_RUN is None else MAX_EMAILS_PER_RUN}")
+    print(f"Rate limits: {RATE_LIMITS}")
+    print(f"Send workers: {SEND_WORKERS}")
     
     # Validate worksheets first
     print("\nValidating worksheets...")
@@ -155,45 +836,67 @@ def main():
     
     if not valid_worksheets:
         print("❌ No valid worksheets found. Please check your worksheet names.")
+        if args.result_file:
+            write_result(args.result_file, _result_name(), {}, error="no valid worksheets")
         return {}
     
     print(f"✅ Found {len(valid_worksheets)} valid worksheets: {', '.join(valid_worksheets)}")
-    print(f"\nProcessing {len(valid_worksheets)} worksheets sequentially...")
     
-    all_data = {}
-    
-    for worksheet_name in valid_worksheets:
-        data = process_worksheet(SHEET_URL, worksheet_name)
-        all_data[worksheet_name] = data
+    # Ask user if they want to proceed with email campaign
+    if not (args.yes or args.dry_run):
+        print(f"\n{'='*50}")
+        response = input("Do you want to proceed with the email campaign? (y/n): ").lower().strip()
         
-        # Optional: Add a small delay between worksheets
-        time.sleep(1)
+        if response not in ['y', 'yes']:
+            print("Email campaign cancelled.")
+            return {}
+    
+    if args.daemon:
+        stats = run_daemon(valid_worksheets)
+        metrics.get_metrics().close()
+        return campaign_counts(stats) if stats is not None else {}
+    
+    # Rows are sent as they download; later worksheets load while the first emails go out
+    # (unless DEDUP_LEADS or PRIORITIZE_LEADS, which need the whole sheet first)
+    stream = LeadStream(SHEET_URL, valid_worksheets)
+    leads = stream
+    if DEDUP_LEADS:
+        leads = list(stream)
+        with metrics.timer('dedup'):
+            leads, merged = dedup_leads(leads)
+        print(f"🧬 Merged {merged} duplicate listings into the same business")
+        metrics.increment('leads_merged', merged)
+    # Every shard reads the whole sheet and keeps the leads whose address hashes to it
+    leads = shard_leads(leads, *_shard) if _shard is not None else leads
+    if PRIORITIZE_LEADS:
+        leads = prioritize_campaign_leads(leads)
+    error = None
+    if args.dry_run:
+        counts = dry_run_campaign(leads)
+    else:
+        stats = send_campaign_emails(leads, SHEET_URL)
+        counts = campaign_counts(stats) if stats is not None else {}
+        if stats is None:
+            error = "email connection failed"
+    if args.result_file:
+        write_result(args.result_file, _result_name(), counts, account=settings.email['sender_email'],
+                     elapsed=time.monotonic() - started, error=error)
     
     # Summary of data found
     print(f"\n{'='*50}")
     print("DATA SUMMARY")
     print(f"{'='*50}")
     total_companies = 0
-    for worksheet_name, data in all_data.items():
-        count = len(data)
+    for worksheet_name, count in stream.counts.items():
         total_companies += count
-        print(f"{worksheet_name}: {count} companies")
-    
-    print(f"\nTotal companies across all worksheets: {total_companies}")
+        print(f"{worksheet_name}: {count} companies read")
     
-    # Ask user if they want to proceed with email campaign
-    if total_companies > 0:
-        print(f"\n{'='*50}")
-        response = input("Do you want to proceed with the email campaign? (y/n): ").lower().strip()
-        
-        if response in ['y', 'yes']:
-            send_campaign_emails(all_data)
-        else:
-            print("Email campaign cancelled.")
-    else:
-        print("No companies found. Cannot proceed with email campaign.")
+    print(f"\nTotal companies read across all worksheets: {total_companies}")
+    if total_companies == 0:
+        print("No companies found. Check your worksheets.")
     
-    return all_data
+    metrics.get_metrics().close()
+    return stream.counts
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
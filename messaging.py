@@ -1,38 +1,154 @@
 # messaging.py
 # Functions for sending emails and SMS will go here
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
-from dotenv import load_dotenv
+import smtplib
+from config import settings
+from smtp_pool import SMTPConnectionPool
+from templates import MessageBuilder
+from relay_router import Relay, RelayRouter
+from addresses import get_record_email
+from phones import get_record_phone
+from rate_limiter import RateLimiter
+from sms import HTTPSMSProvider, SMSSender
 
-# Force reload environment variables
-load_dotenv(override=True)
+# Email, pool and relay settings come from config.settings (the .env file is read
+# on first use). EMAIL_CONFIG, SMTP_POOL_SIZE, SMTP_MAX_MESSAGES_PER_SESSION and
+# SMTP_RELAYS_FILE can still be read from this module.
+_CONFIG_ATTRIBUTES = ('SMTP_POOL_SIZE', 'SMTP_MAX_MESSAGES_PER_SESSION', 'SMTP_RELAYS_FILE')
 
-# Email configuration - supports both Gmail and Outlook
-EMAIL_CONFIG = {
-    'smtp_server': os.getenv('SMTP_SERVER', 'smtp-mail.outlook.com'),  # Outlook default
-    'smtp_port': int(os.getenv('SMTP_PORT', '587')),  # Outlook uses 587
-    'sender_email': os.getenv('SENDER_EMAIL', 'your-email@outlook.com'),
-    'sender_password': os.getenv('SENDER_PASSWORD', 'your-password'),
-    'sender_name': os.getenv('SENDER_NAME', 'Your Company Name'),
-    'use_tls': os.getenv('USE_TLS', 'True').lower() == 'true'  # Outlook requires TLS
-}
+def __getattr__(name):
+    if name == 'EMAIL_CONFIG':
+        return settings.email
+    if name in _CONFIG_ATTRIBUTES:
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_smtp_pool = None
+_message_builder = None
+_relay_router = None
+_relay_quotas = {}
+_sms_sender = None
+
+def get_smtp_pool():
+    """
+    Get the shared SMTP connection pool, creating it from EMAIL_CONFIG on first use.
+    """
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPConnectionPool(
+            settings.email,
+            max_size=settings.SMTP_POOL_SIZE,
+            max_messages_per_session=settings.SMTP_MAX_MESSAGES_PER_SESSION,
+        )
+    return _smtp_pool
+
+def get_message_builder():
+    """
+    Get the MIME message builder for the configured sender, creating it on first use.
+    """
+    global _message_builder
+    if _message_builder is None:
+        _message_builder = MessageBuilder(settings.email['sender_name'], settings.email['sender_email'])
+    return _message_builder
+
+def get_relay_router():
+    """
+    Get the router that spreads campaign sends over the configured relays.
+    Uses the relays in SMTP_RELAYS_FILE if it exists, otherwise just EMAIL_CONFIG.
+    """
+    global _relay_router
+    if _relay_router is None:
+        relays_file = settings.SMTP_RELAYS_FILE
+        if relays_file and os.path.exists(relays_file):
+            _relay_router = RelayRouter.from_file(
+                relays_file,
+                settings.email,
+                pool_size=settings.SMTP_POOL_SIZE,
+                max_messages_per_session=settings.SMTP_MAX_MESSAGES_PER_SESSION,
+                **_relay_quotas,
+            )
+        else:
+            relay = Relay('default', settings.email, pool=get_smtp_pool(), builder=get_message_builder())
+            _relay_router = RelayRouter([relay])
+    return _relay_router
+
+def configure_relay_quotas(state_file, share=None):
+    """
+    Keep the relays' quota state in other files, and optionally use only part of each quota.
+    For shards of a campaign; see RelayRouter.from_file.
+    :param state_file: Quota state file of each relay; {name} is replaced by the relay's name
+    :param share: (index, count) when all shards send through the same relays
+    """
+    global _relay_quotas
+    _relay_quotas = {'state_file': state_file, 'share': share}
+    close_smtp_pool()
+
+def close_smtp_pool():
+    """
+    Log out of all pooled SMTP sessions. Call this when a campaign is finished.
+    """
+    global _smtp_pool, _relay_router
+    if _relay_router is not None:
+        _relay_router.close()
+        _relay_router = None
+    if _smtp_pool is not None:
+        _smtp_pool.close()
+        _smtp_pool = None
+
+def get_sms_sender():
+    """
+    Get the shared SMS sender for the provider at SMS_API_URL, or None if SMS is not configured.
+    """
+    global _sms_sender
+    if _sms_sender is None and settings.SMS_API_URL:
+        provider = HTTPSMSProvider(
+            settings.SMS_API_URL,
+            token=settings.SMS_API_TOKEN,
+            sender=settings.SMS_FROM_NUMBER,
+            pool_size=settings.SMS_MAX_CONCURRENCY,
+        )
+        _sms_sender = SMSSender(
+            provider,
+            max_concurrency=settings.SMS_MAX_CONCURRENCY,
+            rate_limiter=RateLimiter(settings.SMS_RATE_LIMITS, state_file=settings.SMS_RATE_LIMIT_STATE_FILE),
+        )
+    return _sms_sender
+
+def close_sms_sender():
+    """
+    Wait for text messages still being sent and close the provider's connections.
+    """
+    global _sms_sender
+    if _sms_sender is not None:
+        _sms_sender.close()
+        _sms_sender = None
+
+def get_phone_number(company_info):
+    """
+    Get the phone number (E.164) from company info.
+    Uses the number cached on the record by phones.annotate_phone_numbers when present.
+    """
+    return get_record_phone(company_info, settings.SMS_COUNTRY_CODE)
 
 def get_email_address(company_info):
     """
     Get email address from company info, checking multiple possible field names.
+    Uses the address cached on the record by addresses.annotate_email_addresses when present.
     """
-    # Check different possible email field names
-    email_fields = ['e-mail address', 'email', 'e-mail', 'email_address']
-    
-    for field in email_fields:
-        email = company_info.get(field, '')
-        if email and '@' in email:
-            return email
-    
-    return ''
+    return get_record_email(company_info)
+
+def build_email_text(recipient_email, message, subject, html_message=None):
+    """
+    Build the full email (headers and body) ready to hand to an SMTP session.
+    :param recipient_email: Recipient email address
+    :param message: The message content to send
+    :param subject: Email subject
+    :param html_message: HTML version of the message (optional)
+    :return: Message as a string
+    """
+    _, text = get_message_builder().build(recipient_email, subject, message, html_message)
+    return text
 
 def send_email(company_info, message, subject=None):
     """
@@ -50,25 +166,12 @@ def send_email(company_info, message, subject=None):
             print(f"Skipping {company_info.get('name', 'Unknown')} - no valid email address")
             return False
         
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = f"{EMAIL_CONFIG['sender_name']} <{EMAIL_CONFIG['sender_email']}>"
-        msg['To'] = recipient_email
-        msg['Subject'] = subject or f"Web Development & SEO Services for {company_info.get('name', 'Your Business')}"
-        
-        # Add message body
-        msg.attach(MIMEText(message, 'plain'))
+        subject = subject or f"Web Development & SEO Services for {company_info.get('name', 'Your Business')}"
+        text = build_email_text(recipient_email, message, subject)
         
-        # Send email
-        server = smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'])
-        
-        if EMAIL_CONFIG['use_tls']:
-            server.starttls()
-        
-        server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-        text = msg.as_string()
-        server.sendmail(EMAIL_CONFIG['sender_email'], recipient_email, text)
-        server.quit()
+        # Send email over a pooled, already authenticated session
+        with get_smtp_pool().session() as session:
+            session.send(recipient_email, text)
         
         print(f"✅ Email sent successfully to {company_info.get('name', 'Unknown')} ({recipient_email})")
         return True
@@ -79,59 +182,79 @@ def send_email(company_info, message, subject=None):
 
 def send_sms(company_info, message):
     """
-    Placeholder for SMS functionality.
+    Send a text message to a company through the configured SMS provider.
     :param company_info: Dictionary containing company data
     :param message: The message content to send
     :return: True if successful, False otherwise
     """
-    # TODO: Implement SMS sending (e.g., using Twilio)
-    print(f"SMS functionality not yet implemented for {company_info.get('name', 'Unknown')}")
-    return False
+    sender = get_sms_sender()
+    if sender is None:
+        print("SMS is not configured (set SMS_API_URL in your .env file)")
+        return False
+    phone = get_phone_number(company_info)
+    if not phone:
+        print(f"Skipping {company_info.get('name', 'Unknown')} - no valid phone number")
+        return False
+    try:
+        sender.send(phone, message)
+        print(f"✅ SMS sent successfully to {company_info.get('name', 'Unknown')} ({phone})")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to send SMS to {company_info.get('name', 'Unknown')}: {str(e)}")
+        return False
 
 def update_email_config(new_config):
     """
     Update email configuration easily.
     :param new_config: Dictionary with new email settings
     """
-    global EMAIL_CONFIG
-    EMAIL_CONFIG.update(new_config)
+    global _message_builder
+    settings.email.update(new_config)
+    _message_builder = None
+    # Pooled sessions were opened with the old settings
+    close_smtp_pool()
     print("Email configuration updated successfully")
 
 def test_email_connection():
     """
     Test the email connection to verify credentials and settings.
+    With several relays configured, relays that fail to log in are disabled for
+    the run and the test passes as long as one of them works.
     """
     try:
-        print("Testing email connection...")
-        print(f"Using email: {EMAIL_CONFIG['sender_email']}")
-        print(f"Using server: {EMAIL_CONFIG['smtp_server']}:{EMAIL_CONFIG['smtp_port']}")
-        
-        # Try different authentication methods
-        server = smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'])
-        
-        if EMAIL_CONFIG['use_tls']:
-            server.starttls()
-        
-        # Try login with different methods
-        try:
-            server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-        except smtplib.SMTPAuthenticationError as e:
-            print(f"❌ Authentication failed: {e}")
-            print("\nThis error suggests that basic authentication is disabled for your Outlook account.")
-            print("You have a few options:")
-            print("1. Use a Gmail account instead (easier setup)")
-            print("2. Use Microsoft Graph API (requires app registration)")
-            print("3. Enable 'Less secure app access' in your Microsoft account (if available)")
-            print("4. Use an App Password (if 2FA is enabled)")
-            return False
-        
-        server.quit()
-        
-        print("✅ Email connection test successful!")
-        print(f"   Server: {EMAIL_CONFIG['smtp_server']}:{EMAIL_CONFIG['smtp_port']}")
-        print(f"   Email: {EMAIL_CONFIG['sender_email']}")
-        print(f"   TLS: {EMAIL_CONFIG['use_tls']}")
-        return True
+        router = get_relay_router()
+        for relay in router.relays:
+            config = relay.config
+            print("Testing email connection...")
+            print(f"Using email: {config['sender_email']}")
+            print(f"Using server: {config['smtp_server']}:{config['smtp_port']}")
+            
+            # Open a session through the pool so the campaign can reuse this login
+            try:
+                session = relay.pool.acquire()
+            except smtplib.SMTPAuthenticationError as e:
+                print(f"❌ Authentication failed: {e}")
+                print("\nThis error suggests that basic authentication is disabled for your Outlook account.")
+                print("You have a few options:")
+                print("1. Use a Gmail account instead (easier setup)")
+                print("2. Use Microsoft Graph API (requires app registration)")
+                print("3. Enable 'Less secure app access' in your Microsoft account (if available)")
+                print("4. Use an App Password (if 2FA is enabled)")
+                router.disable(relay, f"authentication failed: {e}")
+                continue
+            except (smtplib.SMTPException, OSError) as e:
+                # Refused, timed out, TLS failed...: the other relays may still work
+                print(f"❌ Could not connect to {config['smtp_server']}:{config['smtp_port']}: {e}")
+                router.disable(relay, f"connection failed: {e}")
+                continue
+            
+            relay.pool.release(session)
+            
+            print("✅ Email connection test successful!")
+            print(f"   Server: {config['smtp_server']}:{config['smtp_port']}")
+            print(f"   Email: {config['sender_email']}")
+            print(f"   TLS: {config['use_tls']}")
+        return bool(router.available)
         
     except Exception as e:
         print(f"❌ Email connection test failed: {str(e)}")
@@ -141,4 +264,4 @@ def test_email_connection():
         print("3. Enable 'Less secure app access' in your Outlook account settings")
         print("4. Or use an App Password if you have 2FA enabled")
         print("5. Consider using Gmail instead (easier SMTP setup)")
-        return False 
\ No newline at end of file
+        return False
\ No newline at end of file
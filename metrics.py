@@ -0,0 +1,277 @@
+# metrics.py
+# Counters, per-stage latency histograms and a JSON-lines event log for campaign
+# runs, with an optional Prometheus text endpoint. Instrumented code calls the
+# module-level helpers (timer, increment, event), which record into one shared
+# registry.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every metric name on the Prometheus endpoint
+METRIC_PREFIX = 'leadautomation'
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (Prometheus style) with approximate percentiles.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Estimate a percentile by interpolating inside the bucket it falls in.
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if count and seen + count >= target:
+                return min(self.max, lower + (upper - lower) * (target - seen) / count)
+            seen += count
+            lower = upper
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and stage latency histograms, plus the event log.
+    """
+
+    def __init__(self, event_log=None):
+        """
+        :param event_log: Path of a JSON-lines file that events are appended to (optional)
+        """
+        self._lock = threading.Lock()
+        self._event_file = open(event_log, 'a', encoding='utf-8') if event_log else None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.stages = {}
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time a block of code into the stage's latency histogram (also when it raises).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def event(self, name, **fields):
+        """
+        Append one event to the JSON-lines log, if one is configured.
+        Each line is flushed right away, so a crash or kill doesn't lose the last events.
+        """
+        if self._event_file is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 6), 'event': name, **fields}, default=str)
+        with self._lock:
+            if self._event_file is not None:
+                self._event_file.write(line + '\n')
+                self._event_file.flush()
+
+    def restart_clock(self):
+        """
+        Measure throughput from now on (e.g. once the campaign starts sending).
+        """
+        with self._lock:
+            self._started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def emails_per_second(self, counter='emails_sent'):
+        elapsed = self.elapsed
+        return self.counters.get(counter, 0) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self, counter='emails_sent'):
+        """
+        Snapshot of all counters and per-stage latencies, as a dictionary.
+        :param counter: Counter that emails_per_second is computed from
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': histogram.count,
+                    'total': histogram.sum,
+                    'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                    'p50': histogram.percentile(0.50),
+                    'p95': histogram.percentile(0.95),
+                    'p99': histogram.percentile(0.99),
+                    'max': histogram.max,
+                }
+                for stage, histogram in self.stages.items()
+            }
+            counters = dict(self.counters)
+        return {
+            'elapsed': self.elapsed,
+            'emails_per_second': self.emails_per_second(counter),
+            'counters': counters,
+            'stages': stages,
+        }
+
+    def format_summary(self, counter='emails_sent'):
+        """
+        Human-readable table of where the run's time went.
+        """
+        summary = self.summary(counter)
+        lines = [f"{'Stage':<16}{'Count':>9}{'Total s':>10}{'Mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'Max ms':>9}"]
+        for stage, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['total']):
+            lines.append(
+                f"{stage:<16}{stats['count']:>9}{stats['total']:>10.2f}{stats['mean'] * 1000:>10.2f}"
+                f"{stats['p50'] * 1000:>9.2f}{stats['p95'] * 1000:>9.2f}{stats['max'] * 1000:>9.2f}"
+            )
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f"{name}: {value}")
+        lines.append(f"Throughput: {summary['emails_per_second']:.2f} emails/sec over {summary['elapsed']:.1f}s")
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        prefix = METRIC_PREFIX
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+            if self.stages:
+                lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f"# TYPE {prefix}_emails_per_second gauge")
+        lines.append(f"{prefix}_emails_per_second {self.emails_per_second()}")
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        with self._lock:
+            if self._event_file is not None:
+                self._event_file.close()
+                self._event_file = None
+
+
+_metrics = Metrics()
+_server = None
+
+
+def get_metrics():
+    return _metrics
+
+
+def configure(event_log=None):
+    """
+    Start a fresh registry for a run, logging events to `event_log` if given.
+    """
+    global _metrics
+    _metrics.close()
+    _metrics = Metrics(event_log)
+    return _metrics
+
+
+def timer(stage):
+    return _metrics.timer(stage)
+
+
+def observe(stage, seconds):
+    _metrics.observe(stage, seconds)
+
+
+def increment(name, value=1):
+    _metrics.increment(name, value)
+
+
+def event(name, **fields):
+    _metrics.event(name, **fields)
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """
+    Serve /metrics in the Prometheus text format from a background thread.
+    :return: The server (its server_address has the actual port when port is 0)
+    """
+    global _server
+    # Imported here: http.server is slow to import and most runs don't serve metrics
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = _metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def stop_http_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,120 @@
+# phones.py
+# Bulk phone number extraction for the SMS channel, like addresses.py for email:
+# the phone column is resolved once per worksheet header, each distinct cell is
+# normalized to E.164 (+15555550123) once, and the result is cached on the record.
+
+import re
+
+# Possible phone column names, in priority order
+PHONE_FIELDS = ['mobile', 'cell', 'mobile phone', 'cell phone', 'phone', 'phone number', 'phone_number', 'telephone']
+
+# Key added to each record by annotate_phone_numbers
+PHONE_KEY = '_phone'
+
+# Country calling code assumed for numbers written without one (1 = US/Canada)
+DEFAULT_COUNTRY_CODE = '1'
+
+# Extension markers: "555-0100 ext. 12", "555-0100 x12"
+_EXTENSION = re.compile(r'\s*(?:ext\.?|extension|x|#)\s*\d+\s*$', re.IGNORECASE)
+_NOT_DIGITS = re.compile(r'\D')
+
+
+def find_phone_columns(header):
+    """
+    Resolve which columns of a worksheet hold phone numbers.
+    :param header: Column names of the worksheet
+    :return: Matching column names, in PHONE_FIELDS priority order
+    """
+    by_name = {str(column).strip().lower(): column for column in header}
+    return [by_name[field] for field in PHONE_FIELDS if field in by_name]
+
+
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Normalize one phone number to E.164.
+    :param value: Number as written in the sheet, e.g. "(555) 010-0123", "+44 20 7946 0958", 5550100123
+    :param country_code: Calling code for numbers without one
+    :return: E.164 number such as "+15550100123", or '' if it is not a usable number
+    """
+    if isinstance(value, int):
+        value = str(value)
+    if not isinstance(value, str):
+        return ''
+    value = _EXTENSION.sub('', value.strip())
+    international = value.startswith('+') or value.startswith('00')
+    digits = _NOT_DIGITS.sub('', value)
+    if international:
+        if digits.startswith('00'):
+            digits = digits[2:]
+    elif country_code == '1':
+        # North American numbers: 10 digits, optionally with the leading 1
+        if len(digits) == 11 and digits[0] == '1':
+            digits = digits[1:]
+        if len(digits) != 10 or digits[0] in '01':
+            return ''
+        digits = '1' + digits
+    else:
+        # National format: drop the trunk prefix 0
+        digits = country_code + digits.lstrip('0')
+    if not 8 <= len(digits) <= 15 or digits[0] == '0':
+        return ''
+    return '+' + digits
+
+
+def extract_phone_column(values, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Normalize a whole column of cells in one pass, normalizing repeated values only once.
+    :param values: Cell values
+    :return: List of E.164 numbers ('' where the cell has none), one per cell
+    """
+    seen = {}
+    results = []
+    append = results.append
+    for value in values:
+        phone = seen.get(value)
+        if phone is None:
+            phone = seen[value] = normalize_phone(value, country_code)
+        append(phone)
+    return results
+
+
+def annotate_phone_numbers(records, columns=None, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Store each record's first valid phone number on the record, under PHONE_KEY ('' if none).
+    :param records: List of company records from one worksheet
+    :param columns: Phone columns from find_phone_columns (resolved from the first record if not given)
+    :param country_code: Calling code for numbers without one
+    :return: The phone columns used
+    """
+    if not records:
+        return columns or []
+    if columns is None:
+        columns = find_phone_columns(records[0].keys())
+
+    per_column = [extract_phone_column([record.get(column, '') for record in records], country_code)
+                  for column in columns]
+    if not per_column:
+        merged = [''] * len(records)
+    elif len(per_column) == 1:
+        merged = per_column[0]
+    else:
+        merged = [next((phone for phone in row if phone), '') for row in zip(*per_column)]
+
+    for record, phone in zip(records, merged):
+        record[PHONE_KEY] = phone
+    return columns
+
+
+def get_record_phone(record, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    The record's phone number in E.164, using the cached value when the record was annotated.
+    :return: Phone number, or '' if the record has none
+    """
+    phone = record.get(PHONE_KEY)
+    if phone is not None:
+        return phone
+    for column in find_phone_columns(record.keys()):
+        phone = normalize_phone(record.get(column, ''), country_code)
+        if phone:
+            return phone
+    return ''
@@ -0,0 +1,104 @@
+# pipeline.py
+# Streaming lead source: rows flow from the sheet download straight into the
+# campaign while later pages and worksheets are still being fetched.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import sheets
+from addresses import annotate_email_addresses
+from config import settings
+from phones import annotate_phone_numbers
+
+# Records handed from the download thread to the campaign in one go
+BATCH_SIZE = 500
+
+
+class LeadStream:
+    """
+    Iterable of (worksheet_name, company_info) tuples, downloaded in the background.
+
+    Several worksheets download at once (up to `max_concurrency`), so their
+    leads arrive interleaved. Only a few batches are buffered at a time, so memory
+    stays flat however large the worksheets are. Email addresses and phone numbers
+    are extracted per batch on the download threads and cached on each record.
+    Per-worksheet row counts are available in `counts` once iteration has finished.
+    """
+
+    def __init__(self, sheet_name, worksheet_names, max_buffered_batches=4, max_concurrency=None):
+        """
+        :param max_concurrency: Worksheets downloaded at the same time (default SHEETS_MAX_CONCURRENCY)
+        """
+        self.sheet_name = sheet_name
+        self.worksheet_names = list(worksheet_names)
+        self.max_buffered_batches = max_buffered_batches
+        self.max_concurrency = max_concurrency or settings.SHEETS_MAX_CONCURRENCY
+        self.counts = {name: 0 for name in self.worksheet_names}
+        self.errors = {}
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.max_buffered_batches)
+        stop = threading.Event()
+        fetcher = threading.Thread(target=self._fetch, args=(batches, stop), name="sheet-fetcher", daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                worksheet_name, records = batch
+                self.counts[worksheet_name] += len(records)
+                for record in records:
+                    yield worksheet_name, record
+        finally:
+            # The consumer may stop early (e.g. MAX_EMAILS_PER_RUN reached)
+            stop.set()
+            fetcher.join()
+
+    def _put(self, batches, stop, item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch(self, batches, stop):
+        try:
+            version = None
+            if not sheets.OFFLINE_MODE and sheets.get_lead_cache() is not None:
+                # One Drive lookup for the whole spreadsheet, not one per worksheet
+                version = sheets.get_spreadsheet_version(self.sheet_name)
+            workers = min(self.max_concurrency, len(self.worksheet_names)) or 1
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheet-fetch") as executor:
+                for worksheet_name in self.worksheet_names:
+                    executor.submit(self._fetch_worksheet, worksheet_name, version, batches, stop)
+        except Exception as e:
+            print(f"Error reading sheet '{self.sheet_name}': {str(e)}")
+            self.errors[self.sheet_name] = e
+        finally:
+            self._put(batches, stop, None)
+
+    def _fetch_worksheet(self, worksheet_name, version, batches, stop):
+        if stop.is_set():
+            return
+        batch = []
+        email_columns = phone_columns = None
+        try:
+            for record in sheets.iter_company_data(self.sheet_name, worksheet_name, version=version):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    email_columns = annotate_email_addresses(batch, email_columns)
+                    phone_columns = annotate_phone_numbers(batch, phone_columns, settings.SMS_COUNTRY_CODE)
+                    if not self._put(batches, stop, (worksheet_name, batch)):
+                        return
+                    batch = []
+        except Exception as e:
+            print(f"Error processing worksheet '{worksheet_name}': {str(e)}")
+            self.errors[worksheet_name] = e
+        if batch:
+            annotate_email_addresses(batch, email_columns)
+            annotate_phone_numbers(batch, phone_columns, settings.SMS_COUNTRY_CODE)
+            self._put(batches, stop, (worksheet_name, batch))
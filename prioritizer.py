@@ -0,0 +1,272 @@
+# prioritizer.py
+# Spend a limited send quota on the best leads first. Each lead gets a score from
+# configurable rules over its sheet columns, its worksheet's weight, how recently
+# it was added and how often earlier campaigns contacted it. Leads are then
+# handed out best-first from a heap, with each worksheet capped at its fair share
+# of the quota so one large tab can't crowd out the others.
+
+import heapq
+import math
+import time
+from datetime import datetime
+
+from utils import normalize_email
+
+# Rule operators: (cell value, rule value) -> bool
+OPERATORS = {
+    'present': lambda cell, value: cell not in ('', None),
+    'empty': lambda cell, value: cell in ('', None),
+    '==': lambda cell, value: _text(cell) == _text(value),
+    '!=': lambda cell, value: _text(cell) != _text(value),
+    'contains': lambda cell, value: _text(value) in _text(cell),
+    'in': lambda cell, value: _text(cell) in {_text(item) for item in value},
+    '>': lambda cell, value: _number(cell) is not None and _number(cell) > value,
+    '>=': lambda cell, value: _number(cell) is not None and _number(cell) >= value,
+    '<': lambda cell, value: _number(cell) is not None and _number(cell) < value,
+    '<=': lambda cell, value: _number(cell) is not None and _number(cell) <= value,
+}
+
+# Date formats tried for the lead date column (Sheets may also send serial day numbers)
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%d.%m.%Y', '%b %d, %Y']
+
+# Day 0 of Google Sheets serial dates
+_SHEETS_EPOCH = datetime(1899, 12, 30)
+
+
+def _text(value):
+    return str(value).strip().lower()
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(',', '').replace('$', '').strip())
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """
+    Parse a date cell.
+    :return: Seconds since the epoch, or None if the cell is not a date
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 1 <= value <= 100000:  # serial day number
+            return (_SHEETS_EPOCH - datetime(1970, 1, 1)).total_seconds() + value * 86400
+        return None
+    value = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def compile_rules(rules):
+    """
+    Check and compile scoring rules.
+    :param rules: List of {"column": ..., "op": ..., "value": ..., "points": ...} dictionaries;
+                  "op" defaults to "present"
+    :return: List of (lowercase column name, test, rule value, points) tuples
+    :raises ValueError: For an unknown operator, a rule without a column or a non-numeric comparison
+    """
+    compiled = []
+    for rule in rules:
+        column = str(rule.get('column', '')).strip().lower()
+        op = rule.get('op', 'present')
+        if not column:
+            raise ValueError(f"Priority rule without a column: {rule}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator {op!r} in priority rule (use one of: {', '.join(OPERATORS)})")
+        value = rule.get('value')
+        if op in ('>', '>=', '<', '<='):
+            if _number(value) is None:
+                raise ValueError(f"Priority rule {rule} needs a numeric value")
+            value = _number(value)
+        compiled.append((column, OPERATORS[op], value, float(rule.get('points', 1))))
+    return compiled
+
+
+class LeadScorer:
+    """
+    Score = worksheet weight x (rule points + freshness points) + contact history points.
+
+    Freshness points halve every `age_half_life_days` after the date in
+    `date_column`. Columns are resolved once per worksheet.
+    """
+
+    def __init__(self, rules=(), worksheet_weights=None, date_column=None, age_points=0,
+                 age_half_life_days=30, contact_counts=None, contact_points=0, now=None):
+        """
+        :param rules: Scoring rules (see compile_rules)
+        :param worksheet_weights: Dictionary of worksheet name -> weight (default 1)
+        :param date_column: Column with the date the lead was added (optional)
+        :param age_points: Points of a lead added today
+        :param age_half_life_days: Days after which a lead's freshness points have halved
+        :param contact_counts: Dictionary of normalized recipient -> campaigns that contacted it
+        :param contact_points: Points per earlier contact (usually negative)
+        :param now: Current time in seconds since the epoch (default: time.time())
+        """
+        self.rules = compile_rules(rules)
+        self.worksheet_weights = dict(worksheet_weights or {})
+        self.date_column = date_column.strip().lower() if date_column else None
+        self.age_points = age_points
+        self.age_half_life = age_half_life_days * 86400
+        self.contact_counts = contact_counts or {}
+        self.contact_points = contact_points
+        self.now = now if now is not None else time.time()
+        self._columns = {}  # worksheet -> (rules with the sheet's column names, date column)
+        self._dates = {}
+
+    def weight(self, worksheet_name):
+        return self.worksheet_weights.get(worksheet_name, 1.0)
+
+    def _resolve(self, worksheet_name, lead):
+        by_name = {str(column).strip().lower(): column for column in lead.keys()}
+        rules = [(by_name[column], test, value, points) for column, test, value, points in self.rules
+                 if column in by_name]
+        date_column = by_name.get(self.date_column) if self.date_column else None
+        resolved = self._columns[worksheet_name] = (rules, date_column)
+        return resolved
+
+    def _age_points(self, cell):
+        added = self._dates.get(cell)
+        if added is None and cell not in self._dates:
+            added = self._dates[cell] = parse_date(cell) if cell not in ('', None) else None
+        if added is None:
+            return 0.0
+        age = max(0.0, self.now - added)
+        return self.age_points * 0.5 ** (age / self.age_half_life) if self.age_half_life else 0.0
+
+    def score(self, worksheet_name, lead, recipient=''):
+        """
+        :param lead: company_info from the sheet
+        :param recipient: Email address or phone number the lead would be contacted at
+        :return: Score; higher is sent earlier
+        """
+        resolved = self._columns.get(worksheet_name)
+        if resolved is None:
+            resolved = self._resolve(worksheet_name, lead)
+        rules, date_column = resolved
+        points = 0.0
+        for column, test, value, rule_points in rules:
+            if test(lead.get(column, ''), value):
+                points += rule_points
+        if date_column is not None and self.age_points:
+            points += self._age_points(lead.get(date_column, ''))
+        score = self.weight(worksheet_name) * points
+        if recipient and self.contact_points:
+            score += self.contact_points * self.contact_counts.get(normalize_email(recipient), 0)
+        return score
+
+
+def fair_shares(quota, weights):
+    """
+    Split a quota over worksheets in proportion to their weights (rounded up).
+    :param weights: Dictionary of worksheet name -> weight
+    :return: Dictionary of worksheet name -> most leads it may take while others are waiting
+    """
+    total = sum(weights.values())
+    if not total:
+        return {name: quota for name in weights}
+    return {name: math.ceil(quota * weight / total) for name, weight in weights.items()}
+
+
+class LeadQueue:
+    """
+    Leads ordered by score, best first, with per-worksheet fair-share limits.
+
+    A lead whose worksheet has used up its share is set aside; set-aside leads
+    are only handed out once no other worksheet has leads left, so the quota is
+    never left unspent. Each pick costs O(log n).
+    """
+
+    def __init__(self, limits=None):
+        """
+        :param limits: Dictionary of worksheet name -> most leads it may take while others are waiting
+                       (None for no limits)
+        """
+        self.limits = limits
+        self.taken = {}
+        self._heap = []
+        self._deferred = []
+        self._counter = 0
+
+    def push(self, worksheet_name, lead, score):
+        # The counter keeps equal scores in sheet order and avoids comparing leads
+        heapq.heappush(self._heap, (-score, self._counter, worksheet_name, lead))
+        self._counter += 1
+
+    def extend(self, items):
+        """
+        Add many leads at once, in O(n) rather than O(n log n).
+        :param items: Iterable of (worksheet_name, lead, score) tuples
+        """
+        for worksheet_name, lead, score in items:
+            self._heap.append((-score, self._counter, worksheet_name, lead))
+            self._counter += 1
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap) + len(self._deferred)
+
+    def pop(self):
+        """
+        :return: (worksheet_name, lead) of the best lead allowed next
+        :raises IndexError: If the queue is empty
+        """
+        heap = self._heap
+        while heap:
+            entry = heapq.heappop(heap)
+            worksheet_name = entry[2]
+            taken = self.taken.get(worksheet_name, 0)
+            if self.limits is not None and taken >= self.limits.get(worksheet_name, taken + 1):
+                self._deferred.append(entry)
+                continue
+            self.taken[worksheet_name] = taken + 1
+            return worksheet_name, entry[3]
+        if not self._deferred:
+            raise IndexError("pop from an empty LeadQueue")
+        # Only worksheets over their share have leads left: lift the limits
+        self._heap, self._deferred, self.limits = self._deferred, [], None
+        heapq.heapify(self._heap)
+        return self.pop()
+
+    def __iter__(self):
+        while len(self):
+            yield self.pop()
+
+
+def prioritize_leads(leads, scorer, get_recipient, quota=None):
+    """
+    Reorder leads best-first across all worksheets.
+    Leads without a recipient come last, in sheet order, so they don't use up a
+    worksheet's share.
+    :param leads: Iterable of (worksheet_name, company_info) tuples
+    :param scorer: LeadScorer
+    :param get_recipient: Callable company_info -> email address or phone number, or '' if the lead
+                          won't be contacted (none, already contacted, bounced, undeliverable...)
+    :param quota: Leads that will be contacted this run (e.g. MAX_EMAILS_PER_RUN); None for no fair-share limits
+    :return: Tuple of (LeadQueue, generator of leads in send order)
+    """
+    queue = LeadQueue()
+    scored = []
+    last = []
+    weights = {}
+    for worksheet_name, lead in leads:
+        recipient = get_recipient(lead)
+        if not recipient:
+            last.append((worksheet_name, lead))
+            continue
+        weights.setdefault(worksheet_name, scorer.weight(worksheet_name))
+        scored.append((worksheet_name, lead, scorer.score(worksheet_name, lead, recipient)))
+    queue.extend(scored)
+    if quota:
+        queue.limits = fair_shares(quota, weights)
+
+    def ordered():
+        yield from queue
+        yield from last
+    return queue, ordered()
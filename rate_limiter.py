@@ -0,0 +1,155 @@
+# rate_limiter.py
+# Token-bucket rate limiting for provider quotas such as "30/minute, 500/day".
+# Several windows are enforced at once, and bucket state is saved to disk so a
+# daily quota still holds across separate runs.
+
+import json
+import os
+import threading
+import time
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+def parse_rate_limits(spec):
+    """
+    Parse a quota string like "1/second, 30/minute, 500/day" or "1/3 seconds".
+    :param spec: Comma separated list of <count>/[<number of>] <period>
+    :return: List of (count, period_in_seconds) tuples
+    """
+    limits = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        count, _, spec_period = part.partition('/')
+        multiple, _, period = spec_period.strip().rpartition(' ')
+        if not multiple and period[:1].isdigit():
+            multiple, period = period, 'second'
+        period = period.lower().rstrip('s') or 'second'
+        if period not in PERIODS or not (multiple or '1').isdigit():
+            raise ValueError(f"Unknown rate limit period '{spec_period.strip()}' in '{part}'")
+        limits.append((int(count), PERIODS[period] * int(multiple or 1)))
+    return limits
+
+
+def share_rate_limits(spec, index, count):
+    """
+    One part of a quota split between `count` senders, e.g. "1/second, 500/day" in
+    two -> "1/2 seconds, 250/day". The first parts take the remainder.
+    :param spec: Quota string for parse_rate_limits
+    :param index: Which part, 0 to count - 1
+    :return: Quota string
+    """
+    names = {seconds: name for name, seconds in PERIODS.items()}
+    parts = []
+    for rate, period in parse_rate_limits(spec):
+        if rate < count:
+            # Fewer events than parts: each part gets one per longer period
+            rate, period = 1, -(-period * count // rate)
+        else:
+            rate = rate // count + int(index < rate % count)
+        parts.append(f"{rate}/{names.get(period) or f'{period} seconds'}")
+    return ', '.join(parts)
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per `period` seconds, refilling continuously.
+    """
+
+    def __init__(self, rate, period, tokens=None, updated=None):
+        self.rate = rate
+        self.period = period
+        self.capacity = float(rate)
+        self.tokens = self.capacity if tokens is None else min(float(tokens), self.capacity)
+        self.updated = time.time() if updated is None else updated
+
+    @property
+    def key(self):
+        return f"{self.rate}/{self.period}"
+
+    def refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate / self.period)
+        self.updated = now
+
+    def wait_time(self):
+        """
+        Seconds until one token is available (0 if one is available now).
+        """
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.rate
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that enforces several token buckets at the same time.
+    """
+
+    def __init__(self, limits, state_file=None):
+        """
+        :param limits: List of (count, period_in_seconds) tuples, or a string for parse_rate_limits
+        :param state_file: JSON file used to carry bucket state across runs (optional)
+        """
+        if isinstance(limits, str):
+            limits = parse_rate_limits(limits)
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        saved = self._load_state()
+        self.buckets = []
+        for rate, period in limits:
+            state = saved.get(f"{rate}/{period}", {})
+            self.buckets.append(TokenBucket(rate, period, state.get('tokens'), state.get('updated')))
+
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read rate limit state from {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        state = {bucket.key: {'tokens': bucket.tokens, 'updated': bucket.updated} for bucket in self.buckets}
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+    def try_acquire(self):
+        """
+        Take a token from every bucket if all of them have one.
+        :return: 0 if the event may happen now, otherwise the seconds to wait
+        """
+        with self._lock:
+            now = time.time()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            wait = max((bucket.wait_time() for bucket in self.buckets), default=0.0)
+            if wait > 0:
+                return wait
+            for bucket in self.buckets:
+                bucket.tokens -= 1
+            self._save_state()
+            return 0.0
+
+    def acquire(self):
+        """
+        Block until every window allows another event, sleeping no longer than needed.
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
@@ -0,0 +1,263 @@
+# relay_router.py
+# Outbound mail routing: several SMTP relays / sender accounts with weighted load
+# balancing and failover, and a queue that spaces out sends to each recipient
+# domain so no single provider sees a burst from us.
+
+import heapq
+import json
+import smtplib
+import threading
+import time
+from collections import deque
+
+from rate_limiter import RateLimiter, share_rate_limits
+from smtp_pool import SMTPConnectionPool
+from templates import MessageBuilder
+
+# Words in an SMTP error that mean the sending account hit a provider limit
+QUOTA_ERROR_WORDS = ('quota', 'limit', 'too many', 'exceeded', 'suspended')
+
+
+class RelayUnavailable(Exception):
+    """
+    No relay can take a message right now (all disabled).
+    """
+
+
+class Relay:
+    """
+    One SMTP relay / sender account with its own session pool, From header and quota.
+    """
+
+    def __init__(self, name, config, weight=1, pool=None, builder=None, rate_limiter=None):
+        """
+        :param name: Name used in logs and state files
+        :param config: Email configuration dict (see messaging.EMAIL_CONFIG)
+        :param weight: Share of the traffic this relay gets relative to the others
+        :param pool: SMTPConnectionPool (created from config if not given)
+        :param builder: MessageBuilder for this sender (created from config if not given)
+        :param rate_limiter: RateLimiter for this account's own quota (optional)
+        """
+        self.name = name
+        self.config = config
+        self.weight = weight
+        self.pool = pool or SMTPConnectionPool(config)
+        self.builder = builder or MessageBuilder(config['sender_name'], config['sender_email'])
+        self.rate_limiter = rate_limiter
+        self.disabled_reason = None
+        self.sent = 0
+        self.current_weight = 0
+
+
+def is_quota_error(error):
+    """
+    Check whether an SMTP error means the sending account is over its quota.
+    Only permanent (5xx) replies count; a 4xx "too many messages" is temporary
+    throttling and is retried instead of disabling the relay.
+    """
+    if not isinstance(error, smtplib.SMTPResponseException) or error.smtp_code < 500:
+        return False
+    message = error.smtp_error
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    message = message.lower()
+    return any(word in message for word in QUOTA_ERROR_WORDS)
+
+
+class RelayRouter:
+    """
+    Picks a relay for each message by smooth weighted round robin, skipping
+    relays that are disabled or currently out of quota.
+    """
+
+    def __init__(self, relays):
+        if not relays:
+            raise ValueError("At least one SMTP relay is required")
+        self.relays = list(relays)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, defaults, pool_size=2, max_messages_per_session=50,
+                  state_file='rate_limit_state.{name}.json', share=None):
+        """
+        Load relays from a JSON list. Each entry overrides `defaults` (an EMAIL_CONFIG-style
+        dict) and may set "name", "weight" and "rate_limits" (e.g. "30/minute, 500/day").
+        :param state_file: Quota state file of each relay; {name} is replaced by the relay's name
+        :param share: (index, count) to use only that part of each relay's quota, when
+                      several processes send through the same relays
+        """
+        with open(path, 'r') as f:
+            entries = json.load(f)
+        relays = []
+        for i, entry in enumerate(entries):
+            entry = dict(entry)
+            name = entry.pop('name', None) or f"relay{i + 1}"
+            weight = entry.pop('weight', 1)
+            rate_limits = entry.pop('rate_limits', None)
+            config = dict(defaults, **entry)
+            pool = SMTPConnectionPool(config, max_size=pool_size, max_messages_per_session=max_messages_per_session)
+            rate_limiter = None
+            if rate_limits:
+                if share is not None:
+                    rate_limits = share_rate_limits(rate_limits, *share)
+                rate_limiter = RateLimiter(rate_limits, state_file=state_file.format(name=name))
+            relays.append(Relay(name, config, weight, pool=pool, rate_limiter=rate_limiter))
+        return cls(relays)
+
+    @property
+    def available(self):
+        with self._lock:
+            return [relay for relay in self.relays if relay.disabled_reason is None]
+
+    def choose(self, exclude=()):
+        """
+        Pick the next relay and take one unit of its quota.
+        Blocks only when every usable relay is out of quota, and only until the first frees up.
+        :param exclude: Relays already tried for this message
+        :return: Relay
+        :raises RelayUnavailable: if every relay is disabled or excluded
+        """
+        while True:
+            with self._lock:
+                candidates = [relay for relay in self.relays if relay.disabled_reason is None and relay not in exclude]
+                if not candidates:
+                    raise RelayUnavailable("No SMTP relay available")
+                # Smooth weighted round robin (as in nginx)
+                total = sum(relay.weight for relay in candidates)
+                for relay in candidates:
+                    relay.current_weight += relay.weight
+                ordered = sorted(candidates, key=lambda relay: relay.current_weight, reverse=True)
+
+            shortest_wait = None
+            for relay in ordered:
+                wait = relay.rate_limiter.try_acquire() if relay.rate_limiter is not None else 0
+                if wait <= 0:
+                    with self._lock:
+                        relay.current_weight -= total
+                    return relay
+                shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+            time.sleep(shortest_wait)
+
+    def disable(self, relay, reason):
+        with self._lock:
+            if relay.disabled_reason is None:
+                relay.disabled_reason = reason
+                print(f"⚠️  Disabling SMTP relay '{relay.name}' for this run: {reason}")
+
+    def record_sent(self, relay):
+        with self._lock:
+            relay.sent += 1
+
+    def ensure_capacity(self, size):
+        for relay in self.relays:
+            relay.pool.ensure_capacity(size)
+
+    def close(self):
+        for relay in self.relays:
+            relay.pool.close()
+
+
+class DomainQueue:
+    """
+    Queue of pending messages grouped by recipient domain.
+
+    get() hands out the domain that has waited longest, and never gives out two
+    messages for the same domain less than `domain_interval` seconds apart, so
+    each domain's sends are spread out while other domains keep the workers busy.
+    Messages put with put_delayed() join their domain once their delay has passed.
+    """
+
+    def __init__(self, maxsize=0, domain_interval=0, linger=0):
+        """
+        :param maxsize: Messages held before put() blocks (0 for no limit)
+        :param domain_interval: Minimum seconds between two messages to the same domain
+        :param linger: After a stop marker, keep handing out delayed messages that
+                       come due within this many seconds
+        """
+        self.maxsize = maxsize
+        self.domain_interval = domain_interval
+        self.linger = linger
+        self._by_domain = {}
+        self._ready = []  # Heap of (ready_at, sequence, domain)
+        self._next_allowed = {}
+        self._delayed = []  # Heap of (due_at, sequence, domain, job)
+        self._sequence = 0
+        self._size = 0
+        self._control_items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return self._size
+
+    def put(self, job, domain=None):
+        """
+        Add a message (or None, which tells one worker to stop).
+        """
+        with self._cond:
+            if job is None:
+                # Stop markers remember when they were put, for `linger`
+                self._control_items.append((time.monotonic(), None))
+                self._cond.notify_all()
+                return
+            while self.maxsize and self._size >= self.maxsize:
+                self._cond.wait()
+            self._add(job, domain)
+            self._size += 1
+            self._cond.notify_all()
+
+    def put_delayed(self, job, domain, delay):
+        """
+        Add a message that must not be sent for another `delay` seconds (e.g. a retry).
+        Delayed messages do not count towards maxsize and do not keep workers from stopping.
+        """
+        with self._cond:
+            self._sequence += 1
+            heapq.heappush(self._delayed, (time.monotonic() + max(0, delay), self._sequence, domain, job))
+            self._cond.notify_all()
+
+    @property
+    def delayed(self):
+        with self._cond:
+            return len(self._delayed)
+
+    def _add(self, job, domain):
+        pending = self._by_domain.get(domain)
+        if pending is None:
+            pending = self._by_domain[domain] = deque()
+            ready_at = max(time.monotonic(), self._next_allowed.get(domain, 0))
+            self._sequence += 1
+            heapq.heappush(self._ready, (ready_at, self._sequence, domain))
+        pending.append(job)
+
+    def get(self):
+        """
+        Take the next message whose domain may be sent to now, waiting if necessary.
+        Returns None once the queue is empty and a stop marker was put; messages
+        still delayed by more than `linger` seconds at that point are left in the queue.
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, domain, job = heapq.heappop(self._delayed)
+                    self._add(job, domain)
+                    self._size += 1
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, domain = heapq.heappop(self._ready)
+                    pending = self._by_domain[domain]
+                    job = pending.popleft()
+                    self._size -= 1
+                    self._next_allowed[domain] = now + self.domain_interval
+                    if pending:
+                        self._sequence += 1
+                        heapq.heappush(self._ready, (now + self.domain_interval, self._sequence, domain))
+                    else:
+                        del self._by_domain[domain]
+                    self._cond.notify_all()
+                    return job
+                if not self._ready and self._control_items:
+                    if not self._delayed or self._delayed[0][0] > self._control_items[0][0] + self.linger:
+                        return self._control_items.popleft()[1]
+                wake_at = [heap[0][0] for heap in (self._ready, self._delayed) if heap]
+                self._cond.wait(min(wake_at) - now if wake_at else None)
@@ -0,0 +1,81 @@
+# retry_queue.py
+# Classify SMTP failures and decide when to try again: temporary failures
+# (4xx replies, dropped connections, timeouts) are retried with exponential
+# backoff, permanent 5xx rejections are hard bounces that are never retried.
+
+import random
+import smtplib
+
+from relay_router import RelayUnavailable
+
+# Outcomes of classify_error
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+ERROR = 'error'
+
+
+def smtp_error_code(error):
+    """
+    The SMTP reply code behind an exception, or None if there is none.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return max(codes) if codes else None
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    return None
+
+
+def classify_error(error):
+    """
+    Decide whether a failed send is worth retrying.
+    :return: TRANSIENT (retry later), PERMANENT (hard bounce, never retry this
+             recipient) or ERROR (not an SMTP problem; give up for this run)
+    """
+    code = smtp_error_code(error)
+    if code is None:
+        # smtplib errors are OSErrors too, so this also covers dropped connections
+        if isinstance(error, (OSError, RelayUnavailable)):
+            return TRANSIENT
+        return ERROR
+    if isinstance(error, smtplib.SMTPSenderRefused):
+        # Our sender address was refused; that says nothing about the recipient
+        return TRANSIENT
+    if 400 <= code < 500:
+        return TRANSIENT
+    if 500 <= code < 600:
+        return PERMANENT
+    return ERROR
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter: base_delay, 2x, 4x, ... capped at max_delay,
+    each randomly stretched or shrunk by up to `jitter` so retries don't arrive in bursts.
+    """
+
+    def __init__(self, base_delay=60, max_delay=3600, max_attempts=5, jitter=0.5):
+        """
+        :param base_delay: Seconds before the first retry
+        :param max_delay: Longest wait between two attempts
+        :param max_attempts: Attempts (including the first) before giving up on a recipient
+        :param jitter: Random spread as a fraction of the delay (0.5 = +/-50%)
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+
+    def should_retry(self, attempts):
+        """
+        :param attempts: Attempts made so far
+        """
+        return attempts < self.max_attempts
+
+    def delay(self, attempts):
+        """
+        Seconds to wait before the next attempt.
+        :param attempts: Attempts made so far (1 after the first failure)
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
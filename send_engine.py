@@ -0,0 +1,457 @@
+# send_engine.py
+# Concurrent email sending: a producer renders messages into a shared queue and
+# a fixed number of workers, each holding its own SMTP sessions, send them.
+# Messages are paced per recipient domain and routed across the configured relays.
+
+import json
+import smtplib
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+from relay_router import DomainQueue, RelayUnavailable, is_quota_error
+from retry_queue import PERMANENT, TRANSIENT, RetryPolicy, classify_error, smtp_error_code
+from status_writer import ALREADY_SENT, BOUNCED, FAILED, RETRYING, SENT, SKIPPED, TEXTED
+from utils import normalize_email
+
+# A rendered email; the MIME message is built by the worker for the relay it goes out through.
+# `attempts` counts earlier failed attempts to send it.
+EmailJob = namedtuple(
+    'EmailJob',
+    ['worksheet', 'company', 'recipient', 'subject', 'body', 'html_body', 'attempts'],
+    defaults=[None, 0],
+)
+
+
+def encode_job(job):
+    # Leads from the sheet are lead_table.Lead rows, stored as plain dictionaries
+    return json.dumps(job._asdict(), default=dict)
+
+
+def decode_job(payload):
+    return EmailJob(**json.loads(payload))
+
+
+class SendStats:
+    """
+    Thread-safe campaign counters.
+
+    Sends are reserved before they are queued, so the number of successful
+    sends never exceeds max_sends no matter how many workers are running.
+    Text messages count towards max_sends like emails.
+    """
+
+    def __init__(self, max_sends=None):
+        self.max_sends = max_sends
+        self.sent = 0
+        self.texted = 0
+        self.skipped = 0
+        self.already_sent = 0
+        self.bounced = 0
+        self.retrying = 0
+        self.pending = 0
+        self._cond = threading.Condition()
+
+    def wait_for_capacity(self):
+        """
+        Block until another send may be queued.
+        :return: False once max_sends emails have actually been sent
+        """
+        with self._cond:
+            if self.max_sends is None:
+                return True
+            while self.sent + self.texted + self.pending >= self.max_sends:
+                if self.pending == 0:
+                    return False
+                self._cond.wait()
+            return True
+
+    def reserve(self):
+        with self._cond:
+            self.pending += 1
+
+    def try_reserve(self):
+        """
+        Reserve a send without waiting (used for retries).
+        :return: False if max_sends is already used up
+        """
+        with self._cond:
+            if self.max_sends is not None and self.sent + self.texted + self.pending >= self.max_sends:
+                return False
+            self.pending += 1
+            return True
+
+    def record_sent(self):
+        with self._cond:
+            self.pending -= 1
+            self.sent += 1
+            self._cond.notify_all()
+            return self.sent
+
+    def record_texted(self):
+        with self._cond:
+            self.pending -= 1
+            self.texted += 1
+            self._cond.notify_all()
+            return self.texted
+
+    def record_failed(self):
+        with self._cond:
+            self.pending -= 1
+            self.skipped += 1
+            self._cond.notify_all()
+
+    def record_deferred(self):
+        """
+        A reserved send failed temporarily and was queued for a retry.
+        """
+        with self._cond:
+            self.pending -= 1
+            self.retrying += 1
+            self._cond.notify_all()
+
+    def record_retry_queued(self):
+        with self._cond:
+            self.retrying += 1
+
+    def record_retry_started(self):
+        with self._cond:
+            self.retrying -= 1
+
+    def record_bounced(self):
+        with self._cond:
+            self.pending -= 1
+            self.bounced += 1
+            self._cond.notify_all()
+
+    def record_suppressed(self):
+        """
+        The recipient hard-bounced in an earlier run and was not emailed.
+        """
+        with self._cond:
+            self.bounced += 1
+
+    def record_skipped(self):
+        with self._cond:
+            self.skipped += 1
+
+    def record_already_sent(self):
+        with self._cond:
+            self.already_sent += 1
+
+
+class SendEngine:
+    """
+    Send rendered emails with several SMTP sessions in parallel.
+    """
+
+    def __init__(self, router, worker_count=4, max_sends=None, rate_limiter=None, ledger=None,
+                 domain_interval=0, max_queued=None, retry_policy=None, retry_wait=0, status_writer=None,
+                 sms_sender=None):
+        """
+        :param router: RelayRouter choosing the relay (and session pool) for each message
+        :param worker_count: Number of concurrent workers (one SMTP session per relay each)
+        :param max_sends: Stop after this many successful sends (None for no limit)
+        :param rate_limiter: RateLimiter shared by all workers (optional)
+        :param ledger: SendLedger used to skip and record recipients (optional)
+        :param domain_interval: Minimum seconds between two sends to the same recipient domain
+        :param max_queued: Rendered messages buffered ahead of the workers; a larger buffer
+                           lets other domains go out while one domain is being paced
+        :param retry_policy: RetryPolicy for temporary failures (default RetryPolicy())
+        :param retry_wait: Seconds the run keeps going after the last fresh message for
+                           retries that come due; later retries are left for the next run
+        :param status_writer: StatusWriter that gets each lead's outcome (optional)
+        :param sms_sender: SMSSender used to text leads that have a phone number but no email (optional)
+        """
+        self.router = router
+        self.worker_count = max(1, worker_count)
+        self.rate_limiter = rate_limiter
+        self.ledger = ledger
+        self.stats = SendStats(max_sends)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.status_writer = status_writer
+        self.sms_sender = sms_sender
+        if max_queued is None:
+            max_queued = self.worker_count * (50 if domain_interval else 2)
+        self._queue = DomainQueue(maxsize=max_queued, domain_interval=domain_interval, linger=retry_wait)
+        self._retry_recipients = set()
+        self.router.ensure_capacity(self.worker_count)
+
+    def run(self, leads, get_recipient, render, get_phone=None, render_sms=None):
+        """
+        Send a campaign.
+        :param leads: Iterable of (worksheet_name, company_info) tuples
+        :param get_recipient: Callable company_info -> email address, or '' to skip the lead
+        :param render: Callable (worksheet_name, company_info, recipient) -> EmailJob
+        :param get_phone: Callable company_info -> phone number or '', for leads without an email
+        :param render_sms: Callable (worksheet_name, company_info, phone) -> text message, or None to skip
+        :return: SendStats with the final counts
+        """
+        texting = self.sms_sender is not None and get_phone is not None and render_sms is not None
+        workers = [
+            threading.Thread(target=self._worker, name=f"send-worker-{i + 1}", daemon=True)
+            for i in range(self.worker_count)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._load_retries()
+            for worksheet_name, company in leads:
+                if not self.stats.wait_for_capacity():
+                    print(f"\n⚠️  Reached maximum emails per run ({self.stats.max_sends}). Stopping.")
+                    break
+
+                recipient = get_recipient(company)
+                if not recipient and texting and self._text(worksheet_name, company, get_phone, render_sms):
+                    continue
+                if not recipient:
+                    metrics.increment('leads_skipped')
+                    self.stats.record_skipped()
+                    self._record_status(worksheet_name, company, SKIPPED)
+                    continue
+
+                if self.ledger is not None:
+                    if self.ledger.is_bounced(recipient):
+                        print(f"📛 Skipping {company.get('name', 'Unknown')} - {recipient} bounced before")
+                        metrics.increment('leads_suppressed')
+                        self.stats.record_suppressed()
+                        self._record_status(worksheet_name, company, BOUNCED)
+                        continue
+                    if not self.ledger.claim(recipient):
+                        # Leads queued for a retry are counted under stats.retrying
+                        if normalize_email(recipient) in self._retry_recipients:
+                            self._record_status(worksheet_name, company, RETRYING)
+                        else:
+                            metrics.increment('leads_already_sent')
+                            self.stats.record_already_sent()
+                            self._record_status(worksheet_name, company, ALREADY_SENT)
+                        continue
+
+                self.stats.reserve()
+                job = render(worksheet_name, company, recipient)
+                with metrics.timer('queue_put'):
+                    self._queue.put(job, _domain(recipient))
+        finally:
+            for _ in workers:
+                self._queue.put(None)
+            for worker in workers:
+                worker.join()
+            if self.sms_sender is not None:
+                self.sms_sender.drain()
+
+        return self.stats
+
+    def _text(self, worksheet_name, company, get_phone, render_sms):
+        """
+        Text a lead that has no email address, if it has a phone number.
+        :return: True if the lead was dealt with here (texted, or already texted before)
+        """
+        phone = get_phone(company)
+        if not phone:
+            return False
+        if self.ledger is not None:
+            if self.ledger.is_bounced(phone):
+                metrics.increment('leads_suppressed')
+                self.stats.record_suppressed()
+                self._record_status(worksheet_name, company, BOUNCED)
+                return True
+            if not self.ledger.claim(phone):
+                metrics.increment('leads_already_sent')
+                self.stats.record_already_sent()
+                self._record_status(worksheet_name, company, ALREADY_SENT)
+                return True
+        body = render_sms(worksheet_name, company, phone)
+        if not body:
+            if self.ledger is not None:
+                self.ledger.release(phone)
+            return False
+        self.stats.reserve()
+        start = time.perf_counter()
+        self.sms_sender.submit(
+            phone, body,
+            lambda message_id, error: self._texted(worksheet_name, company, phone, message_id, error, start),
+        )
+        return True
+
+    def _texted(self, worksheet_name, company, phone, message_id, error, start):
+        """
+        Record the outcome of a text message (called from the SMS sender's threads).
+        """
+        name = company.get('name', 'Unknown')
+        latency = time.perf_counter() - start
+        if error is None:
+            if self.ledger is not None:
+                self.ledger.record_sent(phone, worksheet_name, name)
+            metrics.increment('sms_sent')
+            metrics.event('sms_sent', recipient=phone, worksheet=worksheet_name, message_id=message_id,
+                          seconds=round(latency, 6))
+            self._record_status(worksheet_name, company, TEXTED, message_id)
+            texted = self.stats.record_texted()
+            print(f"📱 SMS {texted} sent successfully to {name} ({phone})")
+            return
+
+        if getattr(error, 'permanent', False):
+            # e.g. not a mobile number; never text it again
+            if self.ledger is not None:
+                self.ledger.record_bounce(phone, getattr(error, 'status', None), str(error))
+            metrics.increment('sms_bounced')
+            self.stats.record_bounced()
+            self._record_status(worksheet_name, company, BOUNCED)
+        else:
+            if self.ledger is not None:
+                self.ledger.release(phone)
+            metrics.increment('sms_failed')
+            self.stats.record_failed()
+            self._record_status(worksheet_name, company, FAILED)
+        metrics.event('sms_failed', recipient=phone, error=str(error))
+        print(f"❌ Failed to send SMS to {name} ({phone}): {str(error)}")
+
+    def _load_retries(self):
+        """
+        Queue the retries left over from earlier runs of this campaign.
+        """
+        if self.ledger is None:
+            return
+        now = time.time()
+        retries = self.ledger.pending_retries()
+        for recipient, payload, attempts, due_at in retries:
+            if not self.ledger.claim(recipient):
+                # Owned by another process sending this campaign
+                continue
+            self._retry_recipients.add(recipient)
+            self.stats.record_retry_queued()
+            self._queue.put_delayed(decode_job(payload), _domain(recipient), due_at - now)
+        if self._retry_recipients:
+            print(f"🔁 {len(self._retry_recipients)} emails from earlier runs are waiting to be retried")
+
+    def _deliver(self, job, sessions):
+        """
+        Send one message, failing over to the next relay when an account is
+        locked out or over quota.
+        :param sessions: The worker's open sessions, by relay name
+        :return: (relay, message_id) of the successful send
+        """
+        tried = []
+        while True:
+            relay = self.router.choose(exclude=tried)
+            session = sessions.get(relay.name)
+            try:
+                if session is None:
+                    session = sessions[relay.name] = relay.pool.acquire()
+                with metrics.timer('build_mime'):
+                    message_id, text = relay.builder.build(job.recipient, job.subject, job.body, job.html_body)
+                session.send(job.recipient, text)
+                return relay, message_id
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPResponseException) as e:
+                if not isinstance(e, smtplib.SMTPAuthenticationError) and not is_quota_error(e):
+                    raise
+                self.router.disable(relay, str(e))
+                session = sessions.pop(relay.name, None)
+                if session is not None:
+                    session.close()
+                    relay.pool.release(session)
+                tried.append(relay)
+
+    def _worker(self):
+        sessions = {}
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+
+                name = job.company.get('name', 'Unknown')
+                if job.attempts:
+                    if not self.stats.try_reserve():
+                        # Out of sends for this run; the retry stays queued in the ledger
+                        continue
+                    self.stats.record_retry_started()
+
+                if self.rate_limiter is not None:
+                    with metrics.timer('rate_limit_wait'):
+                        self.rate_limiter.acquire()
+
+                start = time.perf_counter()
+                try:
+                    relay, message_id = self._deliver(job, sessions)
+                except Exception as e:
+                    metrics.observe('deliver', time.perf_counter() - start)
+                    self._handle_failure(job, name, e)
+                    self._drop_dead_sessions(sessions)
+                    continue
+
+                if self.ledger is not None:
+                    self.ledger.record_sent(job.recipient, job.worksheet, name)
+                latency = time.perf_counter() - start
+                metrics.observe('deliver', latency)
+                metrics.increment('emails_sent')
+                metrics.event('email_sent', recipient=job.recipient, worksheet=job.worksheet, relay=relay.name,
+                              message_id=message_id, attempts=job.attempts + 1, seconds=round(latency, 6))
+                self.router.record_sent(relay)
+                self._record_status(job.worksheet, job.company, SENT, message_id)
+                sent = self.stats.record_sent()
+                print(f"✅ Email {sent} sent successfully to {name} ({job.recipient})")
+        finally:
+            for relay in self.router.relays:
+                session = sessions.pop(relay.name, None)
+                if session is not None:
+                    relay.pool.release(session)
+
+    def _handle_failure(self, job, name, error):
+        """
+        Retry temporary failures later, record permanent ones as hard bounces.
+        """
+        if isinstance(error, RelayUnavailable):
+            error = RelayUnavailable("every SMTP relay is disabled")
+        kind = classify_error(error)
+        attempts = job.attempts + 1
+
+        if kind == TRANSIENT and self.retry_policy.should_retry(attempts):
+            delay = self.retry_policy.delay(attempts)
+            job = job._replace(attempts=attempts)
+            if self.ledger is not None:
+                self.ledger.schedule_retry(job.recipient, encode_job(job), attempts, time.time() + delay, str(error))
+            self._queue.put_delayed(job, _domain(job.recipient), delay)
+            metrics.increment('emails_deferred')
+            metrics.event('email_deferred', recipient=job.recipient, attempts=attempts, delay=round(delay, 3),
+                          error=str(error))
+            self.stats.record_deferred()
+            self._record_status(job.worksheet, job.company, RETRYING)
+            print(f"⏳ Temporary failure sending to {name}, retrying in {delay:.0f}s: {str(error)}")
+            return
+
+        if kind == PERMANENT:
+            if self.ledger is not None:
+                self.ledger.record_bounce(job.recipient, smtp_error_code(error), str(error))
+            metrics.increment('emails_bounced')
+            metrics.event('email_bounced', recipient=job.recipient, code=smtp_error_code(error), error=str(error))
+            self.stats.record_bounced()
+            self._record_status(job.worksheet, job.company, BOUNCED)
+            print(f"📛 Email to {name} ({job.recipient}) bounced permanently: {str(error)}")
+            return
+
+        if self.ledger is not None:
+            self.ledger.clear_retry(job.recipient)
+        metrics.increment('emails_failed')
+        metrics.event('email_failed', recipient=job.recipient, attempts=attempts, error=str(error))
+        self.stats.record_failed()
+        self._record_status(job.worksheet, job.company, FAILED)
+        print(f"❌ Failed to send email to {name}: {str(error)}")
+
+    def _record_status(self, worksheet_name, company, status, message_id=''):
+        if self.status_writer is not None:
+            self.status_writer.record(worksheet_name, company, status, message_id)
+
+    def _drop_dead_sessions(self, sessions):
+        for relay in self.router.relays:
+            session = sessions.get(relay.name)
+            if session is not None and not session.is_alive():
+                session.close()
+                relay.pool.release(session)
+                del sessions[relay.name]
+
+
+def _domain(recipient):
+    return recipient.rpartition('@')[2].lower()
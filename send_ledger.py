@@ -0,0 +1,252 @@
+# send_ledger.py
+# Persistent record of who has been emailed in each campaign, so re-runs resume
+# where the last one stopped and nobody is emailed twice. Also holds the
+# messages waiting to be retried and the addresses that hard-bounced.
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+from utils import normalize_email
+
+# Claims left behind by a process that died are taken over after this many seconds
+CLAIM_TIMEOUT = 24 * 3600
+
+
+class SendLedger:
+    """
+    Append-only SQLite ledger of sent emails, keyed by campaign id and normalized recipient.
+
+    Every send is committed as soon as the SMTP server accepts it, so a run that
+    is killed part-way keeps everything it sent. Lookups are served from an
+    in-memory set loaded when the ledger is opened.
+
+    When several processes send the same campaign (see shards.py), give each an
+    `owner`: claims are then also written to the claims table, so a recipient
+    claimed or sent by one process is never claimed by another.
+    """
+
+    def __init__(self, path, campaign_id, owner=None, claim_timeout=CLAIM_TIMEOUT, read_only=False):
+        """
+        :param path: SQLite file holding the ledger
+        :param campaign_id: Identifier of the campaign being sent
+        :param owner: Name of this process (e.g. "shard-2/4") to share claims with other processes (optional)
+        :param claim_timeout: Seconds after which another owner's claim may be taken over
+        :param read_only: Only look recipients up (e.g. for a dry run); a missing file is not
+                          created and reads as an empty ledger
+        """
+        self.path = path
+        self.campaign_id = campaign_id
+        self.owner = owner
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        if read_only and os.path.exists(path):
+            self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True,
+                                        check_same_thread=False, timeout=30)
+        else:
+            # Other processes may hold the write lock for a moment
+            self.conn = sqlite3.connect(':memory:' if read_only else path, check_same_thread=False, timeout=30)
+            self._create_tables()
+        self._sent = {
+            row[0] for row in self.conn.execute(
+                "SELECT recipient FROM sends WHERE campaign_id = ?", (campaign_id,)
+            )
+        }
+        self._bounced = {row[0] for row in self.conn.execute("SELECT recipient FROM bounces")}
+        self._claimed = set()
+
+    def _create_tables(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sends (
+                    campaign_id TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    worksheet TEXT,
+                    company TEXT,
+                    sent_at REAL NOT NULL,
+                    PRIMARY KEY (campaign_id, recipient)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS retries (
+                    campaign_id TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    due_at REAL NOT NULL,
+                    last_error TEXT,
+                    PRIMARY KEY (campaign_id, recipient)
+                )
+            """)
+            # Hard bounces apply to every campaign
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS bounces (
+                    recipient TEXT PRIMARY KEY,
+                    code INTEGER,
+                    error TEXT,
+                    bounced_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS claims (
+                    campaign_id TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    claimed_at REAL NOT NULL,
+                    PRIMARY KEY (campaign_id, recipient)
+                )
+            """)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sent)
+
+    def has_sent(self, recipient):
+        with self._lock:
+            return normalize_email(recipient) in self._sent
+
+    def is_bounced(self, recipient):
+        """
+        Check whether mail to this address was permanently rejected before.
+        """
+        with self._lock:
+            return normalize_email(recipient) in self._bounced
+
+    def claim(self, recipient):
+        """
+        Reserve a recipient for this run.
+        :return: False if they were already emailed, are already queued in this run,
+                 or (with an owner) are claimed by another process
+        """
+        key = normalize_email(recipient)
+        with self._lock:
+            if key in self._sent or key in self._claimed:
+                return False
+            if self.owner is not None and not self._claim_shared(key):
+                return False
+            self._claimed.add(key)
+            return True
+
+    def _claim_shared(self, key):
+        """
+        Claim a recipient in the database unless it was sent, or is claimed by another live owner.
+        """
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO claims (campaign_id, recipient, owner, claimed_at) "
+                "SELECT ?, ?, ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM sends WHERE campaign_id = ? AND recipient = ?) "
+                "ON CONFLICT (campaign_id, recipient) DO UPDATE "
+                "SET owner = excluded.owner, claimed_at = excluded.claimed_at "
+                "WHERE claims.owner = excluded.owner OR claims.claimed_at < ?",
+                (self.campaign_id, key, self.owner, now, self.campaign_id, key, now - self.claim_timeout),
+            )
+        return cursor.rowcount == 1
+
+    def _release_shared(self, key):
+        # Caller holds the lock and an open transaction
+        if self.owner is not None:
+            self.conn.execute(
+                "DELETE FROM claims WHERE campaign_id = ? AND recipient = ? AND owner = ?",
+                (self.campaign_id, key, self.owner),
+            )
+
+    def release(self, recipient):
+        """
+        Give up a claim after a failed send so a later run can try again.
+        """
+        key = normalize_email(recipient)
+        with self._lock, self.conn:
+            self._release_shared(key)
+            self._claimed.discard(key)
+
+    def record_sent(self, recipient, worksheet=None, company=None):
+        """
+        Durably record a successful send.
+        """
+        key = normalize_email(recipient)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sends (campaign_id, recipient, worksheet, company, sent_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.campaign_id, key, worksheet, company, time.time()),
+            )
+            self.conn.execute(
+                "DELETE FROM retries WHERE campaign_id = ? AND recipient = ?",
+                (self.campaign_id, key),
+            )
+            self._sent.add(key)
+            self._claimed.discard(key)
+
+    def schedule_retry(self, recipient, payload, attempts, due_at, error=None):
+        """
+        Durably queue a message for another attempt. The recipient stays claimed.
+        :param payload: The message, serialized as a string
+        :param attempts: Attempts made so far
+        :param due_at: Unix time of the next attempt
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO retries (campaign_id, recipient, payload, attempts, due_at, last_error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.campaign_id, normalize_email(recipient), payload, attempts, due_at, error),
+            )
+
+    def pending_retries(self):
+        """
+        Messages of this campaign waiting to be retried, earliest first.
+        :return: List of (recipient, payload, attempts, due_at) tuples
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT recipient, payload, attempts, due_at FROM retries "
+                "WHERE campaign_id = ? ORDER BY due_at",
+                (self.campaign_id,),
+            ).fetchall()
+
+    def clear_retry(self, recipient):
+        """
+        Drop a queued retry (e.g. after giving up) and release the recipient.
+        """
+        key = normalize_email(recipient)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM retries WHERE campaign_id = ? AND recipient = ?",
+                (self.campaign_id, key),
+            )
+            self._release_shared(key)
+            self._claimed.discard(key)
+
+    def record_bounce(self, recipient, code=None, error=None):
+        """
+        Durably record a permanent rejection so the address is never emailed again.
+        """
+        key = normalize_email(recipient)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO bounces (recipient, code, error, bounced_at) VALUES (?, ?, ?, ?)",
+                (key, code, error, time.time()),
+            )
+            self.conn.execute(
+                "DELETE FROM retries WHERE campaign_id = ? AND recipient = ?",
+                (self.campaign_id, key),
+            )
+            self._bounced.add(key)
+            self._claimed.discard(key)
+
+    def contact_counts(self):
+        """
+        How many campaigns (this one included) have contacted each recipient.
+        :return: Dictionary of normalized recipient -> number of campaigns
+        """
+        with self._lock:
+            return dict(self.conn.execute("SELECT recipient, COUNT(*) FROM sends GROUP BY recipient"))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
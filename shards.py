@@ -0,0 +1,201 @@
+# shards.py
+# Split one campaign over several processes or machines. Every lead belongs to
+# exactly one shard, picked by a stable hash of its email address (or phone
+# number), so each shard can send from its own account. All shards share the
+# SQLite send ledger, which keeps cross-process claims (see SendLedger owner) so
+# nobody is emailed twice, and each shard writes a small JSON result that is
+# merged into one summary.
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from addresses import get_record_email
+from config import settings
+from phones import get_record_phone
+from utils import normalize_email
+
+# Summary lines, in order, for the counts a shard can report
+RESULT_LABELS = [
+    ('sent', "✅ Emails sent successfully"),
+    ('rendered', "✉️  Emails that would be sent"),
+    ('texted', "📱 Text messages sent"),
+    ('texts_rendered', "📱 Text messages that would be sent"),
+    ('skipped', "⏭️  Companies skipped"),
+    ('already_sent', "🔁 Already emailed (earlier run or duplicate listing)"),
+    ('bounced', "📛 Hard bounces (never emailed again)"),
+    ('suppressed', "📛 Suppressed hard bounces"),
+    ('retrying', "⏳ Waiting to be retried in a later run"),
+    ('undeliverable', "🚫 Undeliverable email domains"),
+]
+
+
+def parse_shard(value):
+    """
+    Parse a shard given as "I/N" (1-based), e.g. "2/4".
+    :return: (index, count) with a 0-based index
+    """
+    try:
+        number, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"shard must look like 2/4, not {value!r}")
+    if count < 1 or not 1 <= number <= count:
+        raise ValueError(f"shard {value!r} is out of range")
+    return number - 1, count
+
+
+def shard_label(index, count):
+    return f"{index + 1}/{count}"
+
+
+def shard_of(recipient, count):
+    """
+    The shard (0-based) a recipient belongs to. Stable across processes, machines
+    and Python versions, unlike hash().
+    """
+    digest = hashlib.blake2b(normalize_email(recipient).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def shard_leads(leads, index, count):
+    """
+    Keep only this shard's leads. Leads without an email address are split by their
+    phone number (they may be texted); leads with neither go to the first shard, so
+    each one is counted as skipped exactly once.
+    :param leads: Iterable of (worksheet_name, company_info) tuples, such as a LeadStream
+    """
+    for worksheet_name, company in leads:
+        recipient = get_record_email(company) or get_record_phone(company, settings.SMS_COUNTRY_CODE)
+        if (shard_of(recipient, count) if recipient else 0) == index:
+            yield worksheet_name, company
+
+
+def shard_path(path, index):
+    """
+    Per-shard variant of a file name: campaign_events.jsonl -> campaign_events.shard2.jsonl
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index + 1}{ext}"
+
+
+def load_accounts(path, count):
+    """
+    Read the sender account of every shard.
+    :param path: JSON list with one entry per shard: EMAIL_CONFIG overrides such as
+                 {"sender_email": ..., "sender_password": ...}, or {"relays": "relays_2.json"}
+    :param count: Number of shards
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        accounts = json.load(f)
+    if not isinstance(accounts, list) or not all(isinstance(account, dict) for account in accounts):
+        raise ValueError(f"{path} must contain a JSON list of objects")
+    if len(accounts) < count:
+        raise ValueError(f"{path} has {len(accounts)} accounts for {count} shards")
+    return accounts
+
+
+def write_result(path, shard, counts, account=None, elapsed=None, error=None):
+    """
+    Save one shard's outcome for merge_results.
+    """
+    result = {'shard': shard, 'account': account, 'counts': counts, 'elapsed': elapsed, 'error': error}
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_file, path)
+
+
+def read_results(paths):
+    results = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                results.append(json.load(f))
+        except (OSError, ValueError) as e:
+            results.append({'shard': path, 'counts': {}, 'error': f"no result: {e}"})
+    return results
+
+
+def merge_results(results):
+    """
+    Add up the counts of all shards.
+    :return: Dictionary of count name -> total
+    """
+    totals = {}
+    for result in results:
+        for name, value in result.get('counts', {}).items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def print_merged_summary(results):
+    """
+    Print one campaign summary for all shards, with a line per shard.
+    """
+    totals = merge_results(results)
+    print(f"\n{'='*50}")
+    print(f"CAMPAIGN SUMMARY ({len(results)} shards)")
+    print(f"{'='*50}")
+    for key, label in RESULT_LABELS:
+        if key in totals:
+            print(f"{label}: {totals[key]}")
+    print(f"📊 Total processed: {sum(totals.values())}")
+    for result in results:
+        counts = result.get('counts', {})
+        details = ', '.join(f"{counts[key]} {key.replace('_', ' ')}" for key, _ in RESULT_LABELS if key in counts)
+        account = f" ({result['account']})" if result.get('account') else ""
+        elapsed = f" in {result['elapsed']:.1f}s" if result.get('elapsed') is not None else ""
+        if result.get('error'):
+            print(f"   ❌ shard {result['shard']}{account}: {result['error']}")
+        else:
+            print(f"   shard {result['shard']}{account}: {details}{elapsed}")
+    return totals
+
+
+def run_shards(count, command, result_file, log_file):
+    """
+    Run every shard of a campaign as a child process on this machine and wait for them.
+    :param count: Number of shards
+    :param command: Command line of one shard, without --shard/--result-file
+    :param result_file: Result file name; each shard writes its own shard_path() variant
+    :param log_file: Log file name; each shard's output goes to its own shard_path() variant
+    :return: List of shard results
+    """
+    children = []
+    for index in range(count):
+        shard_result = shard_path(result_file, index)
+        if os.path.exists(shard_result):
+            os.remove(shard_result)
+        log = open(shard_path(log_file, index), 'w', encoding='utf-8')
+        process = subprocess.Popen(
+            command + ['--shard', shard_label(index, count), '--result-file', shard_result],
+            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+        )
+        children.append((index, process, shard_result, log))
+        print(f"🚀 Started shard {shard_label(index, count)} (pid {process.pid}), output in {log.name}")
+
+    start = time.monotonic()
+    try:
+        for index, process, shard_result, log in children:
+            process.wait()
+            log.close()
+            status = "finished" if process.returncode == 0 else f"exited with code {process.returncode}"
+            print(f"{'✅' if process.returncode == 0 else '❌'} Shard {shard_label(index, count)} {status} "
+                  f"after {time.monotonic() - start:.1f}s")
+    except KeyboardInterrupt:
+        # Children got the Ctrl+C too; let them flush their ledgers and status
+        for index, process, shard_result, log in children:
+            process.wait()
+            log.close()
+        raise
+    return read_results([shard_result for _, _, shard_result, _ in children])
+
+
+def shard_command(script, argv):
+    """
+    Command line that runs `script` with the same arguments in a new Python process.
+    """
+    return [sys.executable, os.path.abspath(script)] + list(argv)
@@ -1,6 +1,15 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import metrics
+from config import settings
+from lead_cache import LeadCache
+from lead_table import LeadTable
+
+# gspread and oauth2client take a few hundred milliseconds to import, so they are
+# only imported once the Google APIs are actually used (see get_client)
 
 # Define the scope for Google Sheets and Drive API
 SCOPE = [
@@ -8,9 +17,213 @@ SCOPE = [
     'https://www.googleapis.com/auth/drive',
 ]
 
-# Path to the service account key
-SERVICE_ACCOUNT_FILE = os.getenv('GOOGLE_SERVICE_ACCOUNT', 'service_account.json')
+# SERVICE_ACCOUNT_FILE, LEAD_CACHE_FILE, OFFLINE_MODE and SHEET_PAGE_SIZE come from
+# config.settings; they can still be read from this module
+_CONFIG_ATTRIBUTES = ('SERVICE_ACCOUNT_FILE', 'LEAD_CACHE_FILE', 'OFFLINE_MODE', 'SHEET_PAGE_SIZE')
+
+def __getattr__(name):
+    if name in _CONFIG_ATTRIBUTES:
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+DRIVE_FILES_URL = 'https://www.googleapis.com/drive/v3/files/{}'
+
+# Key added to every record with its row number in the worksheet (the header is row 1)
+ROW_KEY = '_row'
+
+# Sheets API errors worth retrying: read quota exhausted (429) and server errors.
+# Retries wait for the server's Retry-After, else back off exponentially
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # Seconds before the first retry
+MAX_BACKOFF = 64.0
+
+# One authorized client per process, and each spreadsheet opened once
+_credentials = None
+_client = None
+_spreadsheets = {}
+_worksheets = {}
+_lead_cache = None
+_cache_lock = threading.RLock()
+
+
+def retry_after_seconds(value):
+    """
+    Parse a Retry-After header (seconds or an HTTP date).
+    :return: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None, backoff_base=BACKOFF_BASE, max_backoff=MAX_BACKOFF):
+    """
+    Seconds to wait before retry number `attempt` (0 for the first): the server's
+    Retry-After if it sent one, else exponential backoff with jitter.
+    """
+    delay = retry_after_seconds(retry_after)
+    if delay is None:
+        delay = min(max_backoff, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+    return delay
+
+def call_with_backoff(request, max_retries=MAX_RETRIES):
+    """
+    Make a Sheets API call, retrying it on 429 and 5xx errors.
+    :param request: Callable making the call (e.g. a gspread method)
+    :return: What the call returns
+    :raises: The call's error if it is not retryable or retries ran out
+    """
+    attempt = 0
+    while True:
+        try:
+            return request()
+        except Exception as e:
+            # gspread's APIError (and requests' HTTPError) carry the HTTP response
+            response = getattr(e, 'response', None)
+            status = getattr(response, 'status_code', None)
+            if status not in RETRY_STATUS_CODES or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, response.headers.get('Retry-After'))
+            attempt += 1
+            metrics.increment('sheets_retries')
+            print(f"⏳ Sheets API error {status}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def get_client():
+    """
+    Get the authorized gspread client, authorizing on first use.
+    An expired access token is refreshed in place instead of re-reading the keyfile.
+    :return: gspread client
+    """
+    global _credentials, _client
+    with _cache_lock:
+        if _client is None:
+            with metrics.timer('sheets_auth'):
+                import gspread
+                from oauth2client.service_account import ServiceAccountCredentials
+                _credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                    settings.SERVICE_ACCOUNT_FILE, SCOPE
+                )
+                _client = gspread.authorize(_credentials)
+        elif getattr(_credentials, 'access_token_expired', False) and hasattr(_client, 'login'):
+            # Older gspread clients don't refresh on their own
+            with metrics.timer('sheets_auth'):
+                _client.login()
+        return _client
+
+def use_client(client):
+    """
+    Use an already authorized client instead of logging in with the service
+    account (e.g. the fake client from fake_services.py in benchmarks).
+    """
+    global _credentials, _client
+    with _cache_lock:
+        _spreadsheets.clear()
+        _worksheets.clear()
+        _credentials = None
+        _client = client
+
+def get_spreadsheet(sheet_name):
+    """
+    Open a Google Sheet, reusing the already opened spreadsheet when possible.
+    :param sheet_name: The name or URL of the Google Sheet
+    :return: gspread Spreadsheet
+    """
+    with _cache_lock:
+        client = get_client()
+        sheet = _spreadsheets.get(sheet_name)
+        if sheet is None:
+            with metrics.timer('sheet_open'):
+                if sheet_name.startswith('http'):
+                    sheet = client.open_by_url(sheet_name)
+                else:
+                    sheet = client.open(sheet_name)
+            _spreadsheets[sheet_name] = sheet
+        return sheet
+
+def invalidate_cache(sheet_name=None):
+    """
+    Forget cached spreadsheets so they are re-opened on next use.
+    :param sheet_name: Only forget this sheet (default: forget everything, including the client)
+    """
+    global _credentials, _client
+    with _cache_lock:
+        if sheet_name is None:
+            _spreadsheets.clear()
+            _worksheets.clear()
+            _credentials = None
+            _client = None
+        else:
+            _spreadsheets.pop(sheet_name, None)
+            _worksheets.pop(sheet_name, None)
+
+def get_worksheets(sheet_name):
+    """
+    Get the worksheets of a Google Sheet, fetching the spreadsheet metadata only once.
+    :param sheet_name: The name or URL of the Google Sheet
+    :return: Dictionary of worksheet title -> gspread Worksheet
+    """
+    with _cache_lock:
+        worksheets = _worksheets.get(sheet_name)
+        if worksheets is None:
+            sheet = get_spreadsheet(sheet_name)
+            worksheets = {worksheet.title: worksheet for worksheet in call_with_backoff(sheet.worksheets)}
+            _worksheets[sheet_name] = worksheets
+        return worksheets
+
+def get_lead_cache():
+    """
+    Get the local lead cache, opening it on first use.
+    :return: LeadCache, or None if caching is disabled
+    """
+    global _lead_cache
+    with _cache_lock:
+        if _lead_cache is None and settings.LEAD_CACHE_FILE:
+            _lead_cache = LeadCache(settings.LEAD_CACHE_FILE)
+        return _lead_cache
 
+def set_offline_mode(offline=True):
+    """
+    Switch between reading from Google Sheets and reading only from the local lead cache.
+    """
+    settings.OFFLINE_MODE = offline
+
+def get_spreadsheet_version(sheet_name):
+    """
+    Get the Drive modifiedTime of a Google Sheet, used to tell whether cached values are stale.
+    :param sheet_name: The name or URL of the Google Sheet
+    :return: Modified time string, or None if Drive metadata is unavailable
+    """
+    sheet = get_spreadsheet(sheet_name)
+    client = get_client()
+    # gspread 6 moved request() onto client.http_client
+    http = getattr(client, 'http_client', client)
+    try:
+        response = http.request(
+            'get',
+            DRIVE_FILES_URL.format(sheet.id),
+            params={'fields': 'modifiedTime', 'supportsAllDrives': True},
+        )
+        return response.json().get('modifiedTime')
+    except Exception as e:
+        print(f"⚠️  Could not read modified time of '{sheet_name}': {str(e)}")
+        return None
+
+def carry_over_version(sheet_name, old_version, new_version):
+    """
+    Keep the worksheets cached at old_version after a write that changed no lead
+    data (e.g. the status columns), so the next read is still served from the cache.
+    """
+    cache = get_lead_cache()
+    if cache is not None:
+        cache.replace_version(sheet_name, old_version, new_version)
 
 def get_company_data(sheet_name, worksheet_name):
     """
@@ -19,33 +232,186 @@ def get_company_data(sheet_name, worksheet_name):
     :param worksheet_name: The name of the worksheet/tab
     :return: List of dictionaries, one per row
     """
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        SERVICE_ACCOUNT_FILE, SCOPE
-    )
-    client = gspread.authorize(creds)
-    if sheet_name.startswith('http'):
-        sheet = client.open_by_url(sheet_name)
-    else:
-        sheet = client.open(sheet_name)
-    records = sheet.worksheet(worksheet_name).get_all_records()
+    records = get_company_data_batch(sheet_name, [worksheet_name])[worksheet_name]
     return records
 
+def records_from_rows(header, rows, first_row=2):
+    """
+    Yield one record per row, keyed by the header, like get_all_records.
+    Each record also gets its worksheet row number under ROW_KEY.
+    Records are compact Lead rows sharing one LeadTable (see lead_table.py).
+    :param header: Header row
+    :param rows: Iterable of data rows
+    :param first_row: Worksheet row number of the first data row
+    """
+    return records_from_numbered_rows(header, enumerate(rows, first_row))
+
+def records_from_numbered_rows(header, numbered_rows):
+    """
+    Like records_from_rows, for rows that aren't consecutive.
+    :param numbered_rows: Iterable of (row_number, row) tuples
+    """
+    width = len(header)
+    table = LeadTable(list(header) + [ROW_KEY])
+    lead = table.lead
+    from gspread.utils import numericise_all
+    for row_number, row in numbered_rows:
+        row = numericise_all(row[:width])
+        if len(row) < width:
+            row.extend([''] * (width - len(row)))
+        row.append(row_number)
+        yield lead(row)
+
+def records_from_values(values):
+    """
+    Turn a raw values range (header row first) into the same records get_all_records returns.
+    :param values: List of rows, each a list of cell values
+    :return: List of dictionary-like records, one per row
+    """
+    if not values:
+        return []
+    return list(records_from_rows(values[0], values[1:]))
+
+def get_header(sheet_name, worksheet_name):
+    """
+    Get the header row of a worksheet.
+    :return: List of column names
+    """
+    sheet = get_spreadsheet(sheet_name)
+    values = call_with_backoff(lambda: sheet.values_get(f"{worksheet_range(worksheet_name)}!1:1")).get('values', [])
+    return values[0] if values else []
+
+def worksheet_range(worksheet_name):
+    """
+    A1 range covering a whole worksheet, quoted for names like "A/C".
+    """
+    return "'{}'".format(worksheet_name.replace("'", "''"))
+
+def get_company_data_batch(sheet_name, worksheet_names):
+    """
+    Fetch company data from several worksheets with a single Sheets API request.
+    :param sheet_name: The name or URL of the Google Sheet
+    :param worksheet_names: List of worksheet/tab names
+    :return: Dictionary of worksheet name -> list of dictionaries, one per row
+    """
+    if not worksheet_names:
+        return {}
+    cache = get_lead_cache()
+
+    if settings.OFFLINE_MODE:
+        if cache is None:
+            raise RuntimeError("Offline mode needs the lead cache (LEAD_CACHE_FILE)")
+        all_data = {}
+        for worksheet_name in worksheet_names:
+            if not cache.has_worksheet(sheet_name, worksheet_name):
+                print(f"⚠️  Worksheet '{worksheet_name}' is not in the local cache")
+            all_data[worksheet_name] = records_from_values(cache.get_values(sheet_name, worksheet_name))
+        return all_data
+
+    version = get_spreadsheet_version(sheet_name) if cache is not None else None
+    values_by_name = {}
+    to_fetch = []
+    for worksheet_name in worksheet_names:
+        if version is not None and cache.has_worksheet(sheet_name, worksheet_name, version):
+            values_by_name[worksheet_name] = cache.get_values(sheet_name, worksheet_name)
+        else:
+            to_fetch.append(worksheet_name)
+
+    if values_by_name:
+        print(f"📦 Sheet unchanged since last fetch, using cached copy of: {', '.join(values_by_name)}")
+
+    if to_fetch:
+        sheet = get_spreadsheet(sheet_name)
+        with metrics.timer('sheet_fetch'):
+            response = call_with_backoff(lambda: sheet.values_batch_get([worksheet_range(name) for name in to_fetch]))
+        value_ranges = response.get('valueRanges', [])
+        for worksheet_name, value_range in zip(to_fetch, value_ranges):
+            values = value_range.get('values', [])
+            values_by_name[worksheet_name] = values
+            if cache is not None:
+                cache.store_values(sheet_name, worksheet_name, values, version)
+
+    all_data = {}
+    for worksheet_name in worksheet_names:
+        all_data[worksheet_name] = records_from_values(values_by_name.get(worksheet_name, []))
+    return all_data
+
+_UNSET = object()
+
+def iter_company_data(sheet_name, worksheet_name, version=_UNSET, page_size=None):
+    """
+    Stream company data from a worksheet, one page of rows per request, without
+    holding the whole worksheet in memory. Pages are written to the lead cache as
+    they arrive, and an unchanged worksheet is streamed from the cache instead.
+    :param sheet_name: The name or URL of the Google Sheet
+    :param worksheet_name: The name of the worksheet/tab
+    :param version: Spreadsheet version from get_spreadsheet_version (looked up if not given)
+    :param page_size: Rows per request (default SHEET_PAGE_SIZE)
+    :return: Generator of dictionaries, one per row
+    """
+    cache = get_lead_cache()
+    if settings.OFFLINE_MODE:
+        if cache is None:
+            raise RuntimeError("Offline mode needs the lead cache (LEAD_CACHE_FILE)")
+        from_cache = True
+    elif cache is not None:
+        if version is _UNSET:
+            version = get_spreadsheet_version(sheet_name)
+        from_cache = version is not None and cache.has_worksheet(sheet_name, worksheet_name, version)
+    else:
+        version = None
+        from_cache = False
+
+    if from_cache:
+        rows = cache.iter_values(sheet_name, worksheet_name)
+        _, header = next(rows, (None, None))
+        if header is not None:
+            yield from records_from_numbered_rows(header, ((row_index + 1, row) for row_index, row in rows))
+        return
+
+    page_size = page_size or settings.SHEET_PAGE_SIZE
+    sheet = get_spreadsheet(sheet_name)
+    row_count = get_worksheets(sheet_name)[worksheet_name].row_count
+    if cache is not None:
+        cache.start_worksheet(sheet_name, worksheet_name)
+
+    header = None
+    start = 1
+    while start <= row_count:
+        end = start + page_size - 1
+        with metrics.timer('sheet_fetch'):
+            page = f"{worksheet_range(worksheet_name)}!{start}:{end}"
+            response = call_with_backoff(lambda: sheet.values_get(page))
+        values = response.get('values', [])
+        metrics.increment('sheet_rows_fetched', len(values))
+        metrics.event('sheet_page', worksheet=worksheet_name, first_row=start, rows=len(values))
+        if cache is not None:
+            cache.append_values(sheet_name, worksheet_name, start - 1, values)
+        first_row = start
+        if header is None:
+            if not values:
+                break
+            header, values = values[0], values[1:]
+            first_row += 1
+        yield from records_from_rows(header, values, first_row)
+        start = end + 1
+
+    if cache is not None:
+        cache.finish_worksheet(sheet_name, worksheet_name, version)
+
 def get_available_worksheets(sheet_name):
     """
     Get all available worksheet names from a Google Sheet.
     :param sheet_name: The name or URL of the Google Sheet
     :return: List of worksheet names
     """
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        SERVICE_ACCOUNT_FILE, SCOPE
-    )
-    client = gspread.authorize(creds)
-    if sheet_name.startswith('http'):
-        sheet = client.open_by_url(sheet_name)
-    else:
-        sheet = client.open(sheet_name)
-    
-    worksheet_names = [worksheet.title for worksheet in sheet.worksheets()]
+    cache = get_lead_cache()
+    if settings.OFFLINE_MODE:
+        return (cache.get_worksheet_titles(sheet_name) if cache is not None else None) or []
+
+    worksheet_names = list(get_worksheets(sheet_name))
+    if cache is not None:
+        cache.store_worksheet_titles(sheet_name, worksheet_names)
     return worksheet_names
 
 def validate_worksheets(sheet_name, target_worksheets):
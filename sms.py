@@ -0,0 +1,190 @@
+# sms.py
+# Text message channel for leads that have a phone number but no email address.
+# Providers share one small interface (send one message, return its id); the
+# HTTP provider keeps its connections alive in a pooled requests.Session, and
+# SMSSender sends through it from a bounded pool of threads under the provider's
+# rate limits.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# HTTP statuses worth retrying: rate limited, or a server-side problem
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class SMSError(Exception):
+    """
+    A message the provider did not accept.
+    `permanent` is set when retrying can't help (e.g. an invalid or unreachable number).
+    """
+
+    def __init__(self, message, status=None, permanent=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.permanent = permanent
+        self.retry_after = retry_after
+
+
+class SMSProvider:
+    """
+    Interface of an SMS provider.
+    """
+
+    name = 'sms'
+
+    def send(self, to, body):
+        """
+        Send one text message.
+        :param to: Recipient phone number in E.164 format
+        :param body: Message text
+        :return: The provider's message id
+        :raises SMSError: If the message was not accepted
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HTTPSMSProvider(SMSProvider):
+    """
+    Provider with a JSON HTTP API: POST {"from", "to", "body"} to `url` with a bearer
+    token, answered with {"id": ...}. Connections are kept alive and reused.
+    """
+
+    name = 'http'
+
+    def __init__(self, url, token=None, sender=None, timeout=10, pool_size=8):
+        """
+        :param url: Messages endpoint of the provider
+        :param token: API token sent as "Authorization: Bearer <token>" (optional)
+        :param sender: Phone number or sender id messages come from
+        :param timeout: Seconds to wait for the provider
+        :param pool_size: Keep-alive connections kept open (match the sender's concurrency)
+        """
+        # Imported here so the email-only path never pays for requests
+        import requests
+
+        self.url = url
+        self.sender = sender
+        self.timeout = timeout
+        self._requests = requests
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        if token:
+            self._session.headers['Authorization'] = f"Bearer {token}"
+
+    def send(self, to, body):
+        payload = {'to': to, 'body': body}
+        if self.sender:
+            payload['from'] = self.sender
+        try:
+            response = self._session.post(self.url, json=payload, timeout=self.timeout)
+        except self._requests.RequestException as e:
+            raise SMSError(f"SMS provider unreachable: {e}")
+        if response.status_code >= 400:
+            retry_after = response.headers.get('Retry-After')
+            raise SMSError(
+                f"SMS provider answered {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                permanent=response.status_code not in RETRY_STATUS_CODES,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        return str(data.get('id') or data.get('sid') or '')
+
+    def close(self):
+        self._session.close()
+
+
+class SMSSender:
+    """
+    Send text messages concurrently through one provider.
+
+    submit() blocks once `max_concurrency` messages are in flight, so a fast
+    producer can't queue up the whole sheet. Temporary failures are retried a few
+    times with backoff (honouring Retry-After) before the message is given up on.
+    """
+
+    def __init__(self, provider, max_concurrency=8, rate_limiter=None, max_attempts=3, backoff=1.0):
+        """
+        :param provider: SMSProvider messages are sent through
+        :param max_concurrency: Messages in flight at once
+        :param rate_limiter: RateLimiter for the provider's quota (optional)
+        :param max_attempts: Attempts per message for temporary failures
+        :param backoff: Seconds before the first retry, doubled for each further one
+        """
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = rate_limiter
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="sms")
+
+    def send(self, to, body):
+        """
+        Send one message now, retrying temporary failures.
+        :return: The provider's message id
+        :raises SMSError: If the message could not be sent
+        """
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                with metrics.timer('sms_rate_wait'):
+                    self.rate_limiter.acquire()
+            try:
+                with metrics.timer('sms_send'):
+                    return self.provider.send(to, body)
+            except SMSError as e:
+                if e.permanent or attempt >= self.max_attempts:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else self.backoff * 2 ** (attempt - 1)
+                metrics.increment('sms_retries')
+                time.sleep(delay)
+                attempt += 1
+
+    def submit(self, to, body, callback):
+        """
+        Send a message in the background.
+        :param callback: Called from the sending thread as callback(message_id, error);
+                         error is None on success
+        """
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._run, to, body, callback)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _run(self, to, body, callback):
+        try:
+            try:
+                message_id = self.send(to, body)
+            except Exception as e:
+                callback(None, e)
+            else:
+                callback(message_id, None)
+        finally:
+            self._slots.release()
+
+    def drain(self):
+        """
+        Wait until every submitted message has been sent or given up on.
+        """
+        for _ in range(self.max_concurrency):
+            self._slots.acquire()
+        for _ in range(self.max_concurrency):
+            self._slots.release()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.provider.close()
@@ -0,0 +1,204 @@
+# smtp_pool.py
+# Reusable, authenticated SMTP sessions so a campaign logs in a handful of times
+# instead of once per email.
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+
+class SMTPSession:
+    """
+    A single authenticated SMTP connection that reconnects on demand.
+
+    The session is recycled (logged out and back in) after max_messages sends,
+    and transparently reconnects once if the server dropped the connection.
+    """
+
+    def __init__(self, config, max_messages=50, timeout=30):
+        self.config = config
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.server = None
+        self.messages_sent = 0
+        self.last_used = 0.0
+        self.logins = 0
+
+    def connect(self):
+        """
+        Open the connection, run STARTTLS if configured and log in.
+        """
+        self.close()
+        with metrics.timer('smtp_connect'):
+            server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=self.timeout)
+        try:
+            if self.config['use_tls']:
+                with metrics.timer('smtp_starttls'):
+                    server.starttls()
+            with metrics.timer('smtp_login'):
+                server.login(self.config['sender_email'], self.config['sender_password'])
+        except Exception:
+            server.close()
+            raise
+        metrics.increment('smtp_logins')
+        metrics.event('smtp_login', server=self.config['smtp_server'], account=self.config['sender_email'])
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.logins += 1
+
+    def is_alive(self):
+        """
+        Health check the connection with a NOOP.
+        """
+        if self.server is None:
+            return False
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @property
+    def exhausted(self):
+        return self.messages_sent >= self.max_messages
+
+    def send(self, recipient, text):
+        """
+        Send an already formatted message, reconnecting once if the server hung up.
+        :param recipient: Recipient email address
+        :param text: Full message text (headers and body)
+        """
+        if self.server is None or self.exhausted:
+            self.connect()
+        try:
+            with metrics.timer('smtp_send'):
+                self.server.sendmail(self.config['sender_email'], recipient, text)
+        except smtplib.SMTPServerDisconnected:
+            metrics.increment('smtp_reconnects')
+            self.connect()
+            with metrics.timer('smtp_send'):
+                self.server.sendmail(self.config['sender_email'], recipient, text)
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of SMTPSession objects for one SMTP account.
+    """
+
+    def __init__(self, config, max_size=2, max_messages_per_session=50, health_check_after=10):
+        """
+        :param config: Email configuration dict (see messaging.EMAIL_CONFIG)
+        :param max_size: Maximum number of sessions open at the same time
+        :param max_messages_per_session: Recycle a session after this many sends
+        :param health_check_after: NOOP a session that has been idle this many seconds
+        """
+        self.config = dict(config)
+        self.max_size = max_size
+        self.max_messages_per_session = max_messages_per_session
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._sessions = []
+        self._retired_logins = 0
+        self._checked_out = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    @property
+    def logins(self):
+        """
+        Total number of SMTP logins performed by this pool.
+        """
+        with self._lock:
+            return self._retired_logins + sum(session.logins for session in self._sessions)
+
+    def ensure_capacity(self, size):
+        """
+        Grow the pool so at least `size` sessions can be checked out at once.
+        """
+        with self._available:
+            if size > self.max_size:
+                self.max_size = size
+                self._available.notify_all()
+
+    def acquire(self):
+        """
+        Take a healthy, logged-in session from the pool, opening one if needed.
+        Blocks while max_size sessions are already checked out.
+        """
+        with self._available:
+            while self._checked_out >= self.max_size:
+                self._available.wait()
+            self._checked_out += 1
+            session = self._idle.pop() if self._idle else None
+        new = session is None
+        if new:
+            session = SMTPSession(self.config, self.max_messages_per_session)
+        try:
+            if new:
+                session.connect()
+                with self._lock:
+                    self._sessions.append(session)
+                return session
+            idle_for = time.monotonic() - session.last_used
+            if session.exhausted or (idle_for > self.health_check_after and not session.is_alive()):
+                session.connect()
+            return session
+        except Exception:
+            # The session couldn't (re)connect, so it has no server and release() drops it
+            self.release(session)
+            raise
+
+    def release(self, session):
+        """
+        Return a session to the pool. Broken sessions are dropped, and so is
+        every session released after close(), which logs it out.
+        """
+        with self._available:
+            closing = self._closed
+            if session.server is not None and not closing:
+                self._idle.append(session)
+            elif session in self._sessions:
+                self._sessions.remove(session)
+                self._retired_logins += session.logins
+            self._checked_out -= 1
+            self._available.notify()
+        if closing:
+            session.close()
+
+    @contextmanager
+    def session(self):
+        session = self.acquire()
+        try:
+            yield session
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Don't hand a half-dead connection to the next caller
+            session.close()
+            raise
+        finally:
+            self.release(session)
+
+    def close(self):
+        """
+        Log out of every idle session. Sessions still checked out are logged
+        out when they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
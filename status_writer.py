@@ -0,0 +1,196 @@
+# status_writer.py
+# Write each lead's campaign outcome back to the sheet, so operators can see
+# who was contacted. Updates are collected in memory and sent in a few batched
+# API calls (every N rows or T seconds) to stay well inside the Sheets write quota.
+
+import threading
+import time
+
+import metrics
+import sheets
+from dedup import DUPLICATES_KEY
+
+# Columns added to (or reused in) each worksheet
+STATUS_COLUMNS = ['Status', 'Contacted At', 'Message ID']
+
+# Outcomes written to the Status column
+SENT = 'sent'
+TEXTED = 'texted'
+SKIPPED = 'skipped'
+BOUNCED = 'bounced'
+RETRYING = 'retrying'
+FAILED = 'failed'
+UNDELIVERABLE = 'undeliverable'
+DUPLICATE = 'duplicate'  # Listing merged into another row of the same business (see dedup.py)
+
+# Outcome of a lead whose recipient was already contacted in this campaign. It is
+# not written: the row that was contacted keeps the status of that send
+ALREADY_SENT = 'already_sent'
+
+
+class StatusWriter:
+    """
+    Buffered, batched write-back of per-row send status.
+
+    record() only stores the update; a background thread flushes all pending
+    updates in one values_batch_update call once `flush_rows` rows are waiting
+    or `flush_interval` seconds have passed. Neighbouring rows go out as a single
+    range. Call close() (e.g. in a finally block) for the final flush.
+
+    Every write changes the spreadsheet's modified time, which the lead cache
+    uses as its version. The status columns aren't lead data, so after a flush
+    the cached worksheets are carried over to the new version.
+    """
+
+    def __init__(self, sheet_name, flush_rows=100, flush_interval=30, columns=None, on_version_change=None):
+        """
+        :param sheet_name: The name or URL of the Google Sheet
+        :param flush_rows: Flush once this many rows are waiting
+        :param flush_interval: Flush at least this often (seconds) while rows are waiting
+        :param columns: Status, timestamp and message id column titles (default STATUS_COLUMNS)
+        :param on_version_change: Called with (old_version, new_version) after a flush changed
+                                  the spreadsheet version (optional)
+        """
+        self.sheet_name = sheet_name
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.columns = list(columns or STATUS_COLUMNS)
+        self.on_version_change = on_version_change
+        self.rows_written = 0
+        self.api_calls = 0
+        self._pending = {}  # (worksheet, row) -> cell values
+        self._first_column = {}  # worksheet -> column number of the Status column
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, worksheet_name, company, status, message_id=''):
+        """
+        Queue the outcome of one lead, and DUPLICATE for the listings merged into it.
+        Leads without a row number, and ALREADY_SENT, are ignored.
+        """
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        updates = [
+            (duplicate_worksheet, duplicate.get(sheets.ROW_KEY), [DUPLICATE, now, ''])
+            for duplicate_worksheet, duplicate in company.get(DUPLICATES_KEY, ())
+        ]
+        if status != ALREADY_SENT:
+            updates.append((worksheet_name, company.get(sheets.ROW_KEY), [status, now, message_id or '']))
+        with self._lock:
+            for update_worksheet, row, values in updates:
+                if row is not None:
+                    self._pending[(update_worksheet, row)] = values
+            if len(self._pending) >= self.flush_rows:
+                self._wake.set()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _status_column(self, worksheet_name, updates, new_columns):
+        """
+        Column number of the Status column, adding the status columns after the
+        last header column if the worksheet doesn't have them yet.
+        """
+        column = self._first_column.get(worksheet_name)
+        if column is None:
+            header = sheets.get_header(self.sheet_name, worksheet_name)
+            titles = [str(title).strip().lower() for title in header]
+            if self.columns[0].lower() in titles:
+                column = titles.index(self.columns[0].lower()) + 1
+            else:
+                column = len(header) + 1
+                # Writes beyond the last column of the grid are rejected
+                worksheet = sheets.get_worksheets(self.sheet_name)[worksheet_name]
+                needed = column + len(self.columns) - 1
+                if worksheet.col_count < needed:
+                    worksheet.add_cols(needed - worksheet.col_count)
+            # (Re)write the titles with the first batch so the columns are labelled
+            updates.append({
+                'range': self._a1_range(worksheet_name, 1, 1, column),
+                'values': [self.columns],
+            })
+            new_columns[worksheet_name] = column
+        return column
+
+    def _a1_range(self, worksheet_name, first_row, last_row, column):
+        from gspread.utils import rowcol_to_a1
+        start = rowcol_to_a1(first_row, column)
+        end = rowcol_to_a1(last_row, column + len(self.columns) - 1)
+        return f"{sheets.worksheet_range(worksheet_name)}!{start}:{end}"
+
+    def flush(self):
+        """
+        Send all pending updates in one API call. On failure they stay pending for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            updates = []
+            new_columns = {}
+            by_worksheet = {}
+            for (worksheet_name, row), values in pending.items():
+                by_worksheet.setdefault(worksheet_name, {})[row] = values
+            try:
+                for worksheet_name, rows in by_worksheet.items():
+                    column = self._status_column(worksheet_name, updates, new_columns)
+                    # Consecutive rows share one range
+                    ordered = sorted(rows)
+                    run_start = 0
+                    for i in range(1, len(ordered) + 1):
+                        if i == len(ordered) or ordered[i] != ordered[i - 1] + 1:
+                            run = ordered[run_start:i]
+                            updates.append({
+                                'range': self._a1_range(worksheet_name, run[0], run[-1], column),
+                                'values': [rows[row] for row in run],
+                            })
+                            run_start = i
+                # Read before writing, so edits made by others since the leads were read aren't carried over
+                version = self._version()
+                with metrics.timer('status_flush'):
+                    sheets.get_spreadsheet(self.sheet_name).values_batch_update(
+                        {'valueInputOption': 'RAW', 'data': updates}
+                    )
+            except Exception as e:
+                print(f"⚠️  Could not write status to the sheet, will retry: {str(e)}")
+                with self._lock:
+                    # Newer statuses recorded meanwhile win
+                    for key, values in pending.items():
+                        self._pending.setdefault(key, values)
+                return
+            self._first_column.update(new_columns)
+            metrics.increment('status_rows_written', len(pending))
+            self.api_calls += 1
+            self.rows_written += len(pending)
+            if version is not None:
+                self._carry_over_version(version)
+
+    def _version(self):
+        if sheets.get_lead_cache() is None and self.on_version_change is None:
+            return None
+        return sheets.get_spreadsheet_version(self.sheet_name)
+
+    def _carry_over_version(self, old_version):
+        new_version = sheets.get_spreadsheet_version(self.sheet_name)
+        if new_version is None or new_version == old_version:
+            return
+        sheets.carry_over_version(self.sheet_name, old_version, new_version)
+        if self.on_version_change is not None:
+            self.on_version_change(old_version, new_version)
+
+    def close(self):
+        """
+        Stop the background thread and write everything still pending.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
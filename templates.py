@@ -0,0 +1,238 @@
+# templates.py
+# Email templates loaded once from the templates/ folder, compiled, and rendered
+# per lead from the sheet columns.
+#
+# Placeholders are sheet column names in braces, with an optional fallback used
+# when the cell is empty: "Dear {name|Your Business},". Use {{ and }} for literal braces.
+#
+# Files, per worksheet (name lowercased, other characters replaced by "-", so "A/C" is "a-c"):
+#   <worksheet>.subject.txt   subject line
+#   <worksheet>.txt           plain text body
+#   <worksheet>.html          HTML body (optional)
+#   <worksheet>.sms.txt       text message for leads with a phone number but no email (optional)
+# Anything missing falls back to the default.* files.
+
+import base64
+import html
+import itertools
+import os
+import re
+import time
+import uuid
+from email.utils import formataddr, formatdate
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+_FIELD_PATTERN = re.compile(r'\{\{|\}\}|\{([^{}|]+)(?:\|([^{}]*))?\}')
+
+
+def compile_template(source, escape=None):
+    """
+    Compile template text into a list of (literal, field, default) parts.
+    :param source: Template text
+    :param escape: Function applied to field values when rendering (e.g. html.escape)
+    :return: CompiledTemplate
+    """
+    parts = []
+    literal = []
+    position = 0
+    for match in _FIELD_PATTERN.finditer(source):
+        literal.append(source[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        if token in ('{{', '}}'):
+            literal.append(token[0])
+            continue
+        parts.append((''.join(literal), match.group(1).strip(), match.group(2) or ''))
+        literal = []
+    literal.append(source[position:])
+    parts.append((''.join(literal), None, ''))
+    return CompiledTemplate(parts, escape)
+
+
+class CompiledTemplate:
+    """
+    A template split into literal text and sheet-column fields.
+    """
+
+    def __init__(self, parts, escape=None):
+        self.parts = parts
+        self.escape = escape
+        self.fields = [field for _, field, _ in parts if field]
+
+    def render(self, record):
+        out = []
+        append = out.append
+        escape = self.escape
+        for literal, field, default in self.parts:
+            append(literal)
+            if field is None:
+                continue
+            value = record.get(field)
+            if value is None or value == '':
+                append(default)
+            elif escape is not None:
+                append(escape(str(value)))
+            else:
+                append(str(value))
+        return ''.join(out)
+
+
+class EmailTemplate:
+    """
+    Compiled subject, plain text body and optional HTML body and text message.
+    """
+
+    def __init__(self, subject, text, html_body=None, sms=None):
+        self.subject = compile_template(subject.strip())
+        self.text = compile_template(text)
+        self.html = compile_template(html_body, escape=html.escape) if html_body else None
+        self.sms = compile_template(sms.strip()) if sms else None
+
+    def render(self, record):
+        """
+        :param record: Company info from the sheet
+        :return: Tuple of (subject, text, html or None)
+        """
+        html_body = self.html.render(record) if self.html is not None else None
+        return self.subject.render(record), self.text.render(record), html_body
+
+    def render_sms(self, record):
+        """
+        :param record: Company info from the sheet
+        :return: Text message, or None if there is no SMS template
+        """
+        return self.sms.render(record) if self.sms is not None else None
+
+
+def template_name(worksheet_name):
+    """
+    File name prefix used for a worksheet's templates, e.g. "A/C" -> "a-c".
+    """
+    return re.sub(r'[^a-z0-9]+', '-', worksheet_name.lower()).strip('-')
+
+
+class TemplateSet:
+    """
+    All templates in a folder, compiled once and looked up by worksheet name.
+    """
+
+    def __init__(self, directory=TEMPLATE_DIR):
+        self.directory = directory
+        self._sources = {}
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            # Skip subdirectories (e.g. drafts/) and anything else that isn't a template file
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                self._sources[filename] = f.read()
+        if 'default.subject.txt' not in self._sources or 'default.txt' not in self._sources:
+            raise FileNotFoundError(f"{directory} needs default.subject.txt and default.txt")
+        self.default = self._compile('default')
+        self._by_worksheet = {}
+
+    def _source(self, name, suffix):
+        return self._sources.get(name + suffix, self._sources.get('default' + suffix))
+
+    def _compile(self, name):
+        return EmailTemplate(
+            self._source(name, '.subject.txt'),
+            self._source(name, '.txt'),
+            self._source(name, '.html'),
+            self._source(name, '.sms.txt'),
+        )
+
+    def for_worksheet(self, worksheet_name):
+        """
+        Get the template for a worksheet, falling back to the default files.
+        """
+        if not worksheet_name:
+            return self.default
+        template = self._by_worksheet.get(worksheet_name)
+        if template is None:
+            name = template_name(worksheet_name)
+            has_own = any(filename.startswith(name + '.') for filename in self._sources)
+            template = self._compile(name) if has_own else self.default
+            self._by_worksheet[worksheet_name] = template
+        return template
+
+
+def _encode_body(text):
+    return base64.encodebytes(text.encode('utf-8')).decode('ascii')
+
+
+def _encode_header(value):
+    """
+    RFC 2047 encode a non-ASCII header value as base64 encoded-words,
+    splitting only on UTF-8 character boundaries.
+    """
+    if value.isascii():
+        return value
+    data = value.encode('utf-8')
+    words = []
+    start = 0
+    while start < len(data):
+        end = min(start + 45, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        words.append(f"=?utf-8?b?{base64.b64encode(data[start:end]).decode('ascii')}?=")
+        start = end
+    return '\n '.join(words)
+
+
+class MessageBuilder:
+    """
+    Builds complete emails from a MIME skeleton prepared once per sender.
+
+    Only To, Subject, Date, Message-ID and the base64 body parts are produced
+    per message; everything else is fixed text.
+    """
+
+    def __init__(self, sender_name, sender_email):
+        self.sender_email = sender_email
+        self.domain = sender_email.rpartition('@')[2] or None
+        from_header = formataddr((sender_name, sender_email), charset='utf-8')
+        self._head = f"From: {from_header}\nMIME-Version: 1.0\n"
+        self._plain_part = 'Content-Type: text/plain; charset="utf-8"\nContent-Transfer-Encoding: base64\n\n'
+        self._html_part = 'Content-Type: text/html; charset="utf-8"\nContent-Transfer-Encoding: base64\n\n'
+        self._boundary = f"==============={uuid.uuid4().hex}=="
+        self._alternative = f'Content-Type: multipart/alternative; boundary="{self._boundary}"\n\n'
+        # Message-IDs are a per-builder random prefix plus a counter
+        self._id_prefix = uuid.uuid4().hex[:16]
+        self._id_counter = itertools.count(1)
+        self._date_second = None
+        self._date_header = None
+
+    def _date(self):
+        now = int(time.time())
+        if now != self._date_second:
+            self._date_header = formatdate(now, localtime=True)
+            self._date_second = now
+        return self._date_header
+
+    def build(self, recipient, subject, text, html_body=None):
+        """
+        :param recipient: Recipient email address
+        :param subject: Rendered subject
+        :param text: Rendered plain text body
+        :param html_body: Rendered HTML body (optional)
+        :return: Tuple of (message_id, message text)
+        """
+        message_id = f"<{self._id_prefix}.{next(self._id_counter)}@{self.domain or 'localhost'}>"
+        # Sheet values must not be able to add header lines
+        subject = ' '.join(subject.splitlines())
+        headers = (
+            f"{self._head}To: {recipient}\nSubject: {_encode_header(subject)}\n"
+            f"Date: {self._date()}\nMessage-ID: {message_id}\n"
+        )
+        if html_body is None:
+            return message_id, headers + self._plain_part + _encode_body(text)
+
+        boundary = self._boundary
+        return message_id, (
+            f"{headers}{self._alternative}"
+            f"--{boundary}\n{self._plain_part}{_encode_body(text)}\n"
+            f"--{boundary}\n{self._html_part}{_encode_body(html_body)}\n"
+            f"--{boundary}--\n"
+        )
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the campaign daemon's sheet polling and job bookkeeping, against the
+synthetic spreadsheet from fake_services.py.
+
+    python -m unittest test_daemon
+"""
+
+import os
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+import fake_services
+import sheets
+from config import settings
+from daemon import JOB_KEY, CampaignDaemon, SheetPoller
+from job_queue import JobQueue
+from messaging import get_email_address
+from retry_queue import RetryPolicy
+from send_engine import SendEngine
+from send_ledger import SendLedger
+from status_writer import FAILED, SENT
+
+SHEET = 'fake'
+
+
+class SheetPollerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved = (settings.SHEET_PAGE_SIZE, settings.LEAD_CACHE_FILE)
+        settings.SHEET_PAGE_SIZE = 31
+        settings.LEAD_CACHE_FILE = None
+        self.sheet = fake_services.install_fake_sheet(SHEET, {'Plumbing': 50, 'A/C': 20})
+
+    def tearDown(self):
+        settings.SHEET_PAGE_SIZE, settings.LEAD_CACHE_FILE = self.saved
+        sheets.invalidate_cache()
+        self.directory.cleanup()
+
+    def queue(self, name):
+        jobs = JobQueue(os.path.join(self.directory.name, name), 'test')
+        self.addCleanup(jobs.close)
+        return jobs
+
+    def poller(self):
+        return SheetPoller(SHEET, ['Plumbing', 'A/C'], get_email_address, lambda name, lead, recipient: 0)
+
+    def test_rows_added_past_the_grid_are_polled(self):
+        jobs = self.queue('jobs.sqlite3')
+        poll = self.poller()
+        first = poll(jobs)
+        self.assertGreater(first, 0)
+        self.assertEqual(poll(jobs), 0)  # unchanged sheet
+
+        # 51 rows fill two pages of 31; the new rows end past both
+        self.sheet.append_leads('Plumbing', 20)
+        added = poll(jobs)
+
+        # Everything a daemon started now would queue, from fresh metadata
+        sheets.invalidate_cache(SHEET)
+        everything = self.queue('all.sqlite3')
+        self.assertEqual(first + added, self.poller()(everything))
+        self.assertGreater(added, 0)
+        self.assertEqual(jobs.keys(), everything.keys())
+
+    def test_known_leads_are_not_queued_again_after_a_restart(self):
+        jobs = self.queue('jobs.sqlite3')
+        self.poller()(jobs)
+        self.sheet.append_leads('A/C', 5)
+        added = self.poller()(jobs)
+        self.assertLessEqual(added, 5)
+        self.assertGreater(added, 0)
+
+
+class CampaignDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.jobs = JobQueue(os.path.join(self.directory.name, 'jobs.sqlite3'), 'test')
+        self.jobs.enqueue([(f"lead{i}@example.com", 'Plumbing', {'email': f"lead{i}@example.com"}, i)
+                           for i in range(3)])
+        self.daemon = CampaignDaemon(self.jobs, lambda jobs: 0)
+
+    def tearDown(self):
+        self.jobs.close()
+        self.directory.cleanup()
+
+    def test_outcome_completes_the_job(self):
+        leads = self.daemon.leads()
+        worksheet_name, company = next(leads)
+        self.assertEqual(self.daemon.status()['in_flight'], 1)
+        self.daemon.record(worksheet_name, company, SENT)
+        self.assertEqual(self.daemon.status()['in_flight'], 0)
+        self.assertEqual(self.jobs.counts()['done'], 1)
+
+    def test_lead_already_contacted_completes_the_job(self):
+        ledger = SendLedger(os.path.join(self.directory.name, 'ledger.sqlite3'), 'test')
+        self.addCleanup(ledger.close)
+        ledger.record_sent('lead2@example.com')
+        # No message is sent, so the router is never asked for a relay
+        router = types.SimpleNamespace(relays=[], ensure_capacity=lambda count: None)
+        engine = SendEngine(router, worker_count=1, ledger=ledger, status_writer=self.daemon)
+        lead = next(self.daemon.leads())
+        engine.run([lead], lambda company: company['email'], None)
+        self.assertEqual(engine.stats.already_sent, 1)
+        self.assertEqual(self.daemon.status()['in_flight'], 0)
+        self.assertEqual(self.jobs.counts()['done'], 1)
+
+    def test_leads_waiting_in_the_engine_keep_their_lease(self):
+        self.jobs.lease_seconds = 0.5
+        self.daemon.poll_interval = 0.05
+        leads = self.daemon.leads()
+        first = next(leads)
+        poller = threading.Thread(target=self.daemon._poll_loop)
+        poller.start()
+        time.sleep(1)
+        self.daemon.stop()
+        poller.join()
+        lease_until, = self.jobs.conn.execute("SELECT lease_until FROM jobs WHERE state = 'leased'").fetchone()
+        self.assertGreater(lease_until, time.time())
+
+        # Even a lease that ran out doesn't hand the same lead out twice
+        self.jobs.conn.execute("UPDATE jobs SET lease_until = 0")
+        self.daemon._stopped.clear()
+        self.assertNotEqual(next(leads), first)
+        self.assertNotEqual(next(leads), first)
+        self.assertEqual(self.daemon.status()['in_flight'], 3)
+
+    def test_failed_send_is_retried(self):
+        self.daemon.retry_policy = RetryPolicy(base_delay=60, max_attempts=2)
+        worksheet_name, company = next(self.daemon.leads())
+        self.daemon.record(worksheet_name, company, FAILED)
+        self.assertEqual(self.jobs.counts()['queued'], 3)
+        self.assertEqual(self.jobs.counts()['failed'], 0)
+
+        # The second failure is the last attempt
+        self.jobs.conn.execute("UPDATE jobs SET available_at = 0")
+        job = self.jobs.lease()
+        self.assertEqual(job.attempts, 2)
+        self.daemon._in_flight[job.id] = job
+        self.daemon.record(job.worksheet, dict(job.company, **{JOB_KEY: job.id}), FAILED)
+        self.assertEqual(self.jobs.counts()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
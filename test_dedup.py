@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for merging duplicate business listings (dedup.py).
+
+    python -m unittest test_dedup
+"""
+
+import gc
+import threading
+import unittest
+
+import dedup
+from dedup import DUPLICATES_KEY, dedup_leads
+
+
+class DedupLeadsTest(unittest.TestCase):
+
+    def test_listings_of_one_business_are_merged(self):
+        leads = [
+            ('Plumbing', {'name': "Joe's Plumbing LLC", 'email': 'joe@joesplumbing.com', 'phone': '(555) 010-0001'}),
+            ('Roofing', {'name': 'Acme Roofing', 'email': 'info@acmeroofing.com', 'phone': '555-010-0002'}),
+            ('A/C', {'name': 'Joes Plumbing', 'email': '', 'phone': '555.010.0001'}),
+        ]
+        kept, merged = dedup_leads(leads)
+        self.assertEqual(merged, 1)
+        self.assertEqual([company['name'] for _, company in kept], ["Joe's Plumbing LLC", 'Acme Roofing'])
+        self.assertEqual(len(kept[0][1][DUPLICATES_KEY]), 1)
+
+    def test_garbage_collector_is_turned_back_on(self):
+        self.assertTrue(gc.isenabled())
+        with self.assertRaises(ValueError):
+            with dedup._gc_paused():
+                self.assertFalse(gc.isenabled())
+                raise ValueError
+        self.assertTrue(gc.isenabled())
+
+        # Overlapping pauses from two threads
+        inside, release = threading.Event(), threading.Event()
+
+        def pause():
+            with dedup._gc_paused():
+                inside.set()
+                release.wait()
+
+        thread = threading.Thread(target=pause)
+        with dedup._gc_paused():
+            thread.start()
+            inside.wait()
+        self.assertFalse(gc.isenabled())
+        release.set()
+        thread.join()
+        self.assertTrue(gc.isenabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
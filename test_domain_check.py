@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for dropping leads with undeliverable email domains (domain_check.py),
+against a StaticResolver so no DNS is queried.
+
+    python -m unittest test_domain_check
+"""
+
+import unittest
+
+from addresses import annotate_email_addresses
+from domain_check import DomainChecker, StaticResolver
+from messaging import get_email_address
+
+
+class FilterLeadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.checker = DomainChecker(StaticResolver({'live.com': ['mx.live.com']}))
+
+    def filter(self, records, **kwargs):
+        annotate_email_addresses(records)
+        dropped = []
+        kept = list(self.checker.filter_leads([('Plumbing', record) for record in records],
+                                              on_drop=lambda name, company: dropped.append(company), **kwargs))
+        return [company for _, company in kept], dropped
+
+    def test_every_address_is_checked(self):
+        record = {'name': 'Acme', 'email': 'a@dead.com, b@live.com'}
+        kept, dropped = self.filter([record])
+        self.assertEqual(kept, [record])
+        self.assertEqual(get_email_address(record), 'b@live.com')
+        self.assertEqual(dropped, [])
+
+    def test_lead_without_a_live_address_is_dropped(self):
+        record = {'name': 'Acme', 'email': 'a@dead.com', 'phone': '555-010-0000'}
+        kept, dropped = self.filter([record])
+        self.assertEqual(kept, [])
+        self.assertEqual(dropped, [record])
+        self.assertEqual(self.checker.dropped, 1)
+
+    def test_lead_with_a_phone_is_kept_for_texting(self):
+        texted = {'name': 'Acme', 'email': 'a@dead.com', 'phone': '555-010-0000'}
+        unreachable = {'name': 'Bolt', 'email': 'b@dead.com', 'phone': ''}
+        kept, dropped = self.filter([texted, unreachable], fallback=lambda company: bool(company['phone']))
+        self.assertEqual(kept, [texted])
+        self.assertEqual(get_email_address(texted), '')
+        self.assertEqual(dropped, [unreachable])
+
+    def test_unannotated_and_email_less_records(self):
+        records = [('Plumbing', {'name': 'Acme', 'email': 'x@dead.com; y@live.com'}),
+                   ('Plumbing', {'name': 'Bolt', 'phone': '555-010-0000'})]
+        kept = list(self.checker.filter_leads(records))
+        self.assertEqual(kept, records)
+        self.assertEqual(get_email_address(kept[0][1]), 'y@live.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-second quotas of the local SMTP and SMS stand-ins in
+fake_services.py, which the benchmarks and other tests rely on.
+
+    python -m unittest test_fake_services
+"""
+
+import json
+import smtplib
+import unittest
+import urllib.error
+import urllib.request
+
+import fake_services
+
+
+class ThrottlingTest(unittest.TestCase):
+
+    def test_smtp_server_throttles_past_max_per_second(self):
+        with fake_services.FakeSMTPServer(max_per_second=2) as server:
+            config = server.email_config()
+            connection = smtplib.SMTP(config['smtp_server'], config['smtp_port'])
+            for _ in range(2):
+                connection.sendmail(config['sender_email'], 'lead@example.com', 'Subject: hi\r\n\r\nhello')
+            with self.assertRaises(smtplib.SMTPSenderRefused):
+                connection.sendmail(config['sender_email'], 'lead@example.com', 'Subject: hi\r\n\r\nhello')
+            connection.close()
+        self.assertEqual(server.stats['messages'], 2)
+        self.assertEqual(server.stats['throttled'], 1)
+
+    def test_sms_server_throttles_past_max_per_second(self):
+        with fake_services.FakeSMSServer(max_per_second=1) as server:
+            codes = []
+            for _ in range(3):
+                request = urllib.request.Request(
+                    server.url, data=json.dumps({'to': '+15550000000', 'body': 'hi'}).encode(),
+                    headers={'Content-Type': 'application/json'},
+                )
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        codes.append(response.status)
+                except urllib.error.HTTPError as e:
+                    codes.append(e.code)
+        self.assertEqual(codes, [200, 429, 429])
+        self.assertEqual(server.stats['throttled'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
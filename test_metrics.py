@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the campaign counters and the JSON-lines event log (metrics.py).
+
+    python -m unittest test_metrics
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import Metrics
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'events.jsonl')
+        self.metrics = Metrics(self.path)
+
+    def tearDown(self):
+        self.metrics.close()
+        self.directory.cleanup()
+
+    def read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_events_are_on_disk_before_the_log_is_closed(self):
+        self.metrics.event('email_sent', worksheet='Plumbing')
+        self.metrics.event('email_failed', error='timed out')
+        self.assertEqual([event['event'] for event in self.read()], ['email_sent', 'email_failed'])
+        self.assertEqual(self.read()[0]['worksheet'], 'Plumbing')
+
+    def test_events_after_close_are_dropped(self):
+        self.metrics.close()
+        self.metrics.event('email_sent')
+        self.assertEqual(self.read(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
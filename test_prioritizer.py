@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for sending the best leads first with fair per-worksheet shares
+(prioritizer.py and main.prioritize_campaign_leads).
+
+    python -m unittest test_prioritizer
+"""
+
+import os
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import main
+from addresses import annotate_email_addresses
+from domain_check import DomainChecker, StaticResolver
+from prioritizer import LeadQueue, LeadScorer, prioritize_leads
+from send_ledger import SendLedger
+
+
+class LeadQueueTest(unittest.TestCase):
+
+    def test_best_first_within_fair_shares(self):
+        queue = LeadQueue({'A': 2, 'B': 1})
+        queue.extend([('A', 'a1', 9), ('A', 'a2', 8), ('A', 'a3', 7), ('B', 'b1', 1), ('B', 'b2', 0)])
+        queue.push('A', 'a0', 10)
+        self.assertEqual([lead for _, lead in queue], ['a0', 'a1', 'b1', 'a2', 'a3', 'b2'])
+
+    def test_leads_without_a_recipient_come_last(self):
+        leads = [('A', {'email': ''}), ('A', {'email': 'x@example.com'})]
+        queue, ordered = prioritize_leads(leads, LeadScorer([]), lambda lead: lead['email'], quota=1)
+        self.assertIsInstance(ordered, types.GeneratorType)
+        self.assertEqual([lead['email'] for _, lead in ordered], ['x@example.com', ''])
+
+
+class PrioritizeCampaignLeadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        ledger_file = os.path.join(self.directory.name, 'ledger.sqlite3')
+        ledger = SendLedger(ledger_file, main.CAMPAIGN_ID)
+        ledger.record_sent('sent@live.com')
+        ledger.record_bounce('bounced@live.com')
+        ledger.schedule_retry('retry@live.com', '{}', 1, 0)
+        ledger.close()
+        checker = DomainChecker(StaticResolver({'live.com': ['mx.live.com']}))
+        patches = [
+            mock.patch.object(main, 'SEND_LEDGER_FILE', ledger_file),
+            mock.patch.object(main, 'MAX_EMAILS_PER_RUN', 2),
+            mock.patch.object(main, 'CHECK_MX', True),
+            mock.patch.object(main, 'SEND_SMS', False),
+            mock.patch.object(main, '_domain_checker', checker),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_leads_that_wont_be_sent_do_not_use_a_share(self):
+        addresses = ['sent@live.com', 'bounced@live.com', 'retry@live.com', 'dead@dead.com',
+                     'new@live.com', 'NEW@live.com']
+        plumbing = [{'name': address, 'email': address} for address in addresses]
+        roofing = [{'name': 'roof', 'email': 'roof@live.com'}]
+        annotate_email_addresses(plumbing)
+        annotate_email_addresses(roofing)
+        leads = [('Plumbing', lead) for lead in plumbing] + [('Roofing', lead) for lead in roofing]
+
+        ordered = main.prioritize_campaign_leads(iter(leads))
+        self.assertIsInstance(ordered, types.GeneratorType)
+        first = [next(ordered), next(ordered)]
+        # Plumbing's one share goes to the only Plumbing lead that will be emailed
+        self.assertEqual(sorted(lead['name'] for _, lead in first), ['new@live.com', 'roof'])
+        self.assertEqual(len(list(ordered)), len(leads) - 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for spreading sends over several SMTP relays (relay_router.py and
+messaging.test_email_connection), with stand-in session pools.
+
+    python -m unittest test_relay_router
+"""
+
+import smtplib
+import unittest
+from unittest import mock
+
+import messaging
+from relay_router import Relay, RelayRouter
+
+
+class StubPool:
+
+    def __init__(self, error=None):
+        self.error = error
+        self.released = []
+
+    def acquire(self):
+        if self.error is not None:
+            raise self.error
+        return object()
+
+    def release(self, session):
+        self.released.append(session)
+
+
+def relay(name, error=None):
+    config = {'sender_email': f"{name}@example.com", 'sender_name': name, 'smtp_server': f"smtp.{name}.com",
+              'smtp_port': 587, 'use_tls': True}
+    return Relay(name, config, pool=StubPool(error))
+
+
+class ConnectionTestTest(unittest.TestCase):
+
+    def check(self, *relays):
+        router = RelayRouter(relays)
+        with mock.patch.object(messaging, '_relay_router', router):
+            return messaging.test_email_connection()
+
+    def test_relays_that_cannot_connect_are_disabled(self):
+        refused, timed_out, working = (relay('refused', ConnectionRefusedError(111, 'Connection refused')),
+                                       relay('slow', TimeoutError('timed out')), relay('working'))
+        self.assertTrue(self.check(refused, timed_out, working))
+        self.assertIsNotNone(refused.disabled_reason)
+        self.assertIsNotNone(timed_out.disabled_reason)
+        self.assertIsNone(working.disabled_reason)
+        self.assertEqual(len(working.pool.released), 1)
+
+    def test_fails_when_no_relay_works(self):
+        login = relay('login', smtplib.SMTPAuthenticationError(535, b'Authentication failed'))
+        closed = relay('closed', smtplib.SMTPServerDisconnected('Connection unexpectedly closed'))
+        self.assertFalse(self.check(login, closed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for the record of sent and bounced recipients (send_ledger.py).
+
+    python -m unittest test_send_ledger
+"""
+
+import os
+import tempfile
+import unittest
+
+from send_ledger import SendLedger
+
+
+class ReadOnlyLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'ledger.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_missing_ledger_is_not_created(self):
+        ledger = SendLedger(self.path, 'test', read_only=True)
+        self.assertTrue(ledger.claim('new@example.com'))
+        self.assertFalse(ledger.claim('NEW@example.com'))
+        ledger.close()
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_existing_ledger_is_read_but_not_changed(self):
+        ledger = SendLedger(self.path, 'test')
+        ledger.record_sent('sent@example.com')
+        ledger.record_bounce('bounced@example.com')
+        ledger.close()
+        modified = os.path.getmtime(self.path)
+
+        ledger = SendLedger(self.path, 'test', read_only=True)
+        self.assertFalse(ledger.claim('sent@example.com'))
+        self.assertTrue(ledger.is_bounced('bounced@example.com'))
+        self.assertTrue(ledger.claim('new@example.com'))
+        ledger.close()
+        self.assertEqual(os.path.getmtime(self.path), modified)
+
+
+if __name__ == '__main__':
+    unittest.main()
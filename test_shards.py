@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for splitting a campaign over several processes (shards.py and
+main.configure_shard).
+
+    python -m unittest test_shards
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+import messaging
+from config import settings
+from rate_limiter import parse_rate_limits, share_rate_limits
+from relay_router import RelayRouter
+from shards import shard_leads, shard_path
+
+
+class ConfigureShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {name: getattr(settings, name)
+                      for name in ('LEAD_CACHE_FILE', 'SMS_RATE_LIMIT_STATE_FILE', 'SMS_RATE_LIMITS', 'SMTP_RELAYS_FILE')}
+        self.directory = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(main, '_shard', None),
+            mock.patch.object(main, 'RATE_LIMITS', main.RATE_LIMITS),
+            mock.patch.object(main, 'RATE_LIMIT_STATE_FILE', main.RATE_LIMIT_STATE_FILE),
+            mock.patch.object(main, 'METRICS_EVENT_LOG', main.METRICS_EVENT_LOG),
+            mock.patch.object(main, 'METRICS_PORT', main.METRICS_PORT),
+            mock.patch.object(main, 'MAX_EMAILS_PER_RUN', main.MAX_EMAILS_PER_RUN),
+            mock.patch.object(main, 'SHARD_ACCOUNTS_FILE', os.path.join(self.directory.name, 'missing.json')),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(messaging.configure_relay_quotas, main.RELAY_RATE_LIMIT_STATE_FILE)
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(settings, name, value)
+        self.directory.cleanup()
+
+    def configure(self, index, count, max_emails):
+        main.MAX_EMAILS_PER_RUN = max_emails
+        main.RATE_LIMITS = '1/second, 30/minute, 500/day'
+        settings.SMS_RATE_LIMITS = '1/second, 200/day'
+        main.configure_shard(index, count)
+        return main.MAX_EMAILS_PER_RUN
+
+    def test_shards_split_the_cap(self):
+        self.assertEqual([self.configure(index, 3, 10) for index in range(3)], [4, 3, 3])
+        self.assertEqual([self.configure(index, 4, 2) for index in range(4)], [1, 1, 0, 0])
+        self.assertIsNone(self.configure(1, 3, None))
+
+    def test_shards_keep_their_own_state_files(self):
+        lead_cache, sms_state = settings.LEAD_CACHE_FILE, settings.SMS_RATE_LIMIT_STATE_FILE
+        self.configure(1, 2, 10)
+        self.assertEqual(settings.LEAD_CACHE_FILE, shard_path(lead_cache, 1))
+        self.assertEqual(settings.SMS_RATE_LIMIT_STATE_FILE, shard_path(sms_state, 1))
+        self.assertEqual(main.RATE_LIMIT_STATE_FILE, shard_path('rate_limit_state.json', 1))
+
+    def test_shards_sending_from_one_account_split_its_quota(self):
+        self.configure(2, 3, 10)
+        self.assertEqual(main.RATE_LIMITS, '1/3 seconds, 10/minute, 166/day')
+        self.assertEqual(parse_rate_limits(settings.SMS_RATE_LIMITS), [(1, 3), (66, 86400)])
+
+    def test_quota_shares_add_up(self):
+        for count in (2, 3, 7):
+            shares = [parse_rate_limits(share_rate_limits('1/second, 500/day', index, count))
+                      for index in range(count)]
+            self.assertAlmostEqual(sum(rate / period for (rate, period), _ in shares), 1)
+            self.assertEqual(sum(daily for _, (daily, _) in shares), 500)
+
+    def test_shared_relays_split_their_quota(self):
+        relays_file = os.path.join(self.directory.name, 'relays.json')
+        with open(relays_file, 'w') as f:
+            json.dump([{'name': 'gmail2', 'rate_limits': '30/minute, 500/day'}], f)
+        settings.SMTP_RELAYS_FILE = relays_file
+        self.configure(0, 2, 10)
+        router = messaging.get_relay_router()
+        self.addCleanup(messaging.close_smtp_pool)
+        rate_limiter = router.relays[0].rate_limiter
+        self.assertEqual(rate_limiter.state_file, 'rate_limit_state.gmail2.shard1.json')
+        self.assertEqual([(bucket.rate, bucket.period) for bucket in rate_limiter.buckets], [(15, 60), (250, 86400)])
+
+
+class ShardLeadsTest(unittest.TestCase):
+
+    def test_every_lead_goes_to_one_shard(self):
+        leads = [('Plumbing', {'name': f"Email {i}", 'email': f"lead{i}@example.com"}) for i in range(30)]
+        leads += [('Plumbing', {'name': f"Phone {i}", 'email': '', 'phone': f"(555) 010-{i:04d}"}) for i in range(30)]
+        leads += [('Plumbing', {'name': 'Nothing', 'email': '', 'phone': ''})]
+        shards = [[company['name'] for _, company in shard_leads(leads, index, 3)] for index in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(company['name'] for _, company in leads))
+        self.assertIn('Nothing', shards[0])
+        # Phone-only leads are spread like the others
+        for shard in shards:
+            self.assertGreater(len([name for name in shard if name.startswith('Phone')]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
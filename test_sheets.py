@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Tests for reading leads from Google Sheets (sheets.py, pipeline.py) and the
+local lead cache, against a small in-memory stand-in for a gspread spreadsheet.
+
+    python -m unittest test_sheets
+"""
+
+import os
+import re
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+import sheets
+from config import settings
+from pipeline import LeadStream
+from status_writer import SENT, StatusWriter
+
+SHEET = 'https://docs.google.com/spreadsheets/d/test-sheet/edit'
+
+_RANGE = re.compile(r"^'(.+)'(?:!(\d+):(\d+))?$")
+
+
+class QuotaError(Exception):
+    """
+    Stand-in for gspread's APIError on a 429, which carries the HTTP response.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Quota exceeded for quota metric 'Read requests'")
+        self.response = types.SimpleNamespace(status_code=429, headers={'Retry-After': retry_after})
+
+
+class FakeSpreadsheet:
+    """
+    Worksheet values in memory, answering like the Sheets API: blank rows at the
+    end of a requested range are left out, and every write changes the version.
+    """
+
+    def __init__(self, worksheets, latency=0.0, throttle_every=None):
+        """
+        :param worksheets: Dictionary of worksheet title -> rows (header row first)
+        :param latency: Seconds each read takes
+        :param throttle_every: Fail every n-th read with a 429 (None for never)
+        """
+        self.id = 'test-sheet'
+        self.worksheet_values = worksheets
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.version = '2024-01-01T00:00:00.000Z'
+        self.reads = 0
+        self.throttled = 0
+        self.writes = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def worksheets(self):
+        return [types.SimpleNamespace(title=title, row_count=len(rows), col_count=10, add_cols=lambda count: None)
+                for title, rows in self.worksheet_values.items()]
+
+    def values_get(self, range_name):
+        with self._lock:
+            self.reads += 1
+            if self.throttle_every and self.reads % self.throttle_every == 0:
+                self.throttled += 1
+                raise QuotaError('0.05')
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return {'range': range_name, 'values': self._values(range_name)}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def values_batch_get(self, ranges):
+        with self._lock:
+            self.reads += 1
+        return {'valueRanges': [{'range': name, 'values': self._values(name)} for name in ranges]}
+
+    def values_batch_update(self, body):
+        self.writes.append(body)
+        self.version = f"2024-01-01T00:00:{len(self.writes):02d}.000Z"
+
+    def _values(self, range_name):
+        title, start, end = _RANGE.match(range_name).groups()
+        rows = self.worksheet_values[title.replace("''", "'")]
+        values = rows[int(start) - 1:int(end)] if start else list(rows)
+        while values and not any(values[-1]):
+            values.pop()
+        return [list(row) for row in values]
+
+
+class FakeClient:
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_url(self, url):
+        return self.spreadsheet
+
+    def request(self, method, url, params=None):
+        # Drive files.get: the spreadsheet's modifiedTime
+        return types.SimpleNamespace(json=lambda: {'modifiedTime': self.spreadsheet.version})
+
+
+def lead_rows(count, first=0):
+    return [[f"Company {i}", f"lead{i}@example.com", f"555-010-{i:04d}"] for i in range(first, first + count)]
+
+
+class SheetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved = (settings.SHEET_PAGE_SIZE, settings.LEAD_CACHE_FILE, settings.OFFLINE_MODE)
+        settings.SHEET_PAGE_SIZE = 5
+        settings.LEAD_CACHE_FILE = os.path.join(self.directory.name, 'lead_cache.sqlite3')
+        settings.OFFLINE_MODE = False
+
+    def tearDown(self):
+        settings.SHEET_PAGE_SIZE, settings.LEAD_CACHE_FILE, settings.OFFLINE_MODE = self.saved
+        if sheets._lead_cache is not None:
+            sheets._lead_cache.close()
+            sheets._lead_cache = None
+        sheets.invalidate_cache()
+        self.directory.cleanup()
+
+    def install(self, worksheets, **options):
+        self.sheet = FakeSpreadsheet(worksheets, **options)
+        sheets.invalidate_cache()
+        sheets._client = FakeClient(self.sheet)
+        return self.sheet
+
+    def read(self, worksheet_names):
+        stream = LeadStream(SHEET, worksheet_names)
+        leads = [(name, dict(company)) for name, company in stream]
+        self.assertEqual(stream.errors, {})
+        # Worksheets download concurrently, so their leads interleave
+        return sorted(leads, key=lambda lead: (lead[0], lead[1][sheets.ROW_KEY]))
+
+
+class LeadCacheTest(SheetTestCase):
+
+    def test_cached_rows_keep_their_row_numbers(self):
+        # Page size 5: row 5 is blank at the end of the first page (left out by the
+        # API), row 8 is blank in the middle of the second one
+        rows = [['name', 'email', 'phone']] + lead_rows(3) + [['', '', '']] + lead_rows(2, 3)
+        rows += [['', '', '']] + lead_rows(4, 5)
+        self.install({'Plumbing': rows})
+        fetched = self.read(['Plumbing'])
+        reads = self.sheet.reads
+
+        cached = self.read(['Plumbing'])
+        self.assertEqual(self.sheet.reads, reads)  # served from the cache
+        self.assertEqual(cached, fetched)
+        by_name = {company['name']: company[sheets.ROW_KEY] for _, company in cached}
+        self.assertEqual(by_name['Company 3'], 6)
+        self.assertEqual(by_name['Company 8'], 12)
+
+        # The whole-worksheet read from the same cache agrees
+        batch = sheets.get_company_data(SHEET, 'Plumbing')
+        self.assertEqual([record[sheets.ROW_KEY] for record in batch if record['name']],
+                         [company[sheets.ROW_KEY] for _, company in fetched if company['name']])
+
+    def test_status_write_keeps_the_cache_current(self):
+        self.install({'Plumbing': [['name', 'email']] + lead_rows(7), 'A/C': [['name', 'email']] + lead_rows(3, 7)})
+        fetched = self.read(['Plumbing', 'A/C'])
+        writer = StatusWriter(SHEET, flush_interval=3600)
+        for worksheet_name, company in fetched[:4]:
+            writer.record(worksheet_name, company, SENT, 'message-1')
+        writer.close()
+        self.assertEqual(len(self.sheet.writes), 1)
+
+        reads = self.sheet.reads
+        self.assertEqual(self.read(['Plumbing', 'A/C']), fetched)
+        self.assertEqual(self.sheet.reads, reads)
+
+        # Someone else's edit still invalidates it
+        self.sheet.version = '2024-02-01T00:00:00.000Z'
+        self.read(['Plumbing'])
+        self.assertGreater(self.sheet.reads, reads)
+
+
+class ConcurrentFetchTest(SheetTestCase):
+
+    WORKSHEETS = {'Plumbing': 24, 'A/C': 12, 'Electricians': 8, 'Roofing': 4}
+
+    def worksheets(self):
+        first = 0
+        worksheets = {}
+        for name, count in self.WORKSHEETS.items():
+            worksheets[name] = [['name', 'email', 'phone']] + lead_rows(count, first)
+            first += count
+        return worksheets
+
+    def setUp(self):
+        super().setUp()
+        settings.LEAD_CACHE_FILE = None
+
+    def test_worksheets_download_concurrently(self):
+        self.install(self.worksheets(), latency=0.05)
+        leads = self.read(list(self.WORKSHEETS))
+        self.assertGreater(self.sheet.max_active, 1)
+        counts = {name: 0 for name in self.WORKSHEETS}
+        for worksheet_name, _ in leads:
+            counts[worksheet_name] += 1
+        self.assertEqual(counts, self.WORKSHEETS)
+
+    def test_throttled_reads_are_retried(self):
+        self.install(self.worksheets(), throttle_every=3)
+        leads = self.read(list(self.WORKSHEETS))
+        self.assertGreater(self.sheet.throttled, 0)
+        self.assertEqual(len(leads), sum(self.WORKSHEETS.values()))
+        self.assertEqual(len({company['email'] for _, company in leads}), len(leads))
+
+    def test_other_errors_are_not_retried(self):
+        self.install(self.worksheets())
+        stream = LeadStream(SHEET, ['Roofing', 'Missing'])
+        self.assertEqual(len(list(stream)), self.WORKSHEETS['Roofing'])
+        self.assertIn('Missing', stream.errors)
+
+    def test_retry_after_header(self):
+        self.assertEqual(sheets.retry_after_seconds('3'), 3.0)
+        self.assertIsNone(sheets.retry_after_seconds(''))
+        self.assertIsNone(sheets.retry_after_seconds('soon'))
+        self.assertEqual(sheets.retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the pool of reusable SMTP sessions (smtp_pool.py), with smtplib.SMTP
+replaced by an in-memory stand-in.
+
+    python -m unittest test_smtp_pool
+"""
+
+import unittest
+from unittest import mock
+
+from smtp_pool import SMTPConnectionPool
+
+CONFIG = {'smtp_server': 'smtp.example.com', 'smtp_port': 587, 'sender_email': 'me@example.com',
+          'sender_password': 'secret', 'sender_name': 'Me', 'use_tls': True}
+
+
+class StubSMTP:
+    """
+    Accepts every login and message while `reachable`, and refuses connections otherwise.
+    """
+
+    reachable = True
+    sent = []
+
+    def __init__(self, host, port, timeout=None):
+        if not StubSMTP.reachable:
+            raise ConnectionRefusedError(111, 'Connection refused')
+        self.open = True
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b'OK'
+
+    def sendmail(self, sender, recipient, text):
+        StubSMTP.sent.append(recipient)
+
+    def quit(self):
+        self.open = False
+
+    def close(self):
+        self.open = False
+
+
+class SMTPConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        StubSMTP.reachable = True
+        StubSMTP.sent = []
+        patch = mock.patch('smtplib.SMTP', StubSMTP)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.pool = SMTPConnectionPool(dict(CONFIG), max_size=1, max_messages_per_session=1)
+
+    def test_session_that_cannot_reconnect_is_dropped(self):
+        with self.pool.session() as session:
+            session.send('lead@example.com', 'Subject: hi\r\n\r\nhello')
+        # The exhausted session logs in again on the next acquire, but the server is gone
+        StubSMTP.reachable = False
+        with self.assertRaises(OSError):
+            self.pool.acquire()
+        self.assertEqual(self.pool._sessions, [])
+        self.assertEqual(self.pool.logins, 1)
+
+        # Its slot is free again
+        StubSMTP.reachable = True
+        with self.pool.session() as session:
+            session.send('lead@example.com', 'Subject: hi\r\n\r\nhello')
+        self.assertEqual(self.pool.logins, 2)
+        self.assertEqual(StubSMTP.sent, ['lead@example.com', 'lead@example.com'])
+
+    def test_close_logs_out_sessions_still_checked_out(self):
+        session = self.pool.acquire()
+        self.pool.close()
+        self.assertIsNotNone(session.server)
+        server = session.server
+        self.pool.release(session)
+        self.assertIsNone(session.server)
+        self.assertFalse(server.open)
+        self.assertEqual(self.pool._sessions, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
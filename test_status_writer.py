@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for writing each lead's outcome back to the sheet (status_writer.py),
+against the synthetic spreadsheet from fake_services.py.
+
+    python -m unittest test_status_writer
+"""
+
+import unittest
+
+import fake_services
+import sheets
+from dedup import DUPLICATES_KEY, dedup_leads
+from status_writer import ALREADY_SENT, DUPLICATE, SENT, StatusWriter
+
+SHEET = 'fake'
+
+
+class StatusWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = fake_services.install_fake_sheet(SHEET, {'Plumbing': 5, 'A/C': 5})
+        self.writer = StatusWriter(SHEET, flush_rows=100, flush_interval=3600)
+
+    def tearDown(self):
+        self.writer.close()
+        sheets.invalidate_cache()
+
+    def lead(self, row, **fields):
+        return dict(fields, **{sheets.ROW_KEY: row})
+
+    def statuses(self):
+        return {key: values[0] for key, values in self.writer._pending.items()}
+
+    def test_merged_listings_are_marked_duplicate(self):
+        leads = [
+            ('Plumbing', self.lead(2, name='Acme Plumbing', phone='555-010-0001')),
+            ('A/C', self.lead(7, name='Acme Plumbing Inc', phone='(555) 010-0001')),
+        ]
+        (worksheet_name, company), = dedup_leads(leads)[0]
+        self.writer.record(worksheet_name, company, SENT, 'message-1')
+        self.assertEqual(self.statuses(), {('Plumbing', 2): SENT, ('A/C', 7): DUPLICATE})
+
+        self.writer.close()
+        self.assertGreater(self.sheet.cells_updated, 0)
+
+    def test_duplicates_of_an_already_contacted_lead(self):
+        duplicate = ('A/C', self.lead(3, name='Acme'))
+        company = self.lead(4, name='Acme', **{DUPLICATES_KEY: [duplicate]})
+        self.writer.record('Plumbing', company, ALREADY_SENT)
+        self.assertEqual(self.statuses(), {('A/C', 3): DUPLICATE})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for loading and rendering the per-worksheet email templates (templates.py).
+
+    python -m unittest test_templates
+"""
+
+import os
+import tempfile
+import unittest
+
+from templates import TemplateSet
+
+
+class TemplateSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.write('default.subject.txt', 'Hello {name|there}')
+        self.write('default.txt', 'Dear {name|Your Business},')
+        self.write('plumbing.subject.txt', 'Pipes for {name}')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, filename, text):
+        path = os.path.join(self.directory.name, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_worksheet_templates_fall_back_to_the_default(self):
+        templates = TemplateSet(self.directory.name)
+        self.assertEqual(templates.for_worksheet('Plumbing').render({'name': 'Acme'}),
+                         ('Pipes for Acme', 'Dear Acme,', None))
+        self.assertEqual(templates.for_worksheet('Roofing').render({'name': ''})[:2],
+                         ('Hello there', 'Dear Your Business,'))
+
+    def test_subdirectories_are_skipped(self):
+        self.write(os.path.join('drafts', 'plumbing.txt'), 'Draft')
+        templates = TemplateSet(self.directory.name)
+        self.assertEqual(templates.for_worksheet('Plumbing').render({'name': 'Acme'})[1], 'Dear Acme,')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,4 +41,10 @@ def validate_email_config():
         return False
     
     print("Email configuration validated successfully.")
-    return True 
\ No newline at end of file
+    return True 
+
+def normalize_email(address):
+    """
+    Normalize an email address for comparisons (dedup, ledger lookups).
+    """
+    return address.strip().lower()